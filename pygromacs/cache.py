@@ -0,0 +1,187 @@
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+from pygromacs.gmxfiles import MdpFile
+from pygromacs.utils import lazy_import
+
+np = lazy_import('numpy')
+
+"""A binary cache of parsed files, kept in a central cache directory."""
+
+# Header: magic, format version, file kind, source size, source mtime,
+# source SHA-1, number of strings, number of records and flags
+_header = struct.Struct('<4sHHqq20sIII')
+_magic = b'PGMC'
+_version = 2
+
+# Flags of an MDP file: line breaks are CRLF, the last line has none
+_crlf = 0x1
+_unterminated = 0x2
+
+def cache_directory():
+    """Return the cache directory.
+
+    This is ``$PYGROMACS_CACHE`` if set, otherwise ``pygromacs``
+    in ``$XDG_CACHE_HOME`` (default: ``~/.cache``).
+
+    """
+
+    directory = os.environ.get('PYGROMACS_CACHE')
+    if not directory:
+        directory = os.path.join(os.environ.get('XDG_CACHE_HOME')
+                or os.path.join(os.path.expanduser('~'), '.cache'), 'pygromacs')
+
+    return directory
+
+def cache_path(path, directory=None):
+    """Return the path of the cache file of a source file."""
+
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+
+    return os.path.join(directory or cache_directory(), key[:2], key + '.bin')
+
+def read_cached(path, cls=MdpFile, directory=None):
+    """Read a file, from its cached binary form if it is up to date.
+
+    The cache is valid if the size and modification time of the source are
+    those it was created from. If they are not but the content is the same
+    (by SHA-1), the cache is still used and its time stamp updated. Otherwise
+    the file is parsed and the cache rewritten.
+
+    Args:
+        path (str): Path to the source file
+        cls (class, optional): The file class, so far only
+            :class:`~pygromacs.gmxfiles.MdpFile`
+        directory (str, optional): The cache directory (default:
+            :func:`cache_directory`)
+
+    Returns:
+        The read file object
+
+    """
+
+    kind = _kinds[cls]
+    stat = os.stat(path)
+    target = cache_path(path, directory)
+
+    try:
+        with open(target, 'rb') as fp:
+            data = fp.read()
+        header = _header.unpack_from(data)
+    except (OSError, struct.error):
+        data, header = None, None
+
+    valid = header is not None and header[:3] == (_magic, _version, kind)
+    if valid and header[3:5] == (stat.st_size, stat.st_mtime_ns):
+        obj = _decode(kind, path, data)
+        if obj is not None:
+            return obj
+        valid = False
+
+    with open(path, 'rb') as fp:
+        digest = hashlib.sha1(fp.read()).digest()
+    if valid and digest == header[5]:
+        obj = _decode(kind, path, data)
+        if obj is not None:
+            _write(target, _header.pack(_magic, _version, kind, stat.st_size,
+                stat.st_mtime_ns, digest, *header[6:]) + data[_header.size:])
+            return obj
+
+    obj = cls(path)
+    _write(target, _encoders[kind](obj, stat, digest))
+
+    return obj
+
+def clear_cache(directory=None):
+    """Remove all cached files."""
+
+    shutil.rmtree(directory or cache_directory(), ignore_errors=True)
+
+def _write(path, data):
+    """Write a cache file atomically, ignoring a cache which is not writable."""
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(path),
+                delete=False) as fp:
+            fp.write(data)
+        os.replace(fp.name, path)
+    except OSError:
+        pass
+
+def _decode(kind, path, data):
+    """Decode a cached file, returning None if the cache is corrupt."""
+
+    try:
+        return _decoders[kind](path, data)
+    except (ValueError, IndexError, UnicodeDecodeError, struct.error):
+        return None
+
+def _encode_mdp(mdp, stat, digest):
+    """Encode an MDP file as a table of its distinct strings and its lines.
+
+    Every line is four indices into the table (parameter, value, comment
+    and raw line, -1 if there is none). Strings are stored as a blob with
+    their lengths.
+
+    """
+
+    strings = {}
+    records = np.array([[strings.setdefault(text, len(strings))
+        if text is not None else -1 for text in (option.parameter,
+            option.value, option.comment, option.raw)]
+        for option in mdp.lines], dtype='<i4').reshape(-1, 4)
+
+    lengths = np.array([len(text) for text in strings], dtype='<u4')
+    blob = "".join(strings).encode()
+
+    flags = (_crlf if mdp.newline == "\r\n" else 0) \
+            | (0 if mdp.final_newline else _unterminated)
+
+    return b"".join([_header.pack(_magic, _version, _kinds[MdpFile],
+        stat.st_size, stat.st_mtime_ns, digest, len(strings), len(records),
+        flags),
+        lengths.tobytes(), records.tobytes(), blob])
+
+def _decode_mdp(path, data):
+    """Create an MDP file from its encoded form.
+
+    Raises:
+        ValueError: If the data is truncated or inconsistent
+
+    """
+
+    count, lines, flags = _header.unpack_from(data)[6:]
+    offset = _header.size
+    lengths = np.frombuffer(data, '<u4', count, offset)
+    offset += lengths.nbytes
+    records = np.frombuffer(data, '<i4', 4*lines, offset).reshape(-1, 4)
+    offset += records.nbytes
+
+    text = data[offset:].decode()
+    ends = np.cumsum(lengths).tolist()
+    if (ends[-1] if ends else 0) != len(text) \
+            or records.size and (records.min() < -1 or records.max() >= count):
+        raise ValueError("corrupt cache of '%s'" % path)
+    strings = [text[start:end] for start, end in zip([0] + ends, ends)]
+    strings.append(None)
+
+    mdp = MdpFile()
+    mdp.path = path
+    mdp.newline = "\r\n" if flags & _crlf else "\n"
+    mdp.final_newline = not flags & _unterminated
+    option = MdpFile.MdpOption
+    mdp.lines = [option(strings[parameter], strings[value], strings[comment],
+        index, strings[raw]) for index, (parameter, value, comment, raw)
+        in enumerate(records.tolist())]
+    mdp.options = {line.parameter: line for line in mdp.lines
+            if line.parameter and line.value}
+
+    return mdp
+
+# File kinds with their encoders and decoders
+_kinds = {MdpFile: 1}
+_encoders = {1: _encode_mdp}
+_decoders = {1: _decode_mdp}
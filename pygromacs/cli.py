@@ -0,0 +1,527 @@
+import argparse
+import copy
+import os
+import shlex
+import sys
+from collections import OrderedDict
+
+"""The ``pygromacs`` command line tool.
+
+Every subcommand imports only the modules it needs, which keeps NumPy
+out of quick edits. With ``--batch`` commands are read from standard
+input, one per line, and run in a single process: files are read once
+and written when all commands are done. For many separate edits, e.g.
+from a shell script, ``serve`` starts a server which keeps the files
+parsed, to which ``get`` and ``set`` are sent with ``--socket``.
+
+Examples::
+
+    pygromacs get grompp.mdp nsteps dt
+    pygromacs set grompp.mdp nsteps=50000 'tcoupl=v-rescale ; thermostat'
+    pygromacs diff a.mdp b.mdp
+    pygromacs edit 'runs/**/production.mdp' -s cutoff-scheme=Verlet \\
+            -w cutoff-scheme=group --dry-run
+    pygromacs sweep grompp.mdp runs -p dt=0.002,0.004 \\
+            -d 'nsteps=round(total_ps / dt)' -C total_ps=4000 --shard 0/4
+    pygromacs index /proj && pygromacs find /proj coulombtype=reaction-field
+    find . -name '*.mdp' | sed 's/^/set /; s/$/ nstlog=1000/' \\
+            | pygromacs --batch
+
+"""
+
+# File name of the search index in an indexed directory
+_index_name = 'mdp-index.db'
+
+class _Session(object):
+    """Files read by the commands of a session, and those to write.
+
+    With a socket, get and set requests are sent to a server instead.
+
+    """
+
+    def __init__(self, socket=None):
+        self.files = {}
+        self.modified = {}
+        self.socket = socket
+        self._client = None
+
+    def request(self, method, *args):
+        """Call a method of the client connected to the server."""
+
+        from pygromacs.server import Client
+
+        try:
+            if self._client is None:
+                self._client = Client(self.socket)
+            return getattr(self._client, method)(*args)
+        except (OSError, RuntimeError) as error:
+            raise _Error(error)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+
+    def open(self, path):
+        from pygromacs.gmxfiles import MdpFile
+
+        if path not in self.files:
+            if not os.path.isfile(path):
+                raise _Error("could not open '%s' for reading" % path)
+            self.files[path] = MdpFile(path)
+
+        return self.files[path]
+
+    def write(self):
+        """Write all modified files."""
+
+        if not self.modified:
+            return
+
+        from pygromacs.runs import render_mdp
+        from pygromacs.utils import write_if_changed
+
+        for path, (mdp, backup) in self.modified.items():
+            if backup:
+                mdp.save(path, verbose=False)
+            else:
+                write_if_changed(path, render_mdp(mdp))
+        self.modified = {}
+
+class _Error(Exception):
+    pass
+
+def main(argv=None):
+    """Run the command line tool, returning the exit status."""
+
+    parser = _parser()
+    args = parser.parse_args(argv)
+    session = _Session(args.socket)
+
+    try:
+        if args.batch:
+            status = _batch(parser, sys.stdin, session)
+        elif args.command is None:
+            parser.print_usage(sys.stderr)
+            status = 2
+        else:
+            status = _run(args, session)
+    finally:
+        # Files edited before an unexpected error are still written
+        try:
+            session.write()
+        except OSError as error:
+            print("pygromacs: %s" % error, file=sys.stderr)
+            status = 1
+        finally:
+            session.close()
+
+    return status
+
+def _parser():
+    parser = argparse.ArgumentParser(prog='pygromacs',
+            description="Read, edit, compare and validate MDP files.")
+    parser.add_argument('--batch', action='store_true',
+            help="read commands from standard input, one per line")
+    parser.add_argument('--socket', help="send get and set commands to "
+            "the server listening on this socket (see serve)")
+    commands = parser.add_subparsers(dest='command', metavar='command')
+
+    command = commands.add_parser('get', help="print parameter values")
+    command.add_argument('file')
+    command.add_argument('parameters', nargs='+', metavar='parameter')
+
+    command = commands.add_parser('set', help="set or remove parameters")
+    command.add_argument('file')
+    command.add_argument('options', nargs='*', metavar='parameter=value[;comment]')
+    command.add_argument('-r', '--remove', action='append', default=[],
+            metavar='parameter', help="remove a parameter")
+    command.add_argument('-o', '--output', help="write to this file instead")
+    command.add_argument('--backup', action='store_true',
+            help="back up a replaced file as Gromacs does")
+
+    command = commands.add_parser('diff', help="compare the options of two files")
+    command.add_argument('first')
+    command.add_argument('second')
+
+    command = commands.add_parser('search', help="print matching parameters")
+    command.add_argument('file')
+    command.add_argument('query')
+
+    command = commands.add_parser('sweep', help="write variants of a file")
+    command.add_argument('file')
+    command.add_argument('directory')
+    command.add_argument('-p', '--parameter', action='append', default=[],
+            metavar='parameter=value,...', help="values of a swept parameter")
+    command.add_argument('-d', '--derive', action='append', default=[],
+            metavar='parameter=expression', help="a derived parameter")
+    command.add_argument('-C', '--constant', action='append', default=[],
+            metavar='name=value', help="a constant used in derived parameters")
+    command.add_argument('--shard', metavar='index/count',
+            help="write only one shard of the variants")
+    command.add_argument('--hash', action='store_true',
+            help="shard by hash instead of contiguous ranges")
+
+    command = commands.add_parser('validate', help="check options against the schema")
+    command.add_argument('files', nargs='+', metavar='file')
+    command.add_argument('--strict', action='store_true',
+            help="also report unknown parameters")
+
+    command = commands.add_parser('edit',
+            help="edit all files matching glob patterns in parallel")
+    command.add_argument('patterns', nargs='+', metavar='pattern')
+    command.add_argument('-s', '--set', action='append', default=[],
+            metavar='parameter=value', help="set a parameter")
+    command.add_argument('-r', '--remove', action='append', default=[],
+            metavar='parameter', help="remove a parameter")
+    command.add_argument('-w', '--where', action='append', default=[],
+            metavar='parameter=value',
+            help="only edit files where a parameter has this value")
+    command.add_argument('--backup', action='store_true',
+            help="back up replaced files as Gromacs does")
+    command.add_argument('-n', '--dry-run', action='store_true',
+            help="only count the files which would change")
+    command.add_argument('-j', '--processes', type=int,
+            help="number of processes (default: number of processors)")
+
+    command = commands.add_parser('index',
+            help="update the search index of all files in a directory tree")
+    command.add_argument('directory')
+    command.add_argument('-i', '--index', help="path of the index "
+            "(default: %s in the directory)" % _index_name)
+    command.add_argument('--pattern', default='*.mdp',
+            help="shell pattern of file names to index (default: *.mdp)")
+    command.add_argument('-j', '--processes', type=int,
+            help="number of processes (default: number of processors)")
+    command.add_argument('--cache', action='store_true',
+            help="read files through the binary cache")
+
+    command = commands.add_parser('find',
+            help="print the files of an index with parameter values")
+    command.add_argument('directory')
+    command.add_argument('conditions', nargs='+',
+            metavar='parameter[=value]', help="a parameter with a value, "
+            "or without one to match every file setting it")
+    command.add_argument('-i', '--index', help="path of the index "
+            "(default: %s in the directory)" % _index_name)
+
+    command = commands.add_parser('watch',
+            help="keep the search index of a directory tree up to date")
+    command.add_argument('directory')
+    command.add_argument('-i', '--index', help="path of the index "
+            "(default: %s in the directory)" % _index_name)
+    command.add_argument('-m', '--manifest',
+            help="also keep this manifest of the runs in the tree up to date")
+    command.add_argument('--mdp-name', default='grompp.mdp',
+            help="file name of the MDP file of every run (default: grompp.mdp)")
+    command.add_argument('--pattern', default='*.mdp',
+            help="shell pattern of file names to index (default: *.mdp)")
+    command.add_argument('--cache', action='store_true',
+            help="read files through the binary cache and keep it up to date")
+    command.add_argument('--debounce', type=float, default=0.5,
+            help="seconds without changes which end a batch (default: 0.5)")
+    command.add_argument('--interval', type=float, default=2.0,
+            help="seconds between polls of the tree (default: 2)")
+    command.add_argument('--polling', action='store_true',
+            help="poll the tree even if inotify is available")
+    command.add_argument('-j', '--processes', type=int,
+            help="number of processes (default: number of processors)")
+
+    command = commands.add_parser('serve',
+            help="keep files cached in a server listening on a socket")
+    command.add_argument('path', nargs='?', metavar='socket',
+            help="path of the socket (default: $PYGROMACS_SOCKET or "
+            "a per-user socket in the temporary directory)")
+    command.add_argument('--size', type=int, default=1024,
+            help="maximum number of cached files (default: 1024)")
+
+    return parser
+
+def _batch(parser, lines, session):
+    """Run commands read from lines, returning the worst exit status."""
+
+    status = 0
+    for number, line in enumerate(lines, 1):
+        words = shlex.split(line, comments=True)
+        if not words:
+            continue
+
+        try:
+            args = parser.parse_args(words)
+        except SystemExit as error:
+            print("pygromacs: line %d: invalid command" % number, file=sys.stderr)
+            status = max(status, error.code or 2)
+            continue
+
+        if args.batch or args.command in (None, 'serve', 'watch'):
+            print("pygromacs: line %d: invalid command" % number, file=sys.stderr)
+            status = max(status, 2)
+            continue
+
+        status = max(status, _run(args, session))
+
+    return status
+
+def _run(args, session):
+    try:
+        return _commands[args.command](args, session)
+    except _Error as error:
+        print("pygromacs: %s" % error, file=sys.stderr)
+        return 1
+
+def _normalise(key):
+    from pygromacs.gmxfiles import normalise_key
+
+    return normalise_key(key)
+
+def _get(args, session):
+    found = {}
+    if session.socket:
+        values = session.request('get', args.file, *args.parameters)
+        found = {parameter: (parameter, value)
+                for parameter, value in values.items() if value is not None}
+    else:
+        mdp = session.open(args.file)
+        for parameter in args.parameters:
+            name = mdp.find_option(parameter)
+            if name is not None:
+                found[parameter] = (name, mdp.options[name].value)
+
+    status = 0
+    for parameter in args.parameters:
+        if parameter not in found:
+            print("pygromacs: option '%s' not in '%s'" % (parameter, args.file),
+                    file=sys.stderr)
+            status = 1
+        elif len(args.parameters) == 1:
+            print(found[parameter][1])
+        else:
+            print("%s = %s" % found[parameter])
+
+    return status
+
+def _set(args, session):
+    options, comments = OrderedDict(), {}
+    for option in args.options:
+        if '=' not in option:
+            raise _Error("expected parameter=value, got '%s'" % option)
+        option, _, comment = option.partition(';')
+        parameter, value = (word.strip() for word in option.split('=', 1))
+        options[parameter] = value
+        comments[parameter] = comment.strip()
+
+    if session.socket:
+        if args.output or args.backup:
+            raise _Error("--output and --backup can not be used with a server")
+        session.request('set', args.file, options, comments, args.remove)
+        return 0
+
+    mdp = session.open(args.file)
+    if args.output:
+        mdp = copy.deepcopy(mdp)
+
+    for parameter, value in options.items():
+        mdp.set_option(mdp.find_option(parameter) or parameter, value,
+                comments[parameter])
+
+    for parameter in args.remove:
+        mdp.remove_option(mdp.find_option(parameter) or parameter)
+
+    output = args.output or args.file
+    if args.output:
+        session.files[output] = mdp
+    session.modified[output] = (mdp, args.backup)
+
+    return 0
+
+def _diff(args, session):
+    first, second = session.open(args.first), session.open(args.second)
+    first_values = {_normalise(p): o.value for p, o in first.options.items()}
+    second_values = {_normalise(p): o.value for p, o in second.options.items()}
+
+    status = 0
+    for key in sorted(set(first_values) | set(second_values)):
+        values = first_values.get(key), second_values.get(key)
+        if values[0] != values[1]:
+            print("%-24s %s | %s" % (key, *("(missing)" if value is None
+                else value for value in values)))
+            status = 1
+
+    return status
+
+def _search(args, session):
+    return 0 if session.open(args.file).search(args.query) else 1
+
+def _sweep(args, session):
+    from pygromacs.sweep import ParameterSpace
+    from pygromacs.utils import write_if_changed
+
+    parameters = [_pair(p) for p in args.parameter]
+    space = ParameterSpace(session.open(args.file),
+            [(p, values.split(',')) for p, values in parameters])
+    if args.derive:
+        constants = {}
+        for name, value in map(_pair, args.constant):
+            try:
+                constants[name] = float(value)
+            except ValueError:
+                raise _Error("constant '%s' is not a number" % name)
+        space = space.derive([_pair(d) for d in args.derive], constants)
+    if args.shard:
+        try:
+            space = space.shard(args.shard,
+                    method='hash' if args.hash else 'contiguous')
+        except ValueError:
+            raise _Error("bad shard '%s'" % args.shard)
+
+    # Rules are evaluated for a chunk of variants before any is written
+    count = 0
+    try:
+        for name, data in space.rendered():
+            write_if_changed(os.path.join(args.directory, name + '.mdp'), data)
+            count += 1
+    except (ValueError, SyntaxError, TypeError) as error:
+        raise _Error("bad rule: %s" % error)
+    print("Wrote %d variants to '%s'." % (count, args.directory))
+
+    return 0
+
+def _validate(args, session):
+    from pygromacs.schema import validate_many
+
+    errors = validate_many([session.open(path) for path in args.files],
+            args.strict)
+    for error in errors:
+        print("%s: %s = %s: %s" % (args.files[error.index], error.parameter,
+            error.value, error.message))
+
+    return 1 if errors else 0
+
+def _edit(args, session):
+    from pygromacs.edit import bulk_edit
+
+    summary = bulk_edit(args.patterns, OrderedDict(map(_pair, args.set)),
+            args.remove, dict(map(_pair, args.where)), args.backup,
+            args.dry_run, args.processes)
+    for path, error in sorted(summary['errors'].items()):
+        print("pygromacs: %s: %s" % (path, error), file=sys.stderr)
+
+    print("Matched %d files: %d %s, %d unchanged, %d skipped, %d failed." % (
+        summary['matched'], summary['changed'],
+        'would change' if args.dry_run else 'changed', summary['unchanged'],
+        summary['skipped'], len(summary['errors'])))
+
+    return 1 if summary['errors'] else 0
+
+def _index(args, session):
+    from pygromacs.search import SearchIndex
+
+    if not os.path.isdir(args.directory):
+        raise _Error("'%s' is not a directory" % args.directory)
+
+    with SearchIndex(_index_path(args)) as index:
+        summary = index.update(args.directory, args.pattern, args.processes,
+                args.cache)
+        total = len(index)
+    for path, error in sorted(summary['errors'].items()):
+        print("pygromacs: %s: %s" % (path, error), file=sys.stderr)
+
+    print("Indexed %d files: %d added, %d updated, %d removed, %d unchanged, "
+            "%d failed." % (total, summary['added'], summary['updated'],
+                summary['removed'], summary['unchanged'],
+                len(summary['errors'])))
+
+    return 1 if summary['errors'] else 0
+
+def _find(args, session):
+    from pygromacs.search import SearchIndex
+
+    path = _index_path(args)
+    if not os.path.isfile(path):
+        raise _Error("no index '%s', create it with 'pygromacs index'" % path)
+
+    conditions = {}
+    for condition in args.conditions:
+        if '=' in condition:
+            parameter, value = _pair(condition)
+        else:
+            parameter, value = condition.strip(), None
+        conditions[parameter] = value
+
+    with SearchIndex(path) as index:
+        paths = index.query(conditions)
+    for path in paths:
+        print(path)
+
+    return 0 if paths else 1
+
+def _watch(args, session):
+    from pygromacs.manifest import Manifest
+    from pygromacs.search import SearchIndex
+    from pygromacs.watch import watch
+
+    if not os.path.isdir(args.directory):
+        raise _Error("'%s' is not a directory" % args.directory)
+
+    def report(changes, summary):
+        for path, error in sorted(summary['errors'].items()):
+            print("pygromacs: %s: %s" % (path, error), file=sys.stderr)
+        print("%d files and %d directories changed: %d added, %d updated, "
+                "%d removed." % (len(changes.files), len(changes.trees),
+                    summary['added'], summary['updated'], summary['removed']))
+        sys.stdout.flush()
+
+    manifest = Manifest(args.manifest) if args.manifest else None
+    try:
+        with SearchIndex(_index_path(args)) as index:
+            watch(args.directory, index, manifest, args.cache, args.mdp_name,
+                    report, args.processes, pattern=args.pattern,
+                    debounce=args.debounce, interval=args.interval,
+                    polling=args.polling)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if manifest is not None:
+            manifest.close()
+
+    return 0
+
+def _index_path(args):
+    return args.index or os.path.join(args.directory, _index_name)
+
+def _serve(args, session):
+    from pygromacs.server import serve
+
+    try:
+        serve(args.path or args.socket, args.size)
+    except OSError as error:
+        raise _Error(error)
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+def _pair(text):
+    """Split a ``name=value`` argument."""
+
+    if '=' not in text:
+        raise _Error("expected name=value, got '%s'" % text)
+    name, value = text.split('=', 1)
+
+    return name.strip(), value.strip()
+
+_commands = {
+        'get': _get,
+        'set': _set,
+        'diff': _diff,
+        'search': _search,
+        'sweep': _sweep,
+        'validate': _validate,
+        'edit': _edit,
+        'index': _index,
+        'find': _find,
+        'watch': _watch,
+        'serve': _serve,
+        }
+
+if __name__ == '__main__':
+    sys.exit(main())
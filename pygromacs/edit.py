@@ -0,0 +1,99 @@
+import glob
+import os
+from pygromacs.gmxfiles import MdpFile, normalise_key
+from pygromacs.runs import render_mdp
+from pygromacs.utils import map_parallel, replace_file
+
+"""Bulk edits of many existing MDP files."""
+
+def bulk_edit(patterns, options=None, remove=(), where=None, backup=False,
+        dry_run=False, processes=None):
+    """Edit all MDP files matching glob patterns, in parallel.
+
+    Every file is read, edited and, if its content changed, atomically
+    replaced (see :func:`~pygromacs.utils.replace_file`). Options which
+    already have the new value are not touched, so that files which are
+    up to date are not rewritten. Parameters are matched ignoring case
+    and dashes.
+
+    Args:
+        patterns (str or list): Glob patterns of files, ``**`` matches
+            any number of directories
+        options (dict, optional): Parameters and values to set
+        remove (list, optional): Parameters to remove
+        where (dict, optional): Only edit files where these parameters
+            have these values (compared ignoring case)
+        backup (bool, optional): Keep a Gromacs style backup of every
+            replaced file
+        dry_run (bool, optional): Only count the files which would change
+        processes (int, optional): Number of processes (default: number
+            of processors)
+
+    Returns:
+        dict: The number of ``matched``, ``changed``, ``unchanged`` and
+            ``skipped`` (not meeting ``where``) files, and a dictionary
+            of ``errors`` by path of files which could not be edited
+
+    Example:
+        Switch all production runs to the Verlet cut-off scheme::
+
+            bulk_edit('runs/**/production.mdp', {'cutoff-scheme': 'Verlet'},
+                    where={'cutoff-scheme': 'group'})
+
+    """
+
+    if isinstance(patterns, str):
+        patterns = [patterns]
+
+    paths = sorted(set(path for pattern in patterns
+        for path in glob.glob(pattern, recursive=True) if os.path.isfile(path)))
+    spec = ({str(k): str(v) for k, v in (options or {}).items()}, list(remove),
+            {normalise_key(k): str(v).strip().lower()
+                for k, v in (where or {}).items()}, backup, dry_run)
+    results = map_parallel(_edit_file, [(path, spec) for path in paths],
+            processes)
+
+    summary = {'matched': len(paths), 'changed': 0, 'unchanged': 0,
+            'skipped': 0, 'errors': {}}
+    for path, (status, error) in zip(paths, results):
+        if status == 'error':
+            summary['errors'][path] = error
+        else:
+            summary[status] += 1
+
+    return summary
+
+def _edit_file(job):
+    """Edit a single file, returning its status and any error message."""
+
+    path, (options, remove, where, backup, dry_run) = job
+
+    try:
+        mdp = MdpFile(path)
+
+        values = {normalise_key(k): o.value.lower() for k, o in mdp.options.items()}
+        if any(values.get(key) != value for key, value in where.items()):
+            return 'skipped', None
+
+        # Whether the file changes is decided by its options, so that an
+        # unchanged file is not rendered, nor are mixed line breaks unified
+        changed = False
+        for parameter, value in options.items():
+            name = mdp.find_option(parameter)
+            if name is None or mdp.options[name].value != value:
+                mdp.set_option(name or parameter, value)
+                changed = True
+        for parameter in remove:
+            name = mdp.find_option(parameter)
+            if name is not None:
+                mdp.remove_option(name)
+                changed = True
+
+        if not changed:
+            return 'unchanged', None
+        if not dry_run:
+            replace_file(path, render_mdp(mdp), backup)
+    except (OSError, UnicodeDecodeError) as error:
+        return 'error', str(error)
+
+    return 'changed', None
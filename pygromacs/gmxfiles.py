@@ -1,20 +1,366 @@
 #!/usr/bin/env python
 
+import mmap
 import os
-from contextlib import redirect_stdout
-from pygromacs.utils import prepare_path
+import re
+from collections import OrderedDict
+from pygromacs.utils import lazy_import, map_async, map_parallel, \
+        prepare_path, run_blocking
+
+np = lazy_import('numpy')
 
 """Interfaces for reading and modifying Gromacs standard files."""
 
-class Topol(object):
+_xvg_header = re.compile(
+        r'(title|[xy]axis|s\d+)\s+(?:label\s+|legend\s+)?"(.*)"')
+_section_header = re.compile(rb'^[ \t]*\[[ \t]*([^\]\s]+)[ \t]*\]', re.M)
+
+class AsyncFile(object):
+    """Coroutines for reading and saving files without blocking.
+
+    Blocking I/O is run in a shared, bounded thread pool (see
+    :func:`~pygromacs.utils.run_blocking`), so that many files can be
+    read or saved concurrently from an :mod:`asyncio` event loop.
+
+    """
+
+    @classmethod
+    async def aread(cls, path):
+        """Read a file at ``path`` and return it."""
+
+        return await run_blocking(cls, path)
+
+    async def asave(self, path="", **kwargs):
+        """Save the file, taking the arguments of its ``save``."""
+
+        return await run_blocking(self.save, path, **kwargs)
+
+    @classmethod
+    async def aread_many(cls, paths, limit=64):
+        """Read files at all ``paths``, at most ``limit`` at a time.
+
+        Returns:
+            list: The read files, in order
+
+        """
+
+        return await map_async(cls, paths, limit)
+
+    @staticmethod
+    async def asave_many(files, paths=None, limit=64, **kwargs):
+        """Save files, at most ``limit`` at a time.
+
+        Args:
+            files (list): Files to save
+            paths (list, optional): Paths to save files to (default:
+                their :attr:`path`)
+            limit (int, optional): Maximum number of concurrent saves
+            **kwargs: Further arguments to every ``save``
+
+        """
+
+        if paths is None:
+            paths = [""]*len(files)
+
+        await map_async(lambda job: job[0].save(job[1], **kwargs),
+                list(zip(files, paths)), limit)
+
+class Topol(AsyncFile):
+    """Container for topology files, edited in place.
+
+    The file is not parsed as a whole. On reading the byte offsets of
+    all sections are indexed and only the ``[ molecules ]`` section is
+    parsed. Since it is by convention the final section of a topology
+    a save only has to rewrite the tail of the file, starting from it.
+
+    Args:
+        path (str, optional): Read from file at this path
+
+    Attributes:
+        path: Path to the last-read file. Used as default by :func:`save`,
+            which then modifies the file in place.
+
+        sections: An ordered list of ``(name, start, end)`` tuples with the
+            byte offsets of every section header and section end in the file.
+
+        molecules: An ordered list of :class:`Molecule` objects, containing
+            the lines of the ``[ molecules ]`` section.
+
+        newline: The line break of the file, ``"\\n"`` or ``"\\r\\n"``,
+            which ends modified and added lines.
+
+    """
+
+    def __init__(self, path=""):
+        self.path = path
+        self.sections = []
+        self.molecules = []
+        self.newline = "\n"
+
+        # Byte offset of the molecules section body and the original tail
+        self._offset = 0
+        self._tail = b""
+        self._suffix = b""
+        self._header = True
+        self._unterminated = False
+
+        if self.path:
+            self.read(path)
+
+    class Molecule(object):
+        """Container for a line in the ``[ molecules ]`` section.
+
+        Lines without a molecule name (comments, empty lines and
+        preprocessor directives) are kept as they are.
+
+        Args:
+            name (str): A molecule name,
+            count (int): its number in the system
+            comment (str): and comment
+            raw (str, optional): The original line, if it has not
+                been modified
+
+        """
+
+        def __init__(self, name="", count=0, comment="", raw=None):
+            self.name = str(name)
+            self.count = int(count)
+            self.comment = str(comment)
+            self.raw = raw
+
+        def print(self):
+            """Print the molecule as a line."""
+
+            print(self.format(), end="")
+
+        def format(self, newline="\n"):
+            """Return the molecule as a line, unchanged if not modified.
+
+            Args:
+                newline (str, optional): The line break of a modified line
+
+            """
+
+            if self.raw is not None:
+                return self.raw
+
+            string = ""
+            if self.name:
+                string += "%-15s %8d" % (self.name, self.count)
+            if self.comment:
+                string += " ; %s" % self.comment if self.name else "; %s" % self.comment
+
+            return string + newline
+
+    def get_molecule(self, name):
+        """Return the number of a molecule in the system.
+
+        Args:
+            name (str): A molecule name
+
+        Returns:
+            int: The molecule count, 0 if not found
+
+        """
+
+        molecule = self._find(name)
+        if molecule is None:
+            print("molecule '%s' not in list" % name)
+            return 0
+
+        return molecule.count
+
+    def set_molecule(self, name, count, comment=""):
+        """Set the number of a molecule.
+
+        If the molecule is not in the list it is added after the last
+        molecule of :attr:`molecules`, or before the empty lines at the
+        end of the section if there is none.
+
+        Args:
+            name (str): A molecule name,
+            count (int): its new number
+            comment (str, optional): and comment
+
+        """
+
+        molecule = self._find(name)
+        if molecule is None:
+            molecule = self.Molecule(name, count)
+            self.molecules.insert(self._insertion_index(), molecule)
+
+        molecule.count = int(count)
+        if comment:
+            molecule.comment = comment.lstrip(';').strip()
+        molecule.raw = None
+
+    def remove_molecule(self, name):
+        """Remove a molecule from the list."""
 
-    def __init__(self, **kwargs):
-        self.filename = kwargs.pop('file', None)
-        self.read()
+        molecule = self._find(name)
+        if molecule is not None:
+            self.molecules.remove(molecule)
+
+    def _insertion_index(self):
+        """Return the index in :attr:`molecules` at which to add a molecule."""
+
+        named = [i for i, molecule in enumerate(self.molecules) if molecule.name]
+        if named:
+            return named[-1] + 1
+
+        index = len(self.molecules)
+        while index > 0 and not self.molecules[index - 1].format().strip():
+            index -= 1
+
+        return index
+
+    def _find(self, name):
+        for molecule in self.molecules:
+            if molecule.name == name:
+                return molecule
 
         return None
 
-class MdpFile(object):
+    def read(self, path):
+        """Read a topology file at ``path``.
+
+        Updates :attr:`path` to given value. The section offsets are
+        stored in :attr:`sections` and the molecules in :attr:`molecules`.
+
+        """
+
+        def parse_line(line):
+            try:
+                entry, comment = line.split(';', 1)
+            except ValueError:
+                entry, comment = line, ""
+            fields = entry.split()
+            if len(fields) == 2 and not fields[0].startswith('#'):
+                try:
+                    return self.Molecule(fields[0], int(fields[1]),
+                            comment.strip(), line)
+                except ValueError:
+                    pass
+            return self.Molecule(raw=line)
+
+        # Verify file extension
+        if (not os.access(path, os.F_OK)) and (not path.endswith('.top')):
+            path += '.top'
+
+        self.path = path
+        self.sections = []
+        self.molecules = []
+        self.newline = "\n"
+        try:
+            with open(self.path, 'rb') as fp:
+                data = fp.read()
+        except FileNotFoundError:
+            print("could not open '%s' for reading" % self.path)
+            self.path = ""
+            return None
+
+        end = data.find(b'\n')
+        if end > 0 and data[end - 1:end] == b'\r':
+            self.newline = "\r\n"
+
+        headers = list(_section_header.finditer(data))
+        for i, match in enumerate(headers):
+            end = headers[i+1].start() if i+1 < len(headers) else len(data)
+            name = match.group(1).decode('ascii', 'replace')
+            self.sections.append((name, match.start(), end))
+
+        # Index the molecules section, or the end of file if there is none
+        molecules = [(name, start, end) for name, start, end in self.sections
+                if name == 'molecules']
+        if molecules:
+            _, start, end = molecules[-1]
+            self._offset = data.index(b'\n', start) + 1 \
+                    if b'\n' in data[start:end] else end
+            self._header = True
+            self._unterminated = self._offset == end \
+                    and not data[:end].endswith(b'\n')
+        else:
+            end = self._offset = len(data)
+            self._header = False
+            self._unterminated = False
+
+        self._tail = data[self._offset:]
+        self._suffix = data[end:]
+        body = data[self._offset:end].decode('utf-8', 'surrogateescape')
+        self.molecules = [parse_line(line)
+                for line in body.splitlines(keepends=True)]
+
+    def save(self, path="", verbose=True, ext='top'):
+        """Save current topology file.
+
+        When saving to :attr:`path` the file is modified in place: only the
+        tail of it, starting from the ``[ molecules ]`` section, is rewritten,
+        and nothing at all if the molecules were not modified. No backup
+        is taken of the file in this case.
+
+        Saving to another path copies the unchanged part of the file from
+        :attr:`path` and backs up any file already present there.
+
+        Args:
+            path (str, optional): Write file to this path (default: :attr:`path`)
+            verbose (bool, optional): Print information about save
+            ext (str, optional): Use this file extension (default: 'top')
+
+        """
+
+        if path == "":
+            path = self.path
+
+        # Verify file extension
+        if not path.endswith(ext):
+            path = '.'.join([path, ext])
+
+        tail = self._render()
+        inplace = bool(self.path) and os.path.exists(path) \
+                and os.path.samefile(path, self.path)
+
+        if inplace:
+            if tail != self._tail:
+                with open(path, 'r+b') as fp:
+                    fp.seek(self._offset)
+                    fp.write(tail)
+                    fp.truncate()
+        else:
+            head = b""
+            if self.path:
+                with open(self.path, 'rb') as fp:
+                    head = fp.read(self._offset)
+
+            prepare_path(path, verbose)
+            with open(path, 'wb') as fp:
+                fp.write(head + tail)
+
+        if inplace:
+            self._tail = tail
+
+        if verbose:
+            print("Saved topology file to '%s'." % path)
+
+    def _render(self):
+        newline = self.newline
+        lines = [molecule.format(newline) for molecule in self.molecules]
+
+        # Lines followed by an added one after an unterminated last line
+        # need a line break
+        for i, line in enumerate(lines[:-1]):
+            if not line.endswith('\n'):
+                lines[i] = line + newline
+        tail = ''.join(lines).encode('utf-8', 'surrogateescape')
+
+        newline = newline.encode()
+        if not self._header and self.molecules:
+            tail = newline + b"[ molecules ]" + newline + tail
+        elif self._unterminated and tail:
+            # The header is the last line of the file, without a line break
+            tail = newline + tail
+        return tail + self._suffix
+
+class MdpFile(AsyncFile):
     """Container for MDP files.
 
     Args:
@@ -33,12 +379,24 @@ class MdpFile(object):
             :attr:`lines`. Used internally to quickly access any parameter
             of that list and thus file.
 
+        newline: The line break of the file, ``"\\n"`` or ``"\\r\\n"``.
+
+        final_newline: Whether the last line ends with a line break.
+
+    Edits made with :func:`set_option`, :func:`set_comment` and
+    :func:`remove_option` are logged, so that they can be undone and
+    redone, or rolled back to a :func:`snapshot`.
+
     """
 
     def __init__(self, path=""):
         self.path = path
         self.lines = []
         self.options = {}
+        self.newline = "\n"
+        self.final_newline = True
+        self._history = []
+        self._position = 0
 
         if self.path:
             self.read(path)
@@ -51,14 +409,18 @@ class MdpFile(object):
             value (str): its value
             comment (str): and comment
             index (int): Index of option in :attr:`MdpFile.lines`
+            raw (str, optional): The original line, if it has not
+                been modified
 
         """
 
-        def __init__(self, parameter="", value="", comment="", index=None):
+        def __init__(self, parameter="", value="", comment="", index=None,
+                raw=None):
             self.parameter = str(parameter)
             self.value = str(value)
             self.comment = str(comment)
             self.index = index
+            self.raw = raw
 
         def print(self, comment=True):
             """Print option as a line.
@@ -68,13 +430,134 @@ class MdpFile(object):
 
             """
 
+            string = self.format(comment)
+            if string is not None:
+                print(string)
+
+        def format(self, comment=True):
+            """Return the option as printed, None if it is not printed.
+
+            An unmodified line is returned as it was read.
+
+            """
+
+            if self.raw is not None:
+                if comment:
+                    return self.raw
+                if self.parameter:
+                    return self.raw.split(';', 1)[0].rstrip()
+                return None
+
             string = ""
             if self.parameter:
                 string += "%-24s = %s" % (self.parameter, self.value)
             if comment and self.comment:
                 string += "; %s" % self.comment
             if self.parameter or comment:
-                print(string)
+                return string
+
+            return None
+
+    class Template(object):
+        """A compiled MDP file with slots for the values of some parameters.
+
+        The static text of the file is rendered once into byte chunks
+        between the slots, so that rendering a variant is a join of a few
+        chunks, independent of the length of the file. Created by
+        :func:`MdpFile.compile`.
+
+        Attributes:
+            parameters: The parameters with a slot.
+
+            chunks: Byte strings before, between and after the slot lines.
+
+            heads: The start of every slot line, up to its value.
+
+            values: The default value of every slot.
+
+            comments: The default comment of every slot, as written.
+
+            raws: The unmodified line of every slot, None for new lines.
+
+            comment: Whether comments are written.
+
+            newline: The line break, as bytes.
+
+            final_newline: Whether the last line ends with a line break.
+
+        """
+
+        def __init__(self, parameters, chunks, heads, values, comments, raws,
+                comment=True, newline=b"\n", final_newline=True):
+            self.parameters = parameters
+            self.chunks = chunks
+            self.heads = heads
+            self.values = values
+            self.comments = comments
+            self.raws = raws
+            self.comment = comment
+            self.newline = newline
+            self.final_newline = final_newline
+
+        def render(self, values=None, comments=None):
+            """Return the file content with values filled in.
+
+            Args:
+                values (dict, optional): Values of slotted parameters, the
+                    default values are used for any other
+                comments (dict, optional): Replace the comments of
+                    slotted parameters
+
+            Returns:
+                bytes: The file content, as written by :func:`MdpFile.save`
+                    after setting the values and comments
+
+            """
+
+            values = values or {}
+            comments = comments or {}
+
+            parts = [self.chunks[0]]
+            for parameter, head, value, comment, raw, chunk in zip(
+                    self.parameters, self.heads, self.values, self.comments,
+                    self.raws, self.chunks[1:]):
+                if raw is not None and parameter not in values \
+                        and parameter not in comments:
+                    parts += [raw, chunk]
+                    continue
+
+                if parameter in comments and self.comment:
+                    comment = ("; %s" % comments[parameter]).encode() \
+                            if comments[parameter] else b""
+                parts += [head, str(values.get(parameter, value)).encode(),
+                        comment, self.newline, chunk]
+
+            data = b"".join(parts)
+            if not self.final_newline and data.endswith(self.newline):
+                data = data[:-len(self.newline)]
+
+            return data
+
+    def find_option(self, parameter):
+        """Return the name of a parameter as it is set in the file.
+
+        Parameters are matched as by Gromacs, ignoring case and dashes
+        (see :func:`normalise_key`).
+
+        Returns:
+            str: The parameter as spelt in :attr:`options`, None if not set
+
+        """
+
+        if parameter in self.options:
+            return parameter
+
+        key = normalise_key(parameter)
+        for name in self.options:
+            if normalise_key(name) == key:
+                return name
+
+        return None
 
     def get_option(self, parameter):
         """Return the value of a parameter.
@@ -103,7 +586,9 @@ class MdpFile(object):
             return None
 
         # Verify that comment is of good form
-        self.options[parameter].comment = comment.lstrip(';').strip()
+        option = self.options[parameter]
+        self._edit([('change', option, _option_state(option),
+            (option.value, comment.lstrip(';').strip(), None))])
 
         return None
 
@@ -121,27 +606,131 @@ class MdpFile(object):
         """
 
         if parameter in self.options.keys():
-            self.options[parameter].value = str(value)
+            option = self.options[parameter]
+            if comment:
+                comment = comment.lstrip(';').strip()
+            else:
+                comment = option.comment
+            self._edit([('change', option, _option_state(option),
+                (str(value), comment, None))])
         else:
             index = len(self.lines)
-            self.options[parameter] = self.MdpOption(parameter, value, "", index)
-            self.lines.append(self.options[parameter])
-
-        if comment:
-            self.set_comment(parameter, comment)
+            self._edit([('insert', self.MdpOption(parameter, value,
+                comment.lstrip(';').strip(), index))])
 
     def remove_option(self, parameter):
         """Remove a parameter from the file."""
 
         if parameter in self.options.keys():
-            # Find index of parameter and remove
-            index = self.options[parameter].index
-            self.options.pop(parameter)
+            self._edit([('remove', self.options[parameter])])
+
+    def snapshot(self):
+        """Return a snapshot of the file to :func:`restore` later.
+
+        A snapshot is a position in the log of edits, so taking it costs
+        nothing regardless of the size of the file.
+
+        """
+
+        return (self._position,
+                self._history[self._position - 1] if self._position else None)
+
+    def restore(self, snapshot):
+        """Undo or redo edits back to a :func:`snapshot`.
+
+        Raises:
+            ValueError: If the edits since the snapshot have been undone
+                and replaced by other edits
+
+        """
+
+        position, edit = snapshot
+        if position > len(self._history) or (position
+                and self._history[position - 1] is not edit):
+            raise ValueError("snapshot is no longer in the history")
+
+        while self._position > position:
+            self.undo()
+        while self._position < position:
+            self.redo()
+
+    def undo(self):
+        """Undo the last edit.
+
+        Returns:
+            bool: False if there was nothing to undo
+
+        """
+
+        if self._position == 0:
+            return False
+
+        self._position -= 1
+        for operation in reversed(self._history[self._position]):
+            self._apply(operation, undo=True)
+
+        return True
+
+    def redo(self):
+        """Redo the last undone edit.
+
+        Returns:
+            bool: False if there was nothing to redo
+
+        """
+
+        if self._position == len(self._history):
+            return False
+
+        for operation in self._history[self._position]:
+            self._apply(operation)
+        self._position += 1
+
+        return True
+
+    def clear_history(self):
+        """Forget all logged edits, which can then not be undone.
+
+        Snapshots taken before can no longer be restored.
+
+        """
+
+        self._history = []
+        self._position = 0
+
+    def _edit(self, operations):
+        """Apply an edit and log it, dropping any undone edits."""
+
+        for operation in operations:
+            self._apply(operation)
+
+        del self._history[self._position:]
+        self._history.append(operations)
+        self._position += 1
+
+    def _apply(self, operation, undo=False):
+        """Apply an operation of an edit, or its inverse."""
+
+        kind, option = operation[:2]
+        if kind == 'change':
+            option.value, option.comment, option.raw = \
+                    operation[2] if undo else operation[3]
+        elif (kind == 'insert') != undo:
+            index = option.index
+            self.lines.insert(index, option)
+            self.options[option.parameter] = option
+
+            # Adjust indices of following in list
+            for following in self.lines[index + 1:]:
+                following.index += 1
+        else:
+            index = option.index
+            self.options.pop(option.parameter)
             self.lines.pop(index)
 
             # Adjust indices of following in list
-            for option in self.lines[index:]:
-                option.index -= 1
+            for following in self.lines[index:]:
+                following.index -= 1
 
     def search(self, parameter):
         """Search for a parameter in the file.
@@ -169,6 +758,106 @@ class MdpFile(object):
         if parameter in self.options.keys():
             self.options[parameter].print()
 
+    def to_dict(self, raw=False):
+        """Return the file as a dictionary of plain types, e.g. for JSON.
+
+        The dictionary has the ``path`` and a list of ``lines``, each
+        a dictionary of the (non-empty) ``parameter``, ``value`` and
+        ``comment`` of a line, in order.
+
+        Args:
+            raw (bool, optional): Include the ``raw`` text of unmodified
+                lines, to write them unchanged after :func:`from_dict`
+
+        Returns:
+            dict: The file
+
+        """
+
+        lines = []
+        for option in self.lines:
+            fields = (('parameter', option.parameter), ('value', option.value),
+                    ('comment', option.comment),
+                    ('raw', option.raw if raw else None))
+            lines.append({key: value for key, value in fields if value})
+
+        return {'path': self.path, 'lines': lines}
+
+    @classmethod
+    def from_dict(cls, data):
+        """Create a file from a dictionary as returned by :func:`to_dict`.
+
+        Options may also be given as a dictionary ``options`` of parameters
+        and values, which are set after any ``lines``. A ``raw`` line is
+        only kept if it still matches the parameter, value and comment.
+
+        """
+
+        mdp = cls()
+        mdp.path = data.get('path', "")
+        for index, line in enumerate(data.get('lines', [])):
+            option = cls.MdpOption(line.get('parameter', ""),
+                    line.get('value', ""), line.get('comment', ""), index)
+            raw = line.get('raw')
+            if raw is not None and _parse_mdp_line(raw) \
+                    == [option.parameter, option.value, option.comment]:
+                option.raw = raw
+            mdp.lines.append(option)
+            if option.parameter and option.value:
+                mdp.options[option.parameter] = option
+
+        for parameter, value in data.get('options', {}).items():
+            mdp.set_option(parameter, value)
+        mdp.clear_history()
+
+        return mdp
+
+    def compile(self, parameters, comment=True):
+        """Compile the file into a template with slots for some parameters.
+
+        Parameters which are not in the file get a slot in a line
+        appended to the end, as if set with :func:`set_option`.
+
+        Args:
+            parameters (list): The parameters to render values of
+            comment (bool, optional): Include comments
+
+        Returns:
+            Template: The compiled file
+
+        """
+
+        parameters = list(OrderedDict.fromkeys(str(p) for p in parameters))
+        slots = {self.options[parameter].index: parameter
+                for parameter in parameters if parameter in self.options}
+        lines = list(self.lines) + [self.MdpOption(parameter, "", "", None)
+                for parameter in parameters if parameter not in self.options]
+
+        newline = self.newline
+        chunks, heads, values, comments, raws = [], [], [], [], []
+        static = []
+        for index, option in enumerate(lines):
+            if index in slots or option.index is None:
+                chunks.append("".join(static).encode())
+                heads.append(("%-24s = " % option.parameter).encode())
+                values.append(option.value)
+                comments.append(("; %s" % option.comment).encode()
+                        if comment and option.comment else b"")
+                raws.append((option.format(comment) + newline).encode()
+                        if option.raw is not None else None)
+                static = []
+            else:
+                string = option.format(comment)
+                if string is not None:
+                    static.append(string + newline)
+        chunks.append("".join(static).encode())
+
+        order = [slots.get(option.index, option.parameter) for option in lines
+                if option.index in slots or option.index is None]
+
+        return self.Template(order, chunks, heads, values, comments, raws,
+                comment, newline.encode(), self.final_newline)
+
     def print(self, comment=True):
         """Print the current file.
 
@@ -177,33 +866,40 @@ class MdpFile(object):
 
         """
 
-        for option in self.lines:
-            option.print(comment)
+        print(self.format(comment), end="")
+
+    def format(self, comment=True):
+        """Return the current file as text, as it is printed and saved.
+
+        Args:
+            comment (bool, optional): Include or ignore comments
+
+        """
+
+        strings = (option.format(comment) for option in self.lines)
+        text = "".join(string + self.newline
+                for string in strings if string is not None)
+        if not self.final_newline and text.endswith(self.newline):
+            text = text[:-len(self.newline)]
+
+        return text
 
     def read(self, path):
         """Read an MDP file at ``path``.
 
         Updates :attr:`path` to given value. Parameters and lines
-        are stored in :attr:`lines` and :attr:`options`.
+        are stored in :attr:`lines` and :attr:`options`. The line break
+        of the first line is kept in :attr:`newline`, so a file with
+        mixed line breaks is written with that of its first line.
 
         """
 
-        def parse_line(line):
-            try:
-                option, comment = line.split(';', 1)
-            except ValueError:
-                option, comment = line, ""
-            try:
-                parameter, value = option.split('=')
-            except ValueError:
-                parameter, value = "", ""
-            return [var.strip() for var in (parameter, value, comment)]
-
         def add_line(line, index):
-            parameter, value, comment = parse_line(line)
+            parameter, value, comment = _parse_mdp_line(line)
 
-            # Link option keyword to place in ordered list
-            option = self.MdpOption(parameter, value, comment, index)
+            # Link option keyword to place in ordered list, keeping
+            # the line to write it unchanged
+            option = self.MdpOption(parameter, value, comment, index, line)
             if parameter and value:
                 self.options[parameter] = option
 
@@ -216,10 +912,23 @@ class MdpFile(object):
         self.path = path
         self.lines = []
         self.options = {}
+        self.newline = "\n"
+        self.final_newline = True
+        self._history = []
+        self._position = 0
         try:
-            with open(self.path, 'r') as fp:
-                self.lines = [add_line(line, index)
-                        for index, line in enumerate(fp.readlines())]
+            with open(self.path, 'r', newline='') as fp:
+                lines = fp.read().split('\n')
+
+            # Only the last line is not followed by a line break
+            last = lines.pop()
+            self.newline = "\r\n" if lines and lines[0].endswith('\r') else "\n"
+            self.final_newline = last == ""
+            lines = [line[:-1] if line.endswith('\r') else line for line in lines]
+            if not self.final_newline:
+                lines.append(last)
+            self.lines = [add_line(line, index)
+                    for index, line in enumerate(lines)]
 
         except FileNotFoundError:
             self.path = ""
@@ -248,10 +957,995 @@ class MdpFile(object):
         prepare_path(path, verbose)
 
         # Actually save the file
-        with open(path, 'w') as fp:
-            with redirect_stdout(fp):
-                self.print()
+        with open(path, 'w', newline='') as fp:
+            fp.write(self.format())
 
         if verbose:
             print("Saved MDP file to '%s'." % path, end = "")
 
+
+class GroFile(AsyncFile):
+    """Container for GRO coordinate files.
+
+    The atom records of a file are fixed-width, so they are parsed by
+    slicing the columns of the whole buffer at once into NumPy arrays.
+    Files are memory-mapped and only the first frame is read. Further
+    frames of a trajectory are accessed through :attr:`frames`.
+
+    Args:
+        path (str, optional): Read from file at this path
+
+    Attributes:
+        path: Path to the last-read file.
+
+        title: The title line of the file.
+
+        residue_numbers, atom_numbers: Integer arrays of the residue and
+            atom numbers, as written in the file.
+
+        residue_names, atom_names: String arrays of residue and atom names.
+
+        positions: An array of shape ``(N, 3)`` with atom positions (nm).
+
+        velocities: An array of shape ``(N, 3)`` with atom velocities (nm/ps),
+            or None if the file has no velocities.
+
+        box: The box vectors, an array of 3 or 9 values.
+
+        precision: Number of decimals of the positions, as read from the
+            file (default: 3). Used by :func:`save`.
+
+        frames: A :class:`Frames` sequence of all frames in the file at
+            :attr:`path`, created when first used.
+
+    """
+
+    def __init__(self, path=""):
+        self.path = path
+        self.title = ""
+        self.residue_numbers = np.zeros(0, dtype=np.int64)
+        self.residue_names = np.zeros(0, dtype='U5')
+        self.atom_names = np.zeros(0, dtype='U5')
+        self.atom_numbers = np.zeros(0, dtype=np.int64)
+        self.positions = np.zeros((0, 3))
+        self.velocities = None
+        self.box = np.zeros(3)
+        self.precision = 3
+        self._frames = None
+
+        if self.path:
+            self.read(path)
+
+    def __len__(self):
+        return len(self.positions)
+
+    class Frames(object):
+        """Random access to the frames of a multi-frame GRO file.
+
+        The file is memory-mapped and the offset of every frame is indexed
+        in a single scan. The index is cached in a hidden file next to the
+        file and reused as long as the file size and modification time
+        are unchanged. Frames are parsed only when accessed.
+
+        Indexing returns a :class:`GroFile` of a frame and slicing
+        returns a new :class:`Frames` of the selected frames.
+
+        Args:
+            path (str): Path to a GRO file
+
+        Attributes:
+            path: Path to the file.
+
+            offsets: An array with the byte offset of every frame.
+
+        """
+
+        def __init__(self, path, offsets=None, data=None):
+            self.path = path
+            self._data = data if data is not None else _map_file(path)
+
+            if offsets is None:
+                offsets = self._read_index()
+            self.offsets = offsets
+
+        def __len__(self):
+            return len(self.offsets)
+
+        def __getitem__(self, key):
+            if isinstance(key, slice):
+                return self.__class__(self.path, self.offsets[key], self._data)
+
+            frame, _ = _read_gro_frame(self._data, int(self.offsets[key]))
+            gro = GroFile()
+            gro.path = self.path
+            for attr, value in frame.items():
+                setattr(gro, attr, value)
+
+            return gro
+
+        def __iter__(self):
+            for i in range(len(self)):
+                yield self[i]
+
+        def _read_index(self):
+            directory, filename = os.path.split(self.path)
+            index_path = os.path.join(directory, '.%s.frames.npy' % filename)
+            stat = os.stat(self.path)
+            signature = [stat.st_size, stat.st_mtime_ns]
+
+            try:
+                index = np.load(index_path)
+                if list(index[:2]) == signature:
+                    return index[2:]
+            except (OSError, ValueError):
+                pass
+
+            offsets = []
+            pos = 0
+            while pos < len(self._data):
+                # Skip empty lines between frames
+                line_end = _find_newline(self._data, pos)
+                if not self._data[pos:line_end].tobytes().strip():
+                    pos = line_end + 1
+                    continue
+
+                offsets.append(pos)
+                _, _, _, end = _locate_gro_frame(self._data, pos, pad=False)
+                pos = _find_newline(self._data, end) + 1
+            offsets = np.array(offsets, dtype=np.int64)
+
+            # Caching is optional, the directory may not be writable
+            try:
+                with open(index_path, 'wb') as fp:
+                    np.save(fp, np.concatenate((signature, offsets)))
+            except OSError:
+                pass
+
+            return offsets
+
+    @property
+    def frames(self):
+        """The :class:`Frames` of the read file, indexed on first access.
+
+        Raises:
+            ValueError: If no file was read
+
+        """
+
+        if not self.path:
+            raise ValueError("no file was read to index frames of")
+        if self._frames is None:
+            self._frames = self.Frames(self.path)
+
+        return self._frames
+
+    def read(self, path):
+        """Read a GRO file at ``path``.
+
+        Updates :attr:`path` to given value.
+
+        """
+
+        # Verify file extension
+        if (not os.access(path, os.F_OK)) and (not path.endswith('.gro')):
+            path += '.gro'
+
+        self.path = path
+        self._frames = None
+        try:
+            data = _map_file(self.path)
+        except FileNotFoundError:
+            print("could not open '%s' for reading" % self.path)
+            self.path = ""
+            return None
+
+        frame, _ = _read_gro_frame(data)
+        for key, value in frame.items():
+            setattr(self, key, value)
+
+    def save(self, path="", verbose=True, ext='gro', mask=None, precision=None):
+        """Save current GRO file.
+
+        All columns are formatted at once into a fixed-width byte array,
+        which is written in a single call. Residue and atom numbers wrap
+        around at 100000 as in Gromacs.
+
+        Args:
+            path (str, optional): Write file to this path (default: :attr:`path`)
+            verbose (bool, optional): Print information about save
+            ext (str, optional): Use this file extension (default: 'gro')
+            mask (array, optional): Boolean mask or indices of atoms to write
+            precision (int, optional): Number of decimals for positions,
+                velocities are written with one more (default:
+                :attr:`precision`)
+
+        """
+
+        if path == "":
+            path = self.path
+
+        # Verify file extension
+        if not path.endswith(ext):
+            path = '.'.join([path, ext])
+
+        data = self._format(mask, precision)
+
+        # Verify path and backup collision
+        prepare_path(path, verbose)
+
+        with open(path, 'wb') as fp:
+            fp.write(data)
+
+        if verbose:
+            print("Saved GRO file to '%s'." % path)
+
+    def _format(self, mask=None, precision=None):
+        """Return the file content with atoms in ``mask`` as bytes."""
+
+        if precision is None:
+            precision = self.precision
+
+        def select(array):
+            return array if mask is None else array[mask]
+
+        positions = select(self.positions)
+        num_atoms = len(positions)
+        width = precision + 5
+
+        columns = [
+            _format_fixed(select(self.residue_numbers) % 100000, 5),
+            _format_names(select(self.residue_names), 5, left=True),
+            _format_names(select(self.atom_names), 5),
+            _format_fixed(select(self.atom_numbers) % 100000, 5),
+            _format_fixed(positions.reshape(-1), width, precision)
+                    .reshape(num_atoms, 3*width)
+            ]
+        if self.velocities is not None:
+            columns.append(_format_fixed(select(self.velocities).reshape(-1),
+                width, precision + 1).reshape(num_atoms, 3*width))
+        columns.append(np.full((num_atoms, 1), 10, dtype=np.uint8))
+
+        header = "%s\n%5d\n" % (self.title, num_atoms)
+        box = ''.join("%10.5f" % value for value in self.box) + "\n"
+
+        return b''.join([header.encode(),
+            np.concatenate(columns, axis=1).tobytes(), box.encode()])
+
+class NdxFile(AsyncFile):
+    """Container for index files.
+
+    Groups are parsed into integer arrays in a single pass over the file,
+    in which all numbers are tokenised at once. Group algebra is done
+    with the vectorised set routines of NumPy.
+
+    Args:
+        path (str, optional): Read from file at this path
+
+    Attributes:
+        path: Path to the last-read file. Used as default by :func:`save`
+            when writing changes to disk.
+
+        groups: An ordered dictionary of group names, linking to integer
+            arrays of the (1-based) atom numbers in the group.
+
+    """
+
+    def __init__(self, path=""):
+        self.path = path
+        self.groups = OrderedDict()
+
+        if self.path:
+            self.read(path)
+
+    def get_group(self, name):
+        """Return the atoms of a group.
+
+        Args:
+            name (str): A group name
+
+        Returns:
+            array: The atom numbers, empty if not found
+
+        """
+
+        try:
+            atoms = self.groups[name]
+        except KeyError:
+            atoms = np.zeros(0, dtype=np.int64)
+            print("group '%s' not in list" % name)
+
+        return atoms
+
+    def set_group(self, name, atoms):
+        """Set the atoms of a group.
+
+        If the group is not set it is appended to the end of :attr:`groups`.
+
+        Args:
+            name (str): A group name,
+            atoms (array): and its atom numbers
+
+        """
+
+        self.groups[str(name)] = np.asarray(atoms, dtype=np.int64).ravel()
+
+    def remove_group(self, name):
+        """Remove a group from the file."""
+
+        self.groups.pop(name, None)
+
+    def union(self, first, second, name=""):
+        """Return the sorted union of two groups.
+
+        Args:
+            first, second (str or array): Group names or atom numbers
+            name (str, optional): Also set the result as this group
+
+        """
+
+        return self._combine('union', first, second, name)
+
+    def intersection(self, first, second, name=""):
+        """Return the sorted intersection of two groups.
+
+        Args:
+            first, second (str or array): Group names or atom numbers
+            name (str, optional): Also set the result as this group
+
+        """
+
+        return self._combine('intersection', first, second, name)
+
+    def difference(self, first, second, name=""):
+        """Return the sorted atoms of the first group not in the second.
+
+        Args:
+            first, second (str or array): Group names or atom numbers
+            name (str, optional): Also set the result as this group
+
+        """
+
+        return self._combine('difference', first, second, name)
+
+    def _combine(self, operation, first, second, name):
+        def atoms(group):
+            return self.get_group(group) if isinstance(group, str) \
+                    else np.asarray(group, dtype=np.int64)
+
+        first, second = atoms(first), atoms(second)
+        if operation == 'union':
+            result = _unique(np.concatenate((first, second)))
+        else:
+            result = _unique(first)
+            found = np.isin(result, second)
+            result = result[found if operation == 'intersection' else ~found]
+        result = result.astype(np.int64)
+        if name:
+            self.set_group(name, result)
+
+        return result
+
+    def read(self, path):
+        """Read an index file at ``path``.
+
+        Updates :attr:`path` to given value. Groups are stored
+        in :attr:`groups`.
+
+        """
+
+        # Verify file extension
+        if (not os.access(path, os.F_OK)) and (not path.endswith('.ndx')):
+            path += '.ndx'
+
+        self.path = path
+        self.groups = OrderedDict()
+        try:
+            data = _map_file(self.path)
+        except FileNotFoundError:
+            print("could not open '%s' for reading" % self.path)
+            self.path = ""
+            return None
+
+        # Only headers contain brackets, the rest of the file is numbers
+        headers = []
+        for pos in np.flatnonzero(data == 91):
+            line = data[pos:_find_newline(data, pos)].tobytes()
+            match = _section_header.match(line)
+            if match:
+                name = match.group(1).decode('utf-8', 'replace')
+                headers.append((name, pos + match.end()))
+
+        bounds = [pos for _, pos in headers[1:]] + [len(data)]
+        for (name, start), end in zip(headers, bounds):
+            if name in self.groups:
+                print("duplicate group '%s' ignored" % name)
+                continue
+
+            # The next header is cut at its bracket
+            body = data[start:end].tobytes().rpartition(b'[')[0] \
+                    if end < len(data) else data[start:end].tobytes()
+            try:
+                self.groups[name] = np.array(body.split(), dtype=np.int64)
+            except ValueError:
+                raise ValueError("bad atom number in group '%s' of '%s'"
+                        % (name, self.path))
+
+    def save(self, path="", verbose=True, ext='ndx'):
+        """Save current index file.
+
+        Groups are written with 15 atoms per line, each formatted
+        in bulk into a fixed-width byte array.
+
+        Args:
+            path (str, optional): Write file to this path (default: :attr:`path`)
+            verbose (bool, optional): Print information about save
+            ext (str, optional): Use this file extension (default: 'ndx')
+
+        """
+
+        if path == "":
+            path = self.path
+
+        # Verify file extension
+        if not path.endswith(ext):
+            path = '.'.join([path, ext])
+
+        chunks = []
+        for name, atoms in self.groups.items():
+            chunks.append(("[ %s ]\n" % name).encode())
+            chunks.append(_format_group(atoms))
+
+        # Verify path and backup collision
+        prepare_path(path, verbose)
+
+        with open(path, 'wb') as fp:
+            fp.write(b''.join(chunks))
+
+        if verbose:
+            print("Saved index file to '%s'." % path)
+
+class XvgFile(AsyncFile):
+    """Container for XVG data files.
+
+    Header metadata (the title, axis labels and data set legends) is parsed
+    from the ``@`` lines, while the data is converted to NumPy arrays with
+    one bulk conversion per data block. Large files can be read in
+    chunks with :func:`chunks`.
+
+    Args:
+        path (str, optional): Read from file at this path
+
+    Attributes:
+        path: Path to the last-read file.
+
+        title: The graph title.
+
+        xlabel, ylabel: The axis labels.
+
+        legends: A list of the data set legends, in order.
+
+        headers: A list of all ``@`` header lines, without the ``@``.
+
+        blocks: A list of 2D arrays, one for each data block of the file.
+            Blocks are separated by ``&`` lines.
+
+    """
+
+    def __init__(self, path=""):
+        self.path = path
+        self.title = ""
+        self.xlabel = ""
+        self.ylabel = ""
+        self.legends = []
+        self.headers = []
+        self.blocks = []
+
+        if self.path:
+            self.read(path)
+
+    @property
+    def data(self):
+        """The first data block, empty if there is none."""
+
+        return self.blocks[0] if self.blocks else np.zeros((0, 0))
+
+    @classmethod
+    def read_many(cls, paths, processes=None):
+        """Read many XVG files in parallel.
+
+        Args:
+            paths (list): Paths to files
+            processes (int, optional): Number of worker processes
+                (default: number of processors)
+
+        Returns:
+            list: The read :class:`XvgFile` objects, in order
+
+        """
+
+        return map_parallel(cls, paths, processes)
+
+    def read(self, path):
+        """Read an XVG file at ``path``.
+
+        Updates :attr:`path` to given value.
+
+        """
+
+        # Verify file extension
+        if (not os.access(path, os.F_OK)) and (not path.endswith('.xvg')):
+            path += '.xvg'
+
+        self._reset(path)
+        try:
+            data = _map_file(self.path)
+        except FileNotFoundError:
+            print("could not open '%s' for reading" % self.path)
+            self.path = ""
+            return None
+
+        self.blocks = [block for block in self._parse(data) if block.size > 0]
+
+    def chunks(self, path="", rows=100000):
+        """Read an XVG file at ``path`` in chunks.
+
+        The metadata of the file is read as with :func:`read` but the
+        data is not kept in :attr:`blocks`. Rows of all blocks are
+        yielded in order.
+
+        Args:
+            path (str, optional): Read file at this path (default: :attr:`path`)
+            rows (int, optional): Approximate number of rows per chunk
+
+        Yields:
+            array: The rows of a chunk of the file
+
+        """
+
+        if path == "":
+            path = self.path
+
+        # Verify file extension
+        if (not os.access(path, os.F_OK)) and (not path.endswith('.xvg')):
+            path += '.xvg'
+
+        self._reset(path)
+        with open(self.path, 'rb') as fp:
+            size = None
+            remainder = b""
+            while True:
+                # Estimate the chunk size in bytes from the first line widths
+                chunk = fp.read(size or 65536)
+                if not chunk:
+                    break
+
+                text, _, rest = (remainder + chunk).rpartition(b'\n')
+                if not text:
+                    remainder += chunk
+                    continue
+                remainder = rest
+
+                for block in self._parse(np.frombuffer(text + b'\n',
+                        dtype=np.uint8)):
+                    if block.size > 0:
+                        if size is None:
+                            size = max(65536, rows*len(text)//len(block))
+                        yield block
+
+            if remainder.strip():
+                for block in self._parse(np.frombuffer(remainder,
+                        dtype=np.uint8)):
+                    if block.size > 0:
+                        yield block
+
+    def _reset(self, path):
+        self.path = path
+        self.title = ""
+        self.xlabel = ""
+        self.ylabel = ""
+        self.legends = []
+        self.headers = []
+        self.blocks = []
+
+    def _parse(self, data):
+        """Parse a buffer of whole lines into metadata and data blocks.
+
+        Lines are classified by their first character, so that only the
+        (few) header lines are handled separately.
+
+        Returns:
+            list: Arrays of the data between header and separator lines
+
+        """
+
+        if len(data) == 0:
+            return []
+
+        starts = np.concatenate(([0], np.flatnonzero(data[:-1] == 10) + 1))
+        special = starts[np.isin(data[starts], (35, 38, 64))]
+
+        blocks = [[]]
+        pos = 0
+        for start in np.append(special, len(data)):
+            if start > pos:
+                blocks[-1].append(data[pos:start].tobytes())
+            if start == len(data):
+                break
+
+            pos = _find_newline(data, start) + 1
+            line = data[start:pos].tobytes().decode('utf-8', 'replace')
+            if line.startswith('&'):
+                blocks.append([])
+            elif line.startswith('@'):
+                self._parse_header(line[1:].strip())
+
+        return [_parse_columns(b''.join(block)) for block in blocks]
+
+    def _parse_header(self, line):
+        self.headers.append(line)
+
+        match = _xvg_header.match(line)
+        if match:
+            key, label = match.groups()
+            if key == 'title':
+                self.title = label
+            elif key == 'xaxis':
+                self.xlabel = label
+            elif key == 'yaxis':
+                self.ylabel = label
+            else:
+                index = int(key[1:])
+                self.legends.extend([""]*(index + 1 - len(self.legends)))
+                self.legends[index] = label
+
+def normalise_key(key):
+    """Normalise an MDP parameter name.
+
+    Gromacs ignores case and treats dashes and underscores as equal
+    in parameter names, so ``Tcoupl`` and ``ref-t`` become ``tcoupl``
+    and ``ref_t``.
+
+    """
+
+    return str(key).strip().lower().replace('-', '_')
+
+def _parse_mdp_line(line):
+    """Return the parameter, value and comment of an MDP line."""
+
+    try:
+        option, comment = line.split(';', 1)
+    except ValueError:
+        option, comment = line, ""
+    try:
+        parameter, value = option.split('=')
+    except ValueError:
+        parameter, value = "", ""
+    return [var.strip() for var in (parameter, value, comment)]
+
+def _option_state(option):
+    """Return the value, comment and raw line of an MDP option."""
+
+    return (option.value, option.comment, option.raw)
+
+def _map_file(path):
+    """Return a read-only memory map of a file as an array of bytes."""
+
+    with open(path, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size == 0:
+            return np.zeros(0, dtype=np.uint8)
+        data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return np.frombuffer(data, dtype=np.uint8)
+
+def _find_newline(data, pos):
+    """Return the index of the next line break in ``data`` from ``pos``."""
+
+    chunk = 4096
+    while pos < len(data):
+        found = np.flatnonzero(data[pos:pos+chunk] == 10)
+        if len(found) > 0:
+            return pos + int(found[0])
+        pos += chunk
+
+    return len(data)
+
+def _locate_gro_frame(data, start=0, pad=True):
+    """Locate the atom lines of a GRO frame starting at ``start``.
+
+    Args:
+        data (array): Bytes of the file
+        start (int, optional): Offset of the frame title
+        pad (bool, optional): Collect lines of varying length into
+            an array, otherwise only their end is located
+
+    Returns:
+        (int, int, array, int): Offset of the title end, number of atoms,
+            atom lines as a 2D byte array and offset of the box line
+
+    """
+
+    title_end = _find_newline(data, start)
+    count_end = _find_newline(data, title_end + 1)
+    num_atoms = int(data[title_end+1:count_end].tobytes())
+    begin = count_end + 1
+
+    # Fast path: all atom lines have the length of the first, so the
+    # block is a plain reshape of the buffer
+    length = _find_newline(data, begin) - begin + 1
+    end = begin + num_atoms*length
+    block = data[begin:end]
+    if len(block) == num_atoms*length \
+            and np.all(block[length-1::length] == 10):
+        lines = block.reshape(num_atoms, length)
+    elif pad:
+        lines, end = _pad_lines(data, begin, num_atoms)
+    else:
+        ends = _line_ends(data, begin, num_atoms)
+        lines, end = None, int(ends[-1]) + 1 if num_atoms > 0 else begin
+
+    return title_end, num_atoms, lines, end
+
+def _read_gro_frame(data, start=0):
+    """Parse a GRO frame in an array of bytes, starting at ``start``.
+
+    Returns:
+        (dict, int): The frame attributes of a :class:`GroFile` and
+            the offset of the following frame
+
+    """
+
+    def decode(array):
+        return array.tobytes().decode('utf-8', 'replace').rstrip('\r')
+
+    title_end, num_atoms, lines, end = _locate_gro_frame(data, start)
+
+    # Coordinate precision follows from the distance between decimal points
+    first = decode(lines[0]) if num_atoms > 0 else ""
+    width = 8
+    if first.count('.', 20) >= 2:
+        point = first.index('.', 20)
+        width = first.index('.', point + 1) - point
+    vstart = 20 + 3*width
+    has_velocities = len(first.rstrip()) >= vstart + 3*width
+
+    def strings(a, b):
+        names = np.ascontiguousarray(lines[:, a:b]).view('S%d' % (b - a))
+        return np.char.strip(names[:, 0]).astype('U%d' % (b - a))
+
+    frame = {
+        'title': decode(data[start:title_end]).strip(),
+        'residue_numbers': _parse_fixed(lines, 0, 5),
+        'residue_names': strings(5, 10),
+        'atom_names': strings(10, 15),
+        'atom_numbers': _parse_fixed(lines, 15, 5),
+        'positions': _parse_fixed(lines, 20, width, 3),
+        'velocities': None,
+        'precision': width - 5
+        }
+    if has_velocities:
+        frame['velocities'] = _parse_fixed(lines, vstart, width, 3)
+
+    box_end = _find_newline(data, end)
+    frame['box'] = np.array(decode(data[end:box_end]).split(), dtype=float)
+
+    return frame, box_end + 1
+
+def _parse_fixed(lines, start, width, count=1):
+    """Parse ``count`` adjacent fixed-width number fields of all lines.
+
+    The digit columns of the fields are accumulated into integers, which
+    for decimal fields are scaled by the decimal point position. Fields
+    which are not plain numbers are left to NumPy string conversion.
+
+    Returns:
+        array: Integers, or floats for fields with a decimal point, of
+            shape ``(N,)`` for a single field and ``(N, count)`` otherwise
+
+    """
+
+    fields = lines[:, start:start+count*width].reshape(-1, width)
+    columns = np.ascontiguousarray(fields.T)
+    shape = (-1, count) if count > 1 else (-1,)
+
+    points = np.flatnonzero(columns[:, 0] == 46) if fields.size else []
+    digits = [i for i in range(width) if i not in points]
+    valid = ((columns >= 48) & (columns <= 57)) \
+            | (columns == 32) | (columns == 45)
+    if len(points) > 1 or not np.all(valid[digits]) \
+            or not np.all(columns[points] == 46):
+        text = np.ascontiguousarray(fields).view('S%d' % width)
+        dtype = float if len(points) > 0 else np.int64
+        return text.astype(dtype).reshape(shape)
+
+    value = np.zeros(len(fields), dtype=np.int64)
+    for i in digits:
+        digit = columns[i] - np.uint8(48)
+        digit[digit > 9] = 0
+        value *= 10
+        value += digit
+    value[(columns == 45).any(axis=0)] *= -1
+
+    if len(points) > 0:
+        value = value / 10.0**(width - points[0] - 1)
+
+    return value.reshape(shape)
+
+def _format_fixed(values, width, decimals=0):
+    """Format numbers right-aligned into fixed-width fields.
+
+    Digits are extracted from the rounded, scaled integer values one column
+    at a time. Raises ValueError if any value does not fit in ``width``.
+
+    Returns:
+        array: Bytes of shape ``(N, width)``
+
+    """
+
+    if decimals:
+        values = np.asarray(values, dtype=float)
+        scaled = values * 10**decimals
+        value = np.abs(np.rint(scaled)).astype(np.int64)
+
+        # Scaling is inexact, so let printf round values close to a tie
+        for row in np.flatnonzero(np.abs(np.abs(scaled) % 1 - 0.5) < 1e-6):
+            text = "%.*f" % (decimals, abs(values[row]))
+            value[row] = int(text.replace('.', ''))
+        negative = (value > 0) & (values < 0)
+    else:
+        values = np.asarray(values)
+        value = np.abs(values).astype(np.int64)
+        negative = values < 0
+
+    # Columns filled right to left: decimals, point, at least one integer,
+    # with the sign in the column after the leading digit
+    columns = np.empty((width, len(value)), dtype=np.uint8)
+    point = width - decimals - 1 if decimals else width
+    pending = negative.copy()
+    if len(value) > 0 and value.max() < 2**31:
+        value = value.astype(np.int32)
+
+    for i in range(width - 1, -1, -1):
+        if i == point:
+            columns[i] = 46
+            continue
+
+        value, digit = np.divmod(value, 10)
+        if i >= point - 1:
+            columns[i] = digit + 48
+        else:
+            sign = pending & (value == 0) & (digit == 0)
+            columns[i] = np.where(sign, 45,
+                    np.where((value > 0) | (digit > 0), digit + 48, 32))
+            pending &= ~sign
+
+    overflow = (value > 0) | pending
+    if np.any(overflow):
+        raise ValueError("value %s does not fit in a field of width %d"
+                % (values[np.flatnonzero(overflow)[0]], width))
+
+    fields = columns.T.copy()
+
+    return fields
+
+def _format_names(names, width, left=False):
+    """Format strings into fixed-width fields, right-aligned by default.
+
+    Returns:
+        array: Bytes of shape ``(N, width)``
+
+    """
+
+    text = np.ascontiguousarray(names, dtype='U%d' % width)
+    codes = text.view(np.uint32).reshape(len(text), width)
+    codes = np.where(codes < 128, codes, 63).astype(np.uint8)
+
+    if left:
+        return np.where(codes == 0, np.uint8(32), codes)
+
+    # Shift each name right by its number of unused characters
+    shift = width - np.count_nonzero(codes, axis=1)
+    index = np.arange(width)[None, :] - shift[:, None]
+    rows = np.arange(len(codes))[:, None]
+
+    return np.where(index >= 0, codes[rows, np.maximum(index, 0)], np.uint8(32))
+
+def _line_ends(data, begin, num_lines):
+    """Return the offsets of the next ``num_lines`` line breaks from ``begin``."""
+
+    # Widen the searched window until all line breaks are found
+    size = max(64*num_lines, 4096)
+    while True:
+        breaks = np.flatnonzero(data[begin:begin+size] == 10)
+        if len(breaks) >= num_lines or begin + size >= len(data):
+            break
+        size *= 2
+
+    ends = begin + breaks[:num_lines]
+    if len(ends) < num_lines:
+        ends = np.append(ends, len(data))
+
+    return ends
+
+def _pad_lines(data, begin, num_lines):
+    """Collect lines of varying length into a space-padded 2D array.
+
+    Returns:
+        (array, int): The lines and the offset after the last line
+
+    """
+
+    ends = _line_ends(data, begin, num_lines)
+    starts = np.concatenate(([begin], ends[:-1] + 1))
+
+    width = int((ends - starts).max()) if num_lines > 0 else 0
+    index = starts[:, None] + np.arange(width)[None, :]
+    lines = np.where(index < ends[:, None],
+            data[np.minimum(index, len(data) - 1)], 32).astype(np.uint8)
+
+    return lines, int(ends[-1]) + 1 if num_lines > 0 else begin
+
+def _unique(array):
+    """Return the sorted unique values of an array."""
+
+    array = np.sort(array)
+    if len(array) > 0:
+        array = array[np.concatenate(([True], array[1:] != array[:-1]))]
+
+    return array
+
+def _format_group(atoms, per_line=15):
+    """Format atom numbers as in Gromacs index files.
+
+    Every number is written in the same width of at least 4, followed by
+    a space, and a line break follows every ``per_line`` numbers.
+
+    Returns:
+        bytes: The formatted group
+
+    """
+
+    atoms = np.asarray(atoms, dtype=np.int64)
+    if len(atoms) == 0:
+        return b""
+
+    width = max(4, len(str(int(np.abs(atoms).max()))) + int(atoms.min() < 0))
+    fields = np.concatenate((_format_fixed(atoms, width),
+        np.full((len(atoms), 1), 32, dtype=np.uint8)), axis=1).ravel()
+
+    breaks = np.arange(per_line, len(atoms), per_line)*(width + 1)
+    text = np.insert(fields, np.append(breaks, len(fields)), 10)
+
+    return text.tobytes()
+
+def _parse_columns(text):
+    """Convert whitespace separated rows of numbers in ``text`` to a 2D array.
+
+    The number of columns is taken from the first row. Trailing values
+    of an incomplete last row, as in a file still being written, are
+    discarded.
+
+    Raises:
+        ValueError: If a value is not a number, or another row has
+            a different number of columns
+
+    """
+
+    # Count the values of every row from the starts of words
+    data = np.frombuffer(text, dtype=np.uint8)
+    space = data <= 32
+    starts = ~space & np.concatenate(([True], space[:-1]))
+    counts = np.bincount(np.cumsum(data == 10)[starts])
+    counts = counts[counts > 0]
+    if len(counts) == 0:
+        return np.zeros((0, 0))
+
+    columns = counts[0]
+    if counts[-1] < columns:
+        counts = counts[:-1]
+    if np.any(counts != columns):
+        raise ValueError("rows of %d and %d values" % (columns,
+            counts[np.flatnonzero(counts != columns)[0]]))
+
+    values = np.array(text.split()[:len(counts)*columns], dtype=float)
+
+    return values.reshape(-1, columns)
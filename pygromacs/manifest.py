@@ -0,0 +1,437 @@
+import hashlib
+import os
+import sqlite3
+from pygromacs.cache import read_cached
+from pygromacs.gmxfiles import MdpFile, normalise_key
+from pygromacs.utils import map_parallel
+
+"""SQLite manifests of prepared runs, for querying parameter spaces."""
+
+_schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    directory TEXT UNIQUE NOT NULL,
+    configuration TEXT,
+    input TEXT
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT,
+    number REAL
+);
+CREATE INDEX IF NOT EXISTS parameters_value ON parameters (key, value);
+CREATE INDEX IF NOT EXISTS parameters_number ON parameters (key, number);
+CREATE INDEX IF NOT EXISTS parameters_run ON parameters (run);
+CREATE TABLE IF NOT EXISTS files (
+    run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    source TEXT,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS files_run ON files (run);
+CREATE TABLE IF NOT EXISTS commands (
+    run INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    command TEXT NOT NULL,
+    returncode INTEGER,
+    stdout TEXT,
+    stderr TEXT,
+    attempts INTEGER,
+    PRIMARY KEY (run, command)
+);
+"""
+
+class Manifest(object):
+    """A manifest of runs in an SQLite database.
+
+    Every run is recorded by its directory together with the parameters
+    of its MDP file and the paths and hashes of its files. Parameters are
+    stored with normalised keys (see :func:`normalise_key`) and indexed
+    on key and value, so that runs can be queried quickly.
+
+    Args:
+        path (str): Path to the database, created if it does not exist
+
+    Attributes:
+        path: Path to the database.
+
+        connection: The :class:`sqlite3.Connection` to the database.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the database."""
+
+        self.connection.close()
+
+    def add_runs(self, runs):
+        """Record runs, replacing any earlier record of their directories.
+
+        Args:
+            runs (list): Runs as dictionaries with keys ``directory``,
+                ``parameters`` (a dictionary of MDP parameters and values)
+                and ``files`` (a list of ``(name, source, hash)`` tuples),
+                and optionally ``configuration`` and ``input``
+
+        """
+
+        with self.connection as db:
+            for run in runs:
+                db.execute("DELETE FROM runs WHERE directory = ?",
+                        (run['directory'],))
+                cursor = db.execute("INSERT INTO runs "
+                        "(directory, configuration, input) VALUES (?, ?, ?)",
+                        (run['directory'], run.get('configuration', ''),
+                            run.get('input', '')))
+                index = cursor.lastrowid
+
+                db.executemany("INSERT INTO parameters VALUES (?, ?, ?, ?)",
+                        [(index, normalise_key(key), str(value), _number(value))
+                            for key, value in run['parameters'].items()])
+                db.executemany("INSERT INTO files VALUES (?, ?, ?, ?)",
+                        [(index, name, source, digest)
+                            for name, source, digest in run['files']])
+
+    def update_runs(self, runs):
+        """Update the parameters and file hashes of recorded runs.
+
+        Unlike :func:`add_runs` the record of a run is kept: its
+        configuration, input and commands, and the recorded source of
+        every file which is still there. Runs which are not recorded
+        are added.
+
+        Args:
+            runs (list): Runs as for :func:`add_runs`
+
+        """
+
+        with self.connection as db:
+            for run in runs:
+                row = db.execute("SELECT id FROM runs WHERE directory = ?",
+                        (run['directory'],)).fetchone()
+                if row is None:
+                    index = db.execute("INSERT INTO runs "
+                            "(directory, configuration, input) VALUES (?, ?, ?)",
+                            (run['directory'], run.get('configuration', ''),
+                                run.get('input', ''))).lastrowid
+                    sources = {}
+                else:
+                    index = row[0]
+                    sources = dict(db.execute("SELECT name, source FROM files "
+                        "WHERE run = ?", (index,)))
+                    db.execute("DELETE FROM parameters WHERE run = ?", (index,))
+                    db.execute("DELETE FROM files WHERE run = ?", (index,))
+
+                db.executemany("INSERT INTO parameters VALUES (?, ?, ?, ?)",
+                        [(index, normalise_key(key), str(value), _number(value))
+                            for key, value in run['parameters'].items()])
+                db.executemany("INSERT INTO files VALUES (?, ?, ?, ?)",
+                        [(index, name, sources.get(name) or source, digest)
+                            for name, source, digest in run['files']])
+
+    def remove_runs(self, directories):
+        """Remove the records of run directories, with their commands."""
+
+        with self.connection as db:
+            db.executemany("DELETE FROM runs WHERE directory = ?",
+                    [(directory,) for directory in directories])
+
+    def directories(self):
+        """Return the directories of all runs, sorted."""
+
+        cursor = self.connection.execute(
+                "SELECT directory FROM runs ORDER BY directory")
+
+        return [row[0] for row in cursor]
+
+    def get_parameters(self, directory):
+        """Return the parameters of a run as a dictionary, empty if not found."""
+
+        cursor = self.connection.execute("SELECT key, value FROM parameters "
+                "JOIN runs ON runs.id = parameters.run WHERE directory = ?",
+                (directory,))
+
+        return dict(cursor)
+
+    def get_files(self, directory):
+        """Return the ``(name, source, hash)`` files of a run."""
+
+        cursor = self.connection.execute("SELECT name, source, hash FROM files "
+                "JOIN runs ON runs.id = files.run WHERE directory = ?",
+                (directory,))
+
+        return list(cursor)
+
+    def record_command(self, directory, command, returncode, stdout="",
+            stderr="", attempts=1):
+        """Record the result of a command run in a run directory.
+
+        Any earlier result of the same command in the directory is replaced.
+
+        Args:
+            directory (str): The run directory
+            command (str): The command
+            returncode (int): Its exit code,
+            stdout (str, optional): output,
+            stderr (str, optional): error output
+            attempts (int, optional): and number of times it was run
+
+        """
+
+        with self.connection as db:
+            db.execute("INSERT OR REPLACE INTO commands SELECT id, ?, ?, ?, ?, ? "
+                    "FROM runs WHERE directory = ?", (command, returncode,
+                        stdout, stderr, attempts, directory))
+
+    def get_command(self, directory, command):
+        """Return the recorded result of a command in a run directory.
+
+        Returns:
+            tuple: The ``(returncode, stdout, stderr, attempts)`` of the
+                command, or None if it has not been recorded
+
+        """
+
+        cursor = self.connection.execute("SELECT returncode, stdout, stderr, "
+                "attempts FROM commands JOIN runs ON runs.id = commands.run "
+                "WHERE directory = ? AND command = ?", (directory, command))
+
+        return cursor.fetchone()
+
+    def query(self, conditions=None, **kwargs):
+        """Return the directories of runs with the given parameter values.
+
+        Numeric values are compared as numbers, so that ``dt=0.002``
+        matches a file with ``dt = 2e-3``. Other values are compared
+        as strings.
+
+        Args:
+            conditions (dict, optional): Parameters and values to match,
+                for keys which are not valid Python names
+            **kwargs: Further parameters and values to match
+
+        Returns:
+            list: The matching directories, sorted
+
+        """
+
+        conditions = dict(conditions or {}, **kwargs)
+
+        clauses, arguments = [], []
+        for key, value in sorted(conditions.items()):
+            number = _number(value)
+            column = 'value' if number is None else 'number'
+            clauses.append("id IN (SELECT run FROM parameters "
+                    "WHERE key = ? AND %s = ?)" % column)
+            arguments += [normalise_key(key),
+                    str(value).strip() if number is None else number]
+
+        sql = "SELECT directory FROM runs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        cursor = self.connection.execute(sql + " ORDER BY directory", arguments)
+
+        return [row[0] for row in cursor]
+
+def merge_manifests(path, sources):
+    """Merge manifests into a new manifest.
+
+    Runs are inserted in order of their directory, with their parameters
+    and files in the order of their source. The merged database is thus
+    the same however the runs were partitioned over the sources, for
+    example by the number of shards a parameter space was generated in.
+    If a directory is in several sources the first record is kept.
+
+    Args:
+        path (str): Path to the merged manifest, replaced if it exists
+        sources (list): Paths to the manifests to merge
+
+    Returns:
+        Manifest: The merged manifest
+
+    """
+
+    if os.path.exists(path):
+        os.remove(path)
+    manifest = Manifest(path)
+
+    with manifest.connection as db:
+        db.executescript("""
+            CREATE TEMP TABLE merged_runs (
+                directory TEXT, configuration TEXT, input TEXT, source INTEGER);
+            CREATE TEMP TABLE merged_parameters (
+                directory TEXT, key TEXT, value TEXT, number REAL);
+            CREATE TEMP TABLE merged_files (
+                directory TEXT, name TEXT, source TEXT, hash TEXT);
+            """)
+
+        for i, source in enumerate(sources):
+            db.execute("ATTACH DATABASE ? AS source", (source,))
+            db.execute("INSERT INTO merged_runs SELECT directory, "
+                    "configuration, input, ? FROM source.runs WHERE directory "
+                    "NOT IN (SELECT directory FROM merged_runs) ORDER BY id", (i,))
+
+            kept = "WHERE r.directory IN (SELECT directory FROM merged_runs " \
+                    "WHERE source = %d)" % i
+            db.execute("INSERT INTO merged_parameters SELECT r.directory, "
+                    "p.key, p.value, p.number FROM source.parameters AS p "
+                    "JOIN source.runs AS r ON r.id = p.run %s "
+                    "ORDER BY p.rowid" % kept)
+            db.execute("INSERT INTO merged_files SELECT r.directory, "
+                    "f.name, f.source, f.hash FROM source.files AS f "
+                    "JOIN source.runs AS r ON r.id = f.run %s "
+                    "ORDER BY f.rowid" % kept)
+            db.commit()
+            db.execute("DETACH DATABASE source")
+
+        db.execute("INSERT INTO runs (directory, configuration, input) "
+                "SELECT directory, configuration, input FROM merged_runs "
+                "ORDER BY directory")
+        db.execute("INSERT INTO parameters SELECT r.id, m.key, m.value, "
+                "m.number FROM merged_parameters AS m JOIN runs AS r "
+                "ON r.directory = m.directory ORDER BY r.id, m.rowid")
+        db.execute("INSERT INTO files SELECT r.id, m.name, m.source, m.hash "
+                "FROM merged_files AS m JOIN runs AS r "
+                "ON r.directory = m.directory ORDER BY r.id, m.rowid")
+        db.executescript("""
+            DROP TABLE merged_runs;
+            DROP TABLE merged_parameters;
+            DROP TABLE merged_files;
+            """)
+
+    return manifest
+
+def hash_file(path):
+    """Return the SHA-1 hex digest of a file."""
+
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def rebuild_manifest(directory, mdp_name='grompp.mdp', processes=None,
+        cache=False, manifest_name='manifest.db'):
+    """Index an existing run tree into a manifest in its base directory.
+
+    Every directory with an MDP file of the given name is recorded as a run.
+    Files are read and hashed in parallel.
+
+    Args:
+        directory (str): Base directory of the run tree
+        mdp_name (str, optional): File name of the MDP file of every run
+        processes (int, optional): Number of processes (default: number
+            of processors)
+        cache (bool, optional): Read MDP files through the binary cache
+            (see :func:`~pygromacs.cache.read_cached`)
+        manifest_name (str, optional): File name of the manifest
+
+    Returns:
+        Manifest: The rebuilt manifest
+
+    """
+
+    jobs = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        if mdp_name in files:
+            jobs.append((directory, os.path.relpath(root, directory), mdp_name,
+                cache))
+
+    runs = map_parallel(_scan_run, jobs, processes)
+
+    path = os.path.join(directory, manifest_name)
+    if os.path.exists(path):
+        os.remove(path)
+    manifest = Manifest(path)
+    manifest.add_runs(runs)
+
+    return manifest
+
+def update_manifest(manifest, directories, mdp_name='grompp.mdp',
+        processes=None, cache=False):
+    """Update the records of some run directories of a manifest.
+
+    Directories are relative to the base directory of the manifest, the
+    directory of its database as written by :func:`rebuild_manifest`.
+    Those which still have an MDP file of the given name are read again
+    and their records updated (see :func:`Manifest.update_runs`), which
+    keeps their configuration, input, commands and file sources. Others
+    are removed.
+
+    Args:
+        manifest (Manifest): The manifest to update
+        directories (list): Run directories to update
+        mdp_name (str, optional): File name of the MDP file of every run
+        processes (int, optional): Number of processes (default: number
+            of processors)
+        cache (bool, optional): Read MDP files through the binary cache
+
+    Returns:
+        tuple: Lists of the updated and the removed directories
+
+    """
+
+    base = os.path.dirname(os.path.abspath(manifest.path))
+    updated, removed = [], []
+    for directory in sorted(set(directories)):
+        if os.path.isfile(os.path.join(base, directory, mdp_name)):
+            updated.append(directory)
+        else:
+            removed.append(directory)
+
+    runs = map_parallel(_scan_run, [(base, directory, mdp_name, cache)
+        for directory in updated], processes)
+    manifest.update_runs(runs)
+    manifest.remove_runs(removed)
+
+    return updated, removed
+
+def _scan_run(job):
+    """Return the record of an existing run directory."""
+
+    base, directory, mdp_name, cache = job
+    path = os.path.join(base, directory)
+
+    if cache:
+        mdp = read_cached(os.path.join(path, mdp_name))
+    else:
+        mdp = MdpFile(os.path.join(path, mdp_name))
+    files = [(name, '', hash_file(os.path.join(path, name)))
+            for name in sorted(os.listdir(path))
+            if os.path.isfile(os.path.join(path, name))]
+
+    return {
+            'directory': directory,
+            'parameters': mdp_parameters(mdp),
+            'files': files
+            }
+
+def mdp_parameters(mdp):
+    """Return the parameters and values of an MDP file as a dictionary."""
+
+    return {normalise_key(key): option.value
+            for key, option in mdp.options.items()}
+
+def _number(value):
+    """Return a value as a float, or None if it is not a number."""
+
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,108 @@
+import os
+import re
+import shlex
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pygromacs.manifest import Manifest, rebuild_manifest
+
+"""Running preprocessing commands over the directories of a run tree."""
+
+# Placeholders of a command template
+_placeholder = re.compile(r'\{(run|path)\}')
+
+def run_commands(directory, command, processes=None, retries=0, resume=True,
+        timeout=None, manifest_name='manifest.db', verbose=True):
+    """Run a command in every directory of a run tree.
+
+    The command is a template, formatted for every run with ``{run}``
+    (the run directory relative to ``directory``) and ``{path}`` (its
+    absolute path). Any other braces are passed unchanged. It is run
+    in the run directory without a shell, for example
+    ``gmx grompp -f grompp.mdp -p topol.top -o topol.tpr``.
+
+    Runs are taken from the manifest of the tree, which is rebuilt if it
+    does not exist. Commands are run in a pool of ``processes`` concurrent
+    processes, and the exit code and output of every command is recorded
+    in the manifest as soon as it finishes. Failed commands are retried
+    up to ``retries`` times. Resuming skips every run in which the command
+    has already succeeded, so an interrupted job can be restarted.
+
+    Args:
+        directory (str): Base directory of the run tree
+        command (str): Command template
+        processes (int, optional): Number of concurrent commands (default:
+            number of processors)
+        retries (int, optional): Number of times to rerun a failed command
+        resume (bool, optional): Skip runs in which the command succeeded
+        timeout (float, optional): Time limit in seconds for every command,
+            after which it fails
+        manifest_name (str, optional): File name of the manifest
+        verbose (bool, optional): Print a summary when finished
+
+    Returns:
+        dict: The exit code of the command in every run directory
+
+    """
+
+    path = os.path.join(directory, manifest_name)
+    manifest = Manifest(path) if os.path.exists(path) \
+            else rebuild_manifest(directory, manifest_name=manifest_name)
+
+    results = {}
+    with manifest:
+        runs = []
+        for run in manifest.directories():
+            recorded = manifest.get_command(run, command)
+            if resume and recorded is not None and recorded[0] == 0:
+                results[run] = 0
+            else:
+                runs.append(run)
+        skipped = len(results)
+
+        workers = processes or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_run, os.path.abspath(directory), run,
+                command, retries, timeout): run for run in runs}
+            for future in as_completed(futures):
+                returncode, stdout, stderr, attempts = future.result()
+                manifest.record_command(futures[future], command, returncode,
+                        stdout, stderr, attempts)
+                results[futures[future]] = returncode
+
+    if verbose:
+        failed = sum(1 for code in results.values() if code != 0)
+        print("Ran '%s' in %d directories: %d failed, %d skipped."
+                % (command, len(runs), failed, skipped))
+
+    return results
+
+def _run(base, run, command, retries, timeout):
+    """Run a command in a run directory until it succeeds or runs out of tries.
+
+    Returns:
+        tuple: The ``(returncode, stdout, stderr, attempts)`` of the last try
+
+    """
+
+    path = os.path.join(base, run)
+    values = {'run': run, 'path': path}
+    args = [_placeholder.sub(lambda match: values[match.group(1)], arg)
+            for arg in shlex.split(command)]
+
+    for attempt in range(1, retries + 2):
+        try:
+            process = subprocess.run(args, cwd=path, stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE, timeout=timeout)
+            result = (process.returncode,
+                    process.stdout.decode('utf-8', 'replace'),
+                    process.stderr.decode('utf-8', 'replace'))
+        except subprocess.TimeoutExpired as error:
+            result = (-1, (error.stdout or b"").decode('utf-8', 'replace'),
+                    "timed out after %g s" % timeout)
+        except OSError as error:
+            result = (-1, "", str(error))
+
+        if result[0] == 0:
+            break
+
+    return result + (attempt,)
@@ -0,0 +1,182 @@
+import hashlib
+import os
+from pygromacs.manifest import Manifest, hash_file, mdp_parameters, \
+        normalise_key
+from pygromacs.utils import imap_parallel, write_if_changed
+
+"""Tools for preparing runs over sets of configurations and input files."""
+
+def generate_runs(directory, configurations, inputs, mdp_name='grompp.mdp',
+        manifest_name='manifest.db', processes=None, verbose=True):
+    """Prepare a run directory for every configuration and input set.
+
+    Runs are laid out as ``directory/<input>/<configuration>``, each with
+    the MDP file of the configuration and copies of the input files.
+    Every MDP file is rendered once and written to all its directories.
+    The variants of a parameter space are rendered and written one at a
+    time, so that their content is never all held in memory. Only their
+    swept and derived values are kept for the manifest, which shares the
+    other parameters of the base file.
+    Files which are already up to date are not written again, so that
+    a tree can be regenerated cheaply after changing a few inputs.
+
+    All runs are recorded in a :class:`~pygromacs.manifest.Manifest`,
+    ``manifest.db`` in ``directory``, with their parameters and the paths
+    and hashes of their files. When generating shards of a parameter
+    space in parallel each shard should write a manifest of its own,
+    to be combined with :func:`~pygromacs.manifest.merge_manifests`.
+
+    Args:
+        directory (str): Base directory of the run tree
+        configurations (dict or list): :class:`~pygromacs.gmxfiles.MdpFile`
+            objects, by name. Names of a list are taken from the file names.
+            A :class:`~pygromacs.sweep.ParameterSpace` (or a slice of one)
+            gives its variants, named by index.
+        inputs (dict or list): Lists of input file paths (topologies,
+            coordinates, ...), by name. Names of a list are taken from the
+            file name of the first file in each list.
+        mdp_name (str, optional): File name of the written MDP files
+        manifest_name (str, optional): File name of the manifest
+        processes (int, optional): Number of processes to write runs with
+            (default: number of processors)
+        verbose (bool, optional): Print information about the generation
+
+    Returns:
+        list: A record (dict) of every run, sorted by directory
+
+    """
+
+    inputs = _named(inputs, lambda files: files[0])
+    for name, files in inputs.items():
+        names = [os.path.basename(f) for f in files]
+        for file_name in set(names):
+            if names.count(file_name) > 1:
+                raise ValueError("duplicate file name '%s' in input '%s'"
+                        % (file_name, name))
+
+    # Hashes are the same for all runs of an input set, and parameters
+    # for all runs of a configuration, so they are only computed once
+    input_files = {name: [(os.path.basename(f), f, hash_file(f)) for f in files]
+            for name, files in inputs.items()}
+
+    if hasattr(configurations, 'rendered'):
+        # Render the variants of a parameter space from a compiled template,
+        # one at a time as they are written
+        space = configurations
+        base = mdp_parameters(space.base)
+        variants = ((name, data, {normalise_key(parameter): value
+            for parameter, value in values.items()}, space.base.path)
+            for name, data, values in space.rendered(values=True))
+    else:
+        configurations = _named(configurations, lambda mdp: mdp.path)
+        base = {}
+        variants = ((name, render_mdp(mdp), mdp_parameters(mdp), mdp.path)
+                for name, mdp in configurations.items())
+
+    runs, records = [], []
+    def jobs():
+        for config_name, data, parameters, path in variants:
+            _check_name(config_name)
+            mdp_file = (mdp_name, path, hashlib.sha1(data).hexdigest())
+            for input_name, files in sorted(inputs.items()):
+                run = {
+                    'directory': os.path.join(input_name, config_name),
+                    'configuration': config_name,
+                    'input': input_name,
+                    'files': [mdp_name] + [os.path.basename(f) for f in files]
+                    }
+                runs.append(run)
+                records.append(dict(run, parameters=parameters,
+                    files=[mdp_file] + input_files[input_name]))
+                yield (os.path.join(directory, run['directory']), mdp_name,
+                        data, files)
+
+    try:
+        written = sum(imap_parallel(_write_run, jobs(), processes))
+    finally:
+        # Worker processes exit after the call, but with one process the
+        # inputs were read into this one
+        _sources.clear()
+
+    runs.sort(key=lambda run: (run['input'], run['configuration']))
+    records.sort(key=lambda run: (run['input'], run['configuration']))
+
+    os.makedirs(directory, exist_ok=True)
+    with Manifest(os.path.join(directory, manifest_name)) as manifest:
+        manifest.add_runs(dict(record, parameters=dict(base,
+            **record['parameters'])) for record in records)
+
+    if verbose:
+        print("Prepared %d runs in '%s' (%d files written)."
+                % (len(runs), directory, written))
+
+    return runs
+
+def render_mdp(mdp, comment=True):
+    """Return the content of an MDP file as written by its ``save``.
+
+    Args:
+        mdp (MdpFile): A file
+        comment (bool, optional): Include comments
+
+    Returns:
+        bytes: The file content
+
+    """
+
+    return mdp.format(comment).encode()
+
+def _named(items, path):
+    """Return a dictionary of items, naming a list of them by file name."""
+
+    if isinstance(items, dict):
+        named = dict(items)
+    elif hasattr(items, 'items'):
+        named = dict(items.items())
+    else:
+        named = {}
+        for item in items:
+            name = os.path.splitext(os.path.basename(path(item)))[0]
+            if name in named:
+                raise ValueError("duplicate name '%s'" % name)
+            named[name] = item
+
+    for name in named:
+        _check_name(name)
+
+    return named
+
+def _check_name(name):
+    """Raise ValueError for a name which is not a single directory name."""
+
+    if not name or os.sep in name or name in ('.', '..'):
+        raise ValueError("bad run name '%s'" % name)
+
+def _write_run(job):
+    """Write the files of a run directory, returning the number written."""
+
+    path, mdp_name, mdp, files = job
+
+    written = int(write_if_changed(os.path.join(path, mdp_name), mdp))
+    for source in files:
+        written += write_if_changed(
+                os.path.join(path, os.path.basename(source)), _read_source(source))
+
+    return written
+
+# Content of input files by absolute path, with their size and mtime
+_sources = {}
+
+def _read_source(path):
+    """Return the content of an input file, read once per process
+    unless it changes."""
+
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _sources.get(path)
+    if cached is None or cached[0] != stamp:
+        with open(path, 'rb') as fp:
+            cached = _sources[path] = (stamp, fp.read())
+
+    return cached[1]
@@ -0,0 +1,373 @@
+import numpy as np
+from collections import namedtuple
+from pygromacs.gmxfiles import normalise_key
+
+"""Validation of MDP options against a schema of Gromacs parameters."""
+
+Option = namedtuple('Option', ['kind', 'allowed', 'low', 'high', 'vector'])
+Option.__doc__ = """A compiled schema entry of an MDP parameter.
+
+Attributes:
+    kind: 'int', 'real', 'enum' or 'string'.
+
+    allowed: A frozen set of normalised values of an 'enum', else None.
+
+    low, high: The inclusive range of a number, None if unbounded.
+
+    vector: Whether the value is a list of numbers (one per group).
+
+"""
+
+ValidationError = namedtuple('ValidationError',
+        ['index', 'parameter', 'value', 'message'])
+ValidationError.__doc__ = """An invalid option in a validated file.
+
+Attributes:
+    index: Index of the file in the validated collection.
+
+    parameter, value: The option as written in the file.
+
+    message: What is wrong with it.
+
+"""
+
+_yes_no = ['yes', 'no']
+
+# Parameters, their kind and allowed values or (low, high) range
+_options = [
+        # Preprocessing and run control
+        ('include', 'string', None),
+        ('define', 'string', None),
+        ('integrator', 'enum', ['md', 'md-vv', 'md-vv-avek', 'sd', 'bd', 'steep',
+            'cg', 'l-bfgs', 'nm', 'tpi', 'tpic', 'mimic']),
+        ('tinit', 'real', None),
+        ('dt', 'real', (0, None)),
+        ('nsteps', 'int', (-1, None)),
+        ('init_step', 'int', (0, None)),
+        ('comm_mode', 'enum', ['linear', 'angular', 'none',
+            'linear-acceleration-correction']),
+        ('nstcomm', 'int', (0, None)),
+        ('comm_grps', 'string', None),
+        ('bd_fric', 'real', (0, None)),
+        ('ld_seed', 'int', (-1, None)),
+
+        # Energy minimisation
+        ('emtol', 'real', (0, None)),
+        ('emstep', 'real', (0, None)),
+        ('niter', 'int', (0, None)),
+        ('fcstep', 'real', (0, None)),
+        ('nstcgsteep', 'int', (0, None)),
+        ('nbfgscorr', 'int', (0, None)),
+
+        # Output control
+        ('nstxout', 'int', (0, None)),
+        ('nstvout', 'int', (0, None)),
+        ('nstfout', 'int', (0, None)),
+        ('nstlog', 'int', (0, None)),
+        ('nstcalcenergy', 'int', (-1, None)),
+        ('nstenergy', 'int', (0, None)),
+        ('nstxout_compressed', 'int', (0, None)),
+        ('compressed_x_precision', 'real', (0, None)),
+        ('compressed_x_grps', 'string', None),
+        ('energygrps', 'string', None),
+
+        # Neighbour searching
+        ('cutoff_scheme', 'enum', ['verlet', 'group']),
+        ('nstlist', 'int', (-1, None)),
+        ('ns_type', 'enum', ['grid', 'simple']),
+        ('pbc', 'enum', ['xyz', 'no', 'xy', 'screw']),
+        ('periodic_molecules', 'enum', _yes_no),
+        ('verlet_buffer_tolerance', 'real', None),
+        ('rlist', 'real', (0, None)),
+
+        # Electrostatics and Van der Waals
+        ('coulombtype', 'enum', ['cut-off', 'ewald', 'pme', 'p3m-ad',
+            'reaction-field', 'generalized-reaction-field', 'reaction-field-zero',
+            'reaction-field-nec', 'shift', 'encad-shift', 'switch', 'user',
+            'pme-switch', 'pme-user', 'pme-user-switch']),
+        ('coulomb_modifier', 'enum', ['potential-shift-verlet', 'potential-shift',
+            'none']),
+        ('rcoulomb_switch', 'real', (0, None)),
+        ('rcoulomb', 'real', (0, None)),
+        ('epsilon_r', 'real', (0, None)),
+        ('epsilon_rf', 'real', (0, None)),
+        ('vdwtype', 'enum', ['cut-off', 'pme', 'shift', 'switch', 'encad-shift',
+            'user']),
+        ('vdw_modifier', 'enum', ['potential-shift-verlet', 'potential-shift',
+            'none', 'force-switch', 'potential-switch']),
+        ('rvdw_switch', 'real', (0, None)),
+        ('rvdw', 'real', (0, None)),
+        ('dispcorr', 'enum', ['no', 'enerpres', 'ener', 'allenerpres', 'allener']),
+        ('table_extension', 'real', (0, None)),
+        ('fourierspacing', 'real', (0, None)),
+        ('fourier_nx', 'int', (0, None)),
+        ('fourier_ny', 'int', (0, None)),
+        ('fourier_nz', 'int', (0, None)),
+        ('pme_order', 'int', (3, 12)),
+        ('ewald_rtol', 'real', (0, None)),
+        ('ewald_geometry', 'enum', ['3d', '3dc']),
+        ('epsilon_surface', 'real', None),
+
+        # Temperature and pressure coupling
+        ('tcoupl', 'enum', ['no', 'berendsen', 'nose-hoover', 'yes', 'andersen',
+            'andersen-massive', 'v-rescale']),
+        ('nsttcouple', 'int', (-1, None)),
+        ('tc_grps', 'string', None),
+        ('tau_t', 'vector', (-1, None)),
+        ('ref_t', 'vector', (0, None)),
+        ('pcoupl', 'enum', ['no', 'berendsen', 'parrinello-rahman', 'isotropic',
+            'mttk', 'c-rescale']),
+        ('pcoupltype', 'enum', ['isotropic', 'semiisotropic', 'anisotropic',
+            'surface-tension']),
+        ('nstpcouple', 'int', (-1, None)),
+        ('tau_p', 'real', (0, None)),
+        ('compressibility', 'vector', None),
+        ('ref_p', 'vector', None),
+        ('refcoord_scaling', 'enum', ['no', 'all', 'com']),
+
+        # Velocity generation and bonds
+        ('gen_vel', 'enum', _yes_no),
+        ('gen_temp', 'real', (0, None)),
+        ('gen_seed', 'int', (-1, None)),
+        ('constraints', 'enum', ['none', 'h-bonds', 'all-bonds', 'h-angles',
+            'all-angles', 'hbonds']),
+        ('constraint_algorithm', 'enum', ['lincs', 'shake']),
+        ('continuation', 'enum', _yes_no),
+        ('lincs_order', 'int', (1, None)),
+        ('lincs_iter', 'int', (0, None)),
+        ('lincs_warnangle', 'real', (0, 90)),
+
+        # User defined values
+        ('userint1', 'int', None),
+        ('userint2', 'int', None),
+        ('userint3', 'int', None),
+        ('userint4', 'int', None),
+        ('userreal1', 'real', None),
+        ('userreal2', 'real', None),
+        ('userreal3', 'real', None),
+        ('userreal4', 'real', None),
+        ('user1_grps', 'string', None),
+        ('user2_grps', 'string', None),
+        ]
+
+# Parameters which depend on each other
+_dependent = ('tcoupl', 'tc_grps', 'tau_t', 'ref_t', 'pcoupl', 'pcoupltype',
+        'ref_p', 'compressibility')
+
+# Older names of parameters
+aliases = {
+        'nstxtcout': 'nstxout_compressed',
+        'xtc_precision': 'compressed_x_precision',
+        'xtc_grps': 'compressed_x_grps',
+        'vdw_type': 'vdwtype',
+        'unconstrained_start': 'continuation',
+        'user1grps': 'user1_grps',
+        'user2grps': 'user2_grps',
+        }
+
+# Number of values of pressure coupling vectors for every coupling type
+_pressure_values = {
+        'isotropic': 1,
+        'semiisotropic': 2,
+        'anisotropic': 6,
+        'surfacetension': 2
+        }
+
+def normalise_value(value):
+    """Normalise an enumerated value as Gromacs compares them.
+
+    Case, dashes and underscores are ignored.
+
+    """
+
+    return str(value).strip().lower().replace('-', '').replace('_', '')
+
+def compile_schema(options):
+    """Compile a table of ``(parameter, kind, allowed or range)`` entries.
+
+    Returns:
+        dict: An :class:`Option` for every normalised parameter name
+
+    """
+
+    schema = {}
+    for parameter, kind, spec in options:
+        allowed, low, high = None, None, None
+        if kind == 'enum':
+            allowed = frozenset(normalise_value(value) for value in spec)
+        elif spec is not None:
+            low, high = spec
+
+        vector = kind == 'vector'
+        schema[normalise_key(parameter)] = Option('real' if vector else kind,
+                allowed, low, high, vector)
+
+    return schema
+
+schema = compile_schema(_options)
+
+def validate(mdp, strict=False):
+    """Validate the options of an MDP file.
+
+    Args:
+        mdp (MdpFile): A file
+        strict (bool, optional): Also report parameters not in the schema
+
+    Returns:
+        list: A :class:`ValidationError` for every invalid option, empty
+            if the file is valid
+
+    """
+
+    return validate_many([mdp], strict)
+
+def validate_many(files, strict=False):
+    """Validate the options of a collection of MDP files.
+
+    Files are validated column by column: the values of a parameter in
+    all files are collected and every distinct value is checked once,
+    numbers all at once with NumPy. Since generated files mostly share
+    their values this makes validation nearly independent of the number
+    of files. Dependencies between parameters (the number of values of
+    coupling groups) are likewise checked once for every distinct
+    combination of values.
+
+    Args:
+        files (list): :class:`~pygromacs.gmxfiles.MdpFile` objects
+        strict (bool, optional): Also report parameters not in the schema
+
+    Returns:
+        list: A :class:`ValidationError` for every invalid option, sorted
+            by file index
+
+    """
+
+    # Distinct values of every parameter and the files they are in,
+    # and distinct combinations of dependent parameters
+    columns = {}
+    combinations = {}
+    for index, mdp in enumerate(files):
+        dependent = {}
+        for parameter, option in mdp.options.items():
+            key = normalise_key(parameter)
+            key = aliases.get(key, key)
+            values = columns.setdefault(key, {})
+            values.setdefault((parameter, option.value), []).append(index)
+
+            if key in _dependent:
+                dependent[key] = (parameter, option.value)
+
+        combination = tuple(dependent.get(key, (key, "")) for key in _dependent)
+        combinations.setdefault(combination, []).append(index)
+
+    errors = []
+    for key, values in columns.items():
+        option = schema.get(key)
+        if option is None:
+            if strict:
+                messages = {value: "unknown parameter" for _, value in values}
+            else:
+                continue
+        else:
+            messages = _check_column(option, [value for _, value in values])
+
+        for (parameter, value), indices in values.items():
+            message = messages.get(value)
+            if message:
+                errors += [ValidationError(index, parameter, value, message)
+                        for index in indices]
+
+    errors += _check_dependencies(combinations)
+
+    return sorted(errors, key=lambda error: (error.index, error.parameter))
+
+def _check_column(option, values):
+    """Check distinct values of a parameter, returning messages by value."""
+
+    values = [value for value in set(values) if value.strip()]
+    messages = {}
+
+    if option.kind == 'enum':
+        for value in values:
+            if normalise_value(value) not in option.allowed:
+                messages[value] = "not one of: %s" % ", ".join(sorted(option.allowed))
+        return messages
+
+    if option.kind == 'string':
+        return messages
+
+    # Parse all numbers (of all vectors) in one array
+    fields = [value.split() for value in values]
+    owners = np.repeat(np.arange(len(values)), [len(f) for f in fields])
+    words = [word for f in fields for word in f]
+    bad = np.zeros(len(words), dtype=bool)
+    try:
+        dtype = np.int64 if option.kind == 'int' else float
+        numbers = np.array(words, dtype=str).astype(dtype).astype(float)
+    except (ValueError, OverflowError):
+        # Only if some word is invalid, which are then found one by one
+        numbers = np.full(len(words), np.nan)
+        for i, word in enumerate(words):
+            try:
+                numbers[i] = int(word) if option.kind == 'int' else float(word)
+            except ValueError:
+                bad[i] = True
+
+    for i in np.unique(owners[bad]):
+        messages[values[i]] = "not %s" % ("an integer" if option.kind == 'int'
+                else "a number")
+
+    outside = np.zeros(len(words), dtype=bool)
+    if option.low is not None:
+        outside |= numbers < option.low
+    if option.high is not None:
+        outside |= numbers > option.high
+    for i in np.unique(owners[outside & ~bad]):
+        if option.high is None:
+            message = "must be at least %s" % option.low
+        elif option.low is None:
+            message = "must be at most %s" % option.high
+        else:
+            message = "not in range [%s, %s]" % (option.low, option.high)
+        messages.setdefault(values[i], message)
+
+    for i, f in enumerate(fields):
+        if len(f) > 1 and not option.vector:
+            messages.setdefault(values[i], "expected a single value")
+
+    return messages
+
+def _check_dependencies(combinations):
+    """Check the number of values of coupling parameters.
+
+    Args:
+        combinations (dict): Lists of file indices for every distinct
+            combination of ``(parameter, value)`` of the dependent parameters
+
+    """
+
+    errors = []
+    for combination, indices in combinations.items():
+        (_, tcoupl), (_, groups), tau_t, ref_t, (_, pcoupl), \
+                (_, pcoupltype), ref_p, compressibility = combination
+        pcoupltype = pcoupltype or 'isotropic'
+
+        messages = []
+        if normalise_value(tcoupl) not in ('', 'no'):
+            count = len(groups.split())
+            for parameter, value in (tau_t, ref_t):
+                if len(value.split()) != count:
+                    messages.append((parameter, value,
+                        "expected %d values, one per tc-grps group" % count))
+
+        if normalise_value(pcoupl) not in ('', 'no'):
+            count = _pressure_values.get(normalise_value(pcoupltype))
+            for parameter, value in (ref_p, compressibility):
+                if count and len(value.split()) < count:
+                    messages.append((parameter, value, "expected %d values "
+                        "for pcoupltype %s" % (count, pcoupltype)))
+
+        errors += [ValidationError(index, parameter, value, message)
+                for parameter, value, message in messages for index in indices]
+
+    return errors
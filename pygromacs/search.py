@@ -0,0 +1,317 @@
+import os
+import sqlite3
+from pygromacs.cache import read_cached
+from pygromacs.gmxfiles import normalise_key
+from pygromacs.manifest import _number
+from pygromacs.schema import normalise_value
+from pygromacs.utils import imap_parallel, scan_tree
+
+"""A persistent inverted index of the parameters of MDP files in a tree."""
+
+_schema = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER,
+    mtime INTEGER
+);
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    number REAL,
+    UNIQUE (key, value)
+);
+CREATE INDEX IF NOT EXISTS terms_number ON terms (key, number);
+CREATE TABLE IF NOT EXISTS postings (
+    term INTEGER NOT NULL,
+    file INTEGER NOT NULL,
+    PRIMARY KEY (term, file)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_file ON postings (file);
+"""
+
+# Number of files read by a worker at a time, and written in a transaction
+_chunk_size = 256
+_batch_size = 8192
+
+class SearchIndex(object):
+    """An inverted index from parameters and values to MDP files.
+
+    Every distinct parameter and value is a term, with a list of the files
+    which set it. Files are recorded with their size and modification time,
+    so that :func:`update` only reads those which changed since the last
+    update. Parameters are matched as in :func:`normalise_key`, values
+    ignoring case, dashes and underscores (see
+    :func:`~pygromacs.schema.normalise_value`) or as numbers.
+
+    Args:
+        path (str): Path to the database, created if it does not exist
+
+    Attributes:
+        path: Path to the database.
+
+        connection: The :class:`sqlite3.Connection` to the database.
+
+    Example:
+        Find every file in a project which uses a reaction field::
+
+            with SearchIndex('/proj/mdp-index.db') as index:
+                index.update('/proj')
+                paths = index.query(coulombtype='reaction-field')
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(_schema)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the database."""
+
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def paths(self):
+        """Return the paths of all indexed files, sorted."""
+
+        return sorted(row[0] for row in
+                self.connection.execute("SELECT path FROM files"))
+
+    def update(self, directory, pattern='*.mdp', processes=None, cache=False):
+        """Bring the index of all files in a directory tree up to date.
+
+        New files and files with a changed size or modification time are
+        read in parallel, files which no longer exist are removed. Files
+        of the index outside the directory are not touched.
+
+        Args:
+            directory (str): Base directory of the tree
+            pattern (str, optional): Shell pattern of the file names to index
+            processes (int, optional): Number of processes (default: number
+                of processors)
+            cache (bool, optional): Read files through the binary cache
+                (see :func:`~pygromacs.cache.read_cached`)
+
+        Returns:
+            dict: The number of ``added``, ``updated``, ``removed`` and
+                ``unchanged`` files, and a dictionary of ``errors`` by path
+                of files which could not be read
+
+        """
+
+        directory = os.path.abspath(directory)
+        prefix = os.path.join(directory, '')
+        known = {path: (size, mtime) for path, size, mtime in
+                self.connection.execute("SELECT path, size, mtime FROM files "
+                    "WHERE path >= ? AND path < ?",
+                    (prefix, prefix[:-1] + chr(ord(os.sep) + 1)))}
+
+        found = [(path, (size, mtime))
+                for path, size, mtime in scan_tree(directory, pattern)]
+        removed = set(known).difference(path for path, _ in found)
+
+        return self._update(found, known, removed, processes, cache)
+
+    def update_files(self, paths, processes=None, cache=False):
+        """Bring the index of some files up to date.
+
+        Files which do not exist (any more) are removed from the index.
+        Takes the same optional arguments and returns the same summary
+        as :func:`update`.
+
+        """
+
+        found, removed = [], set()
+        for path in set(map(os.path.abspath, paths)):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                removed.add(path)
+            else:
+                found.append((path, (stat.st_size, stat.st_mtime_ns)))
+
+        known = {}
+        for path in [path for path, _ in found] + list(removed):
+            row = self.connection.execute("SELECT size, mtime FROM files "
+                    "WHERE path = ?", (path,)).fetchone()
+            if row is not None:
+                known[path] = tuple(row)
+
+        return self._update(found, known, removed & set(known), processes, cache)
+
+    def _update(self, found, known, removed, processes, cache):
+        """Read the found files which changed and remove the removed ones."""
+
+        changed = sorted(path for path, stamp in found if known.get(path) != stamp)
+        stamps = dict(found)
+        summary = {'added': 0, 'updated': 0, 'removed': len(removed),
+                'unchanged': len(found) - len(changed), 'errors': {}}
+
+        with self.connection as db:
+            for path in removed:
+                self._remove(path)
+
+        terms = {}
+        for key, value, index in self.connection.execute(
+                "SELECT key, value, id FROM terms"):
+            terms[key, value] = index
+
+        chunks = [(changed[i:i + _chunk_size], cache)
+                for i in range(0, len(changed), _chunk_size)]
+        results = (result for chunk in imap_parallel(_read_terms, chunks,
+            processes) for result in chunk)
+
+        with self.connection as db:
+            for count, (path, result) in enumerate(zip(changed, results), 1):
+                if isinstance(result, str):
+                    summary['errors'][path] = result
+                else:
+                    summary['updated' if path in known else 'added'] += 1
+                    self._add(path, stamps[path], result, terms)
+                if count % _batch_size == 0:
+                    db.commit()
+
+        return summary
+
+    def _add(self, path, stamp, pairs, terms):
+        """Record the terms of a file, replacing any earlier record."""
+
+        db = self.connection
+        row = db.execute("SELECT id FROM files WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            file = db.execute("INSERT INTO files (path, size, mtime) "
+                    "VALUES (?, ?, ?)", (path,) + stamp).lastrowid
+        else:
+            file = row[0]
+            db.execute("UPDATE files SET size = ?, mtime = ? WHERE id = ?",
+                    stamp + (file,))
+            db.execute("DELETE FROM postings WHERE file = ?", (file,))
+
+        postings = []
+        for key, value, number in pairs:
+            term = terms.get((key, value))
+            if term is None:
+                term = db.execute("INSERT INTO terms (key, value, number) "
+                        "VALUES (?, ?, ?)", (key, value, number)).lastrowid
+                terms[key, value] = term
+            postings.append((term, file))
+
+        db.executemany("INSERT OR IGNORE INTO postings VALUES (?, ?)", postings)
+
+    def _remove(self, path):
+        row = self.connection.execute("SELECT id FROM files WHERE path = ?",
+                (path,)).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM postings WHERE file = ?", row)
+            self.connection.execute("DELETE FROM files WHERE id = ?", row)
+
+    def query(self, conditions=None, **kwargs):
+        """Return the paths of files with the given parameter values.
+
+        Numeric values are compared as numbers, so that ``dt=0.002``
+        matches a file with ``dt = 2e-3``. A value of None matches every
+        file which sets the parameter.
+
+        Args:
+            conditions (dict, optional): Parameters and values to match,
+                for keys which are not valid Python names
+            **kwargs: Further parameters and values to match
+
+        Returns:
+            list: The matching paths, sorted
+
+        """
+
+        conditions = dict(conditions or {}, **kwargs)
+
+        clauses, arguments = [], []
+        for key, value in sorted(conditions.items()):
+            number = _number(value)
+            if value is None:
+                clause, argument = "", []
+            elif number is None:
+                clause, argument = " AND value = ?", [normalise_value(value)]
+            else:
+                clause, argument = " AND number = ?", [number]
+            clauses.append("id IN (SELECT file FROM postings JOIN terms "
+                    "ON terms.id = postings.term WHERE key = ?%s)" % clause)
+            arguments += [normalise_key(key)] + argument
+
+        sql = "SELECT path FROM files"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+
+        # Sorted here, since ordering in SQL makes SQLite scan all files
+        return sorted(row[0] for row in self.connection.execute(sql, arguments))
+
+    def values(self, parameter):
+        """Return the number of files with every value of a parameter.
+
+        Values are normalised as they are matched by :func:`query`.
+
+        """
+
+        cursor = self.connection.execute("SELECT value, COUNT(*) FROM terms "
+                "JOIN postings ON postings.term = terms.id WHERE key = ? "
+                "GROUP BY value ORDER BY value", (normalise_key(parameter),))
+
+        return dict(cursor)
+
+def _read_terms(job):
+    """Return the terms of files, or an error message for those not read."""
+
+    paths, cache = job
+    results, normalised = [], {}
+    for path in paths:
+        try:
+            if cache:
+                options = {key: option.value
+                        for key, option in read_cached(path).options.items()}
+            else:
+                options = _read_options(path)
+        except (OSError, UnicodeDecodeError) as error:
+            results.append(str(error))
+            continue
+
+        # Files mostly share their options, which are normalised only once
+        terms = set()
+        for option in options.items():
+            term = normalised.get(option)
+            if term is None:
+                key, value = option
+                term = normalised[option] = (normalise_key(key),
+                        normalise_value(value), _number(value))
+            terms.add(term)
+        results.append(list(terms))
+
+    return results
+
+def _read_options(path):
+    """Return the parameters and values of an MDP file.
+
+    Parses lines as :func:`MdpFile.read` does, but without creating
+    the options and keeping the lines, which takes most of its time.
+
+    """
+
+    options = {}
+    with open(path, 'r') as fp:
+        for line in fp:
+            option = line.split(';', 1)[0]
+            if option.count('=') == 1:
+                parameter, value = option.split('=')
+                parameter, value = parameter.strip(), value.strip()
+                if parameter and value:
+                    options[parameter] = value
+
+    return options
@@ -0,0 +1,107 @@
+import json
+import os
+from pygromacs.gmxfiles import MdpFile
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+"""JSON Lines and TOML export and import of MDP files."""
+
+def dump_jsonl(files, path, raw=False):
+    """Write MDP files to a JSON Lines file, one file per line.
+
+    Every line is the dictionary of :func:`MdpFile.to_dict` with the
+    ``name`` of the file. Files are written one at a time as they are
+    taken from ``files``, so that a generator (or a
+    :class:`~pygromacs.sweep.ParameterSpace`) of any size is exported
+    in constant memory.
+
+    Args:
+        files (iterable or dict): :class:`~pygromacs.gmxfiles.MdpFile`
+            objects, named by their file names, or a dictionary (or any
+            object with ``items()``) of files by name
+        path (str or file): Path to write to, or an open text file
+        raw (bool, optional): Include the raw text of unmodified lines
+
+    Returns:
+        int: The number of written files
+
+    """
+
+    if hasattr(files, 'items'):
+        files = files.items()
+    else:
+        files = ((os.path.splitext(os.path.basename(mdp.path))[0], mdp)
+                for mdp in files)
+
+    if not hasattr(path, 'write'):
+        with open(path, 'w') as fp:
+            return _write_jsonl(files, fp, raw)
+
+    return _write_jsonl(files, path, raw)
+
+def load_jsonl(path):
+    """Read MDP files from a JSON Lines file, one at a time.
+
+    Args:
+        path (str or file): Path to read from, or an open text file
+
+    Yields:
+        tuple: The name and :class:`~pygromacs.gmxfiles.MdpFile` of
+            every line. ``dict(load_jsonl(path))`` gives the
+            configurations to :func:`~pygromacs.runs.generate_runs`.
+
+    """
+
+    if not hasattr(path, 'read'):
+        with open(path, 'r') as fp:
+            yield from load_jsonl(fp)
+        return
+
+    for line in path:
+        if line.strip():
+            data = json.loads(line)
+            yield data.get('name', ""), MdpFile.from_dict(data)
+
+def _write_jsonl(files, fp, raw):
+    """Write named MDP files to an open file, returning their number."""
+
+    count = 0
+    for name, mdp in files:
+        data = mdp.to_dict(raw)
+        data['name'] = name
+        fp.write(json.dumps(data) + '\n')
+        count += 1
+
+    return count
+
+def dump_toml(mdp, raw=False):
+    """Return an MDP file as TOML, with the fields of :func:`MdpFile.to_dict`.
+
+    Every line of the file is a ``[[lines]]`` table.
+
+    """
+
+    data = mdp.to_dict(raw)
+
+    text = ["path = %s\n" % json.dumps(data['path'])]
+    for line in data['lines']:
+        text.append("\n[[lines]]\n")
+        text += ["%s = %s\n" % (key, json.dumps(value))
+                for key, value in line.items()]
+
+    return "".join(text)
+
+def load_toml(text):
+    """Create an MDP file from TOML as written by :func:`dump_toml`.
+
+    Requires :mod:`tomllib` (Python 3.11 or newer).
+
+    """
+
+    if tomllib is None:
+        raise ImportError("reading TOML requires Python 3.11 or newer")
+
+    return MdpFile.from_dict(tomllib.loads(text))
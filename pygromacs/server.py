@@ -0,0 +1,340 @@
+import json
+import os
+import socket
+import socketserver
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from pygromacs.gmxfiles import MdpFile, Topol
+
+"""A daemon keeping parsed files in memory, served over a Unix socket.
+
+Requests and responses are JSON objects, one per line. Every request has
+a ``command`` and the ``file`` it applies to:
+
+``get``
+    Return the ``values`` of a list of ``parameters`` (for a topology,
+    the counts of molecules), null for those which are not set.
+
+``set``
+    Set the ``options`` (a dictionary of parameters and values, for a
+    topology of molecules and counts), optionally with ``comments``,
+    and ``remove`` a list of parameters. The file is written unless
+    ``save`` is false.
+
+``save``
+    Write the file, or a copy of it to ``output``.
+
+``ping``, ``stats`` and ``shutdown`` take no file. Every response has
+``ok``, and if it is false an ``error`` message. Since the protocol is
+plain text a shell script can also talk to the daemon directly, e.g.
+with ``socat - UNIX-CONNECT:$socket``.
+
+"""
+
+def default_socket():
+    """Return the socket path: ``$PYGROMACS_SOCKET`` or a per-user path
+    in the temporary directory."""
+
+    return os.environ.get('PYGROMACS_SOCKET') or os.path.join(
+            tempfile.gettempdir(), 'pygromacs-%d.sock' % os.getuid())
+
+class FileCache(object):
+    """A least recently used cache of parsed files.
+
+    A cached file is parsed again if the size or modification time of the
+    file on disk has changed. Files with a ``.top`` extension are read as
+    :class:`~pygromacs.gmxfiles.Topol`, others as
+    :class:`~pygromacs.gmxfiles.MdpFile`.
+
+    Args:
+        size (int, optional): Maximum number of cached files
+
+    Attributes:
+        hits: Number of lookups answered from the cache.
+
+        misses: Number of lookups which read the file.
+
+    """
+
+    def __init__(self, size=1024):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._files = OrderedDict()
+
+    def __len__(self):
+        return len(self._files)
+
+    def get(self, path):
+        """Return the parsed file at a path."""
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = (stat.st_size, stat.st_mtime_ns)
+
+        entry = self._files.get(path)
+        if entry is not None and entry[0] == stamp:
+            self._files.move_to_end(path)
+            self.hits += 1
+            return entry[1]
+
+        cls = Topol if path.endswith('.top') else MdpFile
+        obj = cls(path)
+        self.misses += 1
+        self._store(path, stamp, obj)
+
+        return obj
+
+    def update(self, path, obj):
+        """Store a file which was just written to a path."""
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        self._store(path, (stat.st_size, stat.st_mtime_ns), obj)
+
+    def _store(self, path, stamp, obj):
+        self._files[path] = (stamp, obj)
+        self._files.move_to_end(path)
+        while len(self._files) > self.size:
+            self._files.popitem(last=False)
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A server answering requests about cached files.
+
+    Requests are handled one at a time under a lock, but every client has
+    its own connection thread. Use :func:`serve` to run a server.
+
+    Args:
+        path (str): Path of the socket
+        size (int, optional): Maximum number of cached files
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, size=1024):
+        self.cache = FileCache(size)
+        self.lock = threading.Lock()
+        socketserver.UnixStreamServer.__init__(self, path, _Handler)
+
+    def handle_request_line(self, line):
+        """Return the response to a request, as a line of bytes."""
+
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+            command = request.get('command')
+            if command not in _commands:
+                raise ValueError("unknown command '%s'" % command)
+            with self.lock:
+                response = _commands[command](self, request)
+            response['ok'] = True
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            response = {'ok': False, 'error': str(error)}
+
+        return json.dumps(response).encode() + b'\n'
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if line.strip():
+                self.wfile.write(self.server.handle_request_line(line))
+
+def serve(path=None, size=1024):
+    """Run a server until it receives a ``shutdown`` request.
+
+    Args:
+        path (str, optional): Path of the socket (default:
+            :func:`default_socket`)
+        size (int, optional): Maximum number of cached files
+
+    """
+
+    path = path or default_socket()
+    if os.path.lexists(path):
+        if not stat.S_ISSOCK(os.lstat(path).st_mode):
+            raise OSError("'%s' exists and is not a socket" % path)
+
+        # A socket left by a server which did not shut down cleanly
+        try:
+            Client(path).close()
+        except OSError:
+            os.remove(path)
+        else:
+            raise OSError("a server is already listening on '%s'" % path)
+
+    server = Server(path, size)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
+
+class Client(object):
+    """A connection to a server.
+
+    Args:
+        path (str, optional): Path of the socket (default:
+            :func:`default_socket`)
+
+    Example:
+        ::
+
+            with Client() as client:
+                client.set('grompp.mdp', {'nsteps': 50000})
+                client.get('grompp.mdp', 'nsteps', 'dt')
+
+    """
+
+    def __init__(self, path=None):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(path or default_socket())
+        except OSError:
+            self.socket.close()
+            raise
+        self._file = self.socket.makefile('rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._file.close()
+        self.socket.close()
+
+    def request(self, command, **fields):
+        """Send a request and return the response.
+
+        Raises:
+            RuntimeError: If the server could not answer the request
+
+        """
+
+        fields['command'] = command
+        self.socket.sendall(json.dumps(fields).encode() + b'\n')
+        response = json.loads(self._file.readline())
+        if not response.pop('ok'):
+            raise RuntimeError(response['error'])
+
+        return response
+
+    def get(self, path, *parameters):
+        """Return a dictionary of parameter values, None if not set."""
+
+        return self.request('get', file=os.path.abspath(path),
+                parameters=parameters)['values']
+
+    def set(self, path, options, comments=None, remove=(), save=True):
+        """Set and remove options of a file, and write it."""
+
+        self.request('set', file=os.path.abspath(path), options=options,
+                comments=comments or {}, remove=list(remove), save=save)
+
+    def save(self, path, output=None):
+        """Write a file, or a copy of it to ``output``."""
+
+        self.request('save', file=os.path.abspath(path),
+                output=os.path.abspath(output) if output else None)
+
+def _get(server, request):
+    obj = server.cache.get(request['file'])
+    values = {}
+    for parameter in request['parameters']:
+        if isinstance(obj, Topol):
+            counts = [m.count for m in obj.molecules if m.name == parameter]
+            values[parameter] = counts[0] if counts else None
+        else:
+            name = obj.find_option(parameter)
+            values[parameter] = obj.options[name].value if name else None
+
+    return {'values': values}
+
+def _set(server, request):
+    obj = server.cache.get(request['file'])
+    comments = request.get('comments') or {}
+    if isinstance(obj, Topol):
+        for name, count in request.get('options', {}).items():
+            obj.set_molecule(name, int(count), comments.get(name, ""))
+        for name in request.get('remove', []):
+            obj.remove_molecule(name)
+    else:
+        # A cached file lives for long, so edits are not kept to undo,
+        # except to roll back a request which fails half way
+        snapshot = obj.snapshot()
+        try:
+            for parameter, value in request.get('options', {}).items():
+                obj.set_option(obj.find_option(parameter) or parameter, value,
+                        comments.get(parameter, ""))
+            for parameter in request.get('remove', []):
+                obj.remove_option(obj.find_option(parameter) or parameter)
+        except BaseException:
+            obj.restore(snapshot)
+            raise
+        finally:
+            obj.clear_history()
+
+    if request.get('save', True):
+        _write(server, obj, request['file'])
+
+    return {}
+
+def _save(server, request):
+    obj = server.cache.get(request['file'])
+    _write(server, obj, request.get('output') or request['file'])
+
+    return {}
+
+def _write(server, obj, path):
+    """Write a file without a backup and keep it cached.
+
+    An MDP file is replaced atomically, so that it is never left
+    half written.
+
+    """
+
+    if isinstance(obj, Topol):
+        if os.path.abspath(path) != os.path.abspath(obj.path) \
+                and os.path.exists(path):
+            os.remove(path)
+        obj.save(path, verbose=False)
+    else:
+        from pygromacs.runs import render_mdp
+        from pygromacs.utils import replace_file
+
+        data = render_mdp(obj)
+        try:
+            with open(path, 'rb') as fp:
+                unchanged = fp.read() == data
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            replace_file(path, data)
+
+    if os.path.abspath(path) == os.path.abspath(obj.path):
+        server.cache.update(path, obj)
+
+def _ping(server, request):
+    return {}
+
+def _stats(server, request):
+    cache = server.cache
+    return {'files': len(cache), 'hits': cache.hits, 'misses': cache.misses}
+
+def _shutdown(server, request):
+    threading.Thread(target=server.shutdown).start()
+    return {}
+
+_commands = {
+        'get': _get,
+        'set': _set,
+        'save': _save,
+        'ping': _ping,
+        'stats': _stats,
+        'shutdown': _shutdown,
+        }
@@ -0,0 +1,596 @@
+import copy
+import re
+import numpy as np
+from collections import OrderedDict
+from pygromacs.gmxfiles import MdpFile, normalise_key
+
+"""Parameter spaces for generating many variants of an MDP file."""
+
+class ParameterSpace(object):
+    """The full factorial product of values for a set of MDP parameters.
+
+    The product is never built. Variants are addressed by their index
+    in the product, which is decoded as a mixed-radix number with the
+    last parameter varying fastest (as in :func:`itertools.product`).
+    Counting, indexing and slicing are all O(1), and iteration creates
+    variants one at a time.
+
+    Indexing returns a variant :class:`~pygromacs.gmxfiles.MdpFile`,
+    which is a copy of the base file with the swept options set. Slicing
+    and sharding (see :func:`shard`) return a new space of the selected
+    variants, which keep their index (and thus their name) in the full space.
+
+    Parameters which follow from the swept ones, such as the number of
+    steps for a swept time step, are added by rules (see :func:`derive`).
+
+    Args:
+        base (MdpFile): The file to create variants of
+        parameters (dict or list): Lists of values for every swept parameter,
+            either in an ordered dictionary or as ``(parameter, values)`` pairs
+
+    Attributes:
+        base: The file to create variants of.
+
+        parameters: An ordered dictionary of the swept parameters and values.
+            Parameters set in the base file are named as they are there
+            (see :func:`~pygromacs.gmxfiles.MdpFile.find_option`), so that
+            their line is replaced.
+
+        indices: A :class:`range` (or for hash shards, an array) of the
+            variant indices in the space.
+
+        rules: An ordered dictionary of the derived parameters and
+            their expressions.
+
+        constants: A dictionary of named constants used in the rules.
+
+    """
+
+    def __init__(self, base, parameters, indices=None):
+        self.base = base
+        self.parameters = _base_names(base, [(parameter, [str(v) for v in values])
+                for parameter, values in (parameters.items()
+                    if hasattr(parameters, 'items') else parameters)])
+
+        self.size = 1
+        for values in self.parameters.values():
+            self.size *= len(values)
+
+        self.indices = range(self.size) if indices is None else indices
+        self.rules = OrderedDict()
+        self.constants = {}
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self._subset(self.indices[key])
+
+        return self.variant(self.indices[key])
+
+    def __iter__(self):
+        for _, mdp in self.items():
+            yield mdp
+
+    def shard(self, index, count=None, method='contiguous'):
+        """Return one of ``count`` disjoint shards of the space.
+
+        Shards together cover the space exactly once, so a job array can
+        generate one shard per task. Contiguous shards are near-equal ranges
+        of the space. Hash shards assign every variant by a hash of its
+        index, which spreads variants of every region over all shards
+        for a better load balance.
+
+        Args:
+            index (int or str): Index of the shard, from 0, or a
+                specification ``'index/count'``
+            count (int, optional): Number of shards
+            method (str, optional): 'contiguous' or 'hash'
+
+        Returns:
+            ParameterSpace: The shard
+
+        """
+
+        if count is None:
+            index, count = str(index).split('/')
+        index, count = int(index), int(count)
+        if not 0 <= index < count:
+            raise ValueError("shard %d/%d out of range" % (index, count))
+
+        if method == 'contiguous':
+            size = len(self.indices)
+            indices = self.indices[index*size//count:(index + 1)*size//count]
+        elif method == 'hash':
+            chunks = []
+            for start in range(0, len(self.indices), 1 << 20):
+                chunk = np.asarray(self.indices[start:start + (1 << 20)],
+                        dtype=np.int64)
+                chunks.append(chunk[_mix(chunk) % np.uint64(count) == index])
+            indices = np.concatenate(chunks) if chunks \
+                    else np.zeros(0, dtype=np.int64)
+        else:
+            raise ValueError("unknown shard method '%s'" % method)
+
+        return self._subset(indices)
+
+    def derive(self, rules, constants=None):
+        """Return the space with parameters derived from other values.
+
+        A rule is a Python expression of the swept parameters, named
+        constants and the (numeric) options of the base file, in which
+        parameter names are normalised (``ref-t`` is ``ref_t``). Rules are
+        evaluated in order, so later rules can use earlier derived values,
+        and with NumPy over all variants at once. The functions ``round``,
+        ``floor`` and ``ceil`` return integers; ``abs``, ``sqrt``, ``min``
+        and ``max`` (elementwise) are also available.
+
+        A derived step count whose comment in the base file is a time,
+        such as ``nsteps = 10000 ; 4 ns``, has the time in its comment
+        updated to the number of steps times ``dt``.
+
+        Args:
+            rules (dict or list): Expressions of every derived parameter,
+                either in an ordered dictionary or as
+                ``(parameter, expression)`` pairs
+            constants (dict, optional): Named constants
+
+        Returns:
+            ParameterSpace: The space with the rules added
+
+        Example:
+            Keep the simulated time and output interval of a
+            sweep over the time step::
+
+                space = ParameterSpace(mdp, {'dt': [0.002, 0.004]}).derive(
+                        {'nsteps': 'round(total_ps / dt)',
+                            'nstxtcout': 'round(10 / dt)'},
+                        {'total_ps': 4000})
+
+        """
+
+        space = copy.copy(self)
+        space.rules = OrderedDict(self.rules)
+        for parameter, expression in (rules.items()
+                if hasattr(rules, 'items') else rules):
+            space.rules[str(parameter)] = str(expression)
+
+        space.constants = dict(self.constants)
+        space.constants.update(constants or {})
+
+        return space
+
+    def _subset(self, indices):
+        space = copy.copy(self)
+        space.indices = indices
+
+        return space
+
+    def items(self):
+        """Yield the name and variant of every index in the space."""
+
+        for start in range(0, len(self.indices), _chunk_size):
+            indices = self.indices[start:start + _chunk_size]
+            for index, mdp in zip(indices, self._variants(indices)):
+                yield self.name(index), mdp
+
+    def rendered(self, comment=True, values=False):
+        """Yield the name and file content of every variant in the space.
+
+        The base file is compiled once (see :func:`MdpFile.compile`)
+        and every variant is rendered by filling in its values, which
+        is much faster than creating and printing the variants.
+
+        Args:
+            comment (bool, optional): Include comments
+            values (bool, optional): Also yield the swept and derived
+                values of every variant
+
+        Yields:
+            tuple: The name and content (bytes) of a variant, as written
+                by :func:`~pygromacs.gmxfiles.MdpFile.save`, and with
+                ``values`` a dictionary of its values by parameter
+
+        """
+
+        with_values = values
+
+        derived = self._derived_names()
+        template = self.base.compile(list(self.parameters) + derived, comment)
+
+        for start in range(0, len(self.indices), _chunk_size):
+            indices = self.indices[start:start + _chunk_size]
+            columns = self._columns(indices)
+            rules = self._evaluate(columns, len(indices))
+
+            for row, index in enumerate(indices):
+                values = {parameter: values[row]
+                        for parameter, values in columns.items()}
+                comments = {}
+                for parameter, (rule_values, rule_comments) in zip(derived,
+                        rules.values()):
+                    values[parameter] = rule_values[row]
+                    if rule_comments is not None:
+                        comments[parameter] = rule_comments[row]
+
+                if with_values:
+                    yield self.name(index), template.render(values, comments), values
+                else:
+                    yield self.name(index), template.render(values, comments)
+
+    def table(self, indices=None):
+        """Return the swept and derived values of variants as columns.
+
+        Args:
+            indices (list, optional): Indices of variants in the full space,
+                by default all variants of this space
+
+        Returns:
+            OrderedDict: An array of values (as strings) for every parameter
+
+        """
+
+        indices = self.indices if indices is None else indices
+        columns = self._columns(indices)
+        for parameter, (values, _) in self._evaluate(columns, len(indices)).items():
+            columns[parameter] = values
+
+        return columns
+
+    def values(self, index):
+        """Return the swept parameter values of a variant.
+
+        Args:
+            index (int): Index of the variant in the full space
+
+        Returns:
+            OrderedDict: The value of every swept parameter
+
+        """
+
+        return OrderedDict((parameter, values[0])
+                for parameter, values in self._columns([index]).items())
+
+    def _columns(self, indices):
+        """Return the swept values of variants as columns of strings."""
+
+        indices = _check_indices(indices, self.size)
+
+        columns = []
+        for parameter, values in reversed(list(self.parameters.items())):
+            indices, digits = np.divmod(indices, len(values))
+            columns.append((parameter, np.array(values, dtype=object)[digits]))
+
+        return OrderedDict(reversed(columns))
+
+    def _evaluate(self, columns, count):
+        """Evaluate the rules over columns of swept values.
+
+        Returns:
+            OrderedDict: ``(values, comments)`` arrays for every derived
+                parameter, comments being None if they are kept
+
+        """
+
+        options = {normalise_key(parameter): option
+                for parameter, option in self.base.options.items()}
+        strings = {normalise_key(parameter): values
+                for parameter, values in columns.items()}
+        numbers = {}
+
+        def number(name):
+            if name not in numbers:
+                if name in strings:
+                    value = strings[name]
+                elif name in self.constants:
+                    value = self.constants[name]
+                elif name in options:
+                    value = options[name].value
+                else:
+                    raise ValueError("unknown name '%s' in rules" % name)
+                try:
+                    numbers[name] = np.asarray(value, dtype=object).astype(float)
+                except ValueError:
+                    raise ValueError("'%s' is not a number" % name)
+
+            return numbers[name]
+
+        derived = OrderedDict()
+        for parameter, expression in self.rules.items():
+            code = compile(expression, "<rule for '%s'>" % parameter, 'eval')
+            namespace = {name: _functions[name] if name in _functions
+                    else number(name) for name in code.co_names}
+            result = np.broadcast_to(eval(code, {'__builtins__': {}}, namespace),
+                    (count,))
+
+            if result.dtype.kind in 'biu':
+                values = np.array([str(v) for v in result.tolist()], dtype=object)
+            else:
+                values = np.array(['%.10g' % v for v in result.tolist()],
+                        dtype=object)
+
+            key = normalise_key(parameter)
+            strings[key] = values
+            numbers[key] = result.astype(float)
+
+            comments = None
+            match = _time_comment.match(options[key].comment) \
+                    if key in options and result.dtype.kind in 'biu' else None
+            if match:
+                prefix, _, unit, name, suffix = match.groups()
+                times = result * number('dt') / _time_units[name]
+                comments = np.array([prefix + '%g' % time + unit + suffix
+                    for time in times.tolist()], dtype=object)
+
+            derived[parameter] = (values, comments)
+
+        return derived
+
+    def _variants(self, indices):
+        """Yield the variants at indices of the full space."""
+
+        columns = self._columns(indices)
+        rules = self._evaluate(columns, len(indices))
+        derived = self._derived_names()
+
+        for row in range(len(indices)):
+            mdp = overlay(self.base, OrderedDict((parameter, values[row])
+                for parameter, values in columns.items()))
+            for parameter, (values, comments) in zip(derived, rules.values()):
+                mdp.set_option(parameter, values[row])
+                if comments is not None:
+                    mdp.set_comment(parameter, comments[row])
+
+            yield mdp
+
+    def _derived_names(self):
+        """Return the derived parameters as named in the base file."""
+
+        return list(_base_names(self.base, [(parameter, None)
+            for parameter in self.rules]))
+
+    def name(self, index):
+        """Return the name of a variant: its zero-padded index."""
+
+        return "%0*d" % (len(str(max(self.size - 1, 0))), index)
+
+    def variant(self, index):
+        """Return the variant MDP file at an index of the full space."""
+
+        return next(self._variants([index]))
+
+class ParameterSample(ParameterSpace):
+    """A sample of variants drawn from ranges of MDP parameters.
+
+    Instead of a full factorial product of values, ``count`` points are
+    drawn from the ranges of the parameters, all at once with NumPy. Points
+    are uniformly random, a Latin hypercube (every parameter range is
+    divided into ``count`` strata which each hold a single point) or
+    a Sobol sequence, which covers the space more evenly still.
+
+    Parameters with integer bounds are sampled as integers, others are
+    rounded to ``decimals`` decimals. The sample is otherwise used as
+    a :class:`ParameterSpace`: it can be indexed, sliced and sharded and
+    given to :func:`~pygromacs.runs.generate_runs`.
+
+    Args:
+        base (MdpFile): The file to create variants of
+        ranges (dict or list): The ``(low, high)`` range of every parameter,
+            either in an ordered dictionary or as ``(parameter, range)`` pairs
+        count (int): Number of variants to draw
+        method (str, optional): 'random', 'latin' or 'sobol'
+        seed (int, optional): Seed of the random generator. A seeded Sobol
+            sequence is randomised by a digital shift.
+        decimals (int, optional): Number of decimals of non-integer values
+
+    Attributes:
+        base: The file to create variants of.
+
+        parameters: An ordered dictionary of the parameter ranges.
+
+        points: An array of shape ``(count, parameters)`` with the
+            drawn values.
+
+        indices: A :class:`range` (or for hash shards, an array) of the
+            variant indices in the sample.
+
+    """
+
+    def __init__(self, base, ranges, count, method='random', seed=None,
+            decimals=6):
+        self.base = base
+        self.parameters = _base_names(base, [(parameter, tuple(bounds))
+                for parameter, bounds in (ranges.items()
+                    if hasattr(ranges, 'items') else ranges)])
+        self.decimals = decimals
+        self.size = int(count)
+        self.indices = range(self.size)
+        self.rules = OrderedDict()
+        self.constants = {}
+
+        rng = np.random.default_rng(seed)
+        dims = len(self.parameters)
+        if method == 'random':
+            unit = rng.random((self.size, dims))
+        elif method == 'latin':
+            strata = rng.permuted(np.tile(np.arange(self.size), (dims, 1)), axis=1)
+            unit = (strata.T + rng.random((self.size, dims))) / max(self.size, 1)
+        elif method == 'sobol':
+            unit = sobol(self.size, dims, rng if seed is not None else None)
+        else:
+            raise ValueError("unknown sample method '%s'" % method)
+
+        low, high = np.array(list(self.parameters.values()), dtype=float) \
+                .reshape(dims, 2).T
+        integer = np.array([all(isinstance(b, (int, np.integer)) for b in bounds)
+            for bounds in self.parameters.values()], dtype=bool)
+
+        # Integer ranges include their upper bound
+        points = low + unit*(high - low + integer)
+        self.points = np.where(integer, np.minimum(np.floor(points), high),
+                np.round(points, decimals))
+        self._integer = integer
+
+    def _columns(self, indices):
+        """Return the sampled values of variants as columns of strings."""
+
+        points = self.points[_check_indices(indices, self.size)]
+
+        return OrderedDict((parameter, np.array([str(int(value)) if integer
+            else repr(value) for value in column.tolist()], dtype=object))
+            for parameter, column, integer in zip(self.parameters, points.T,
+                self._integer))
+
+def sobol(count, dims, rng=None):
+    """Return the first points of a Sobol sequence in the unit hypercube.
+
+    Points are generated in Gray code order, all of them at once for every
+    bit of the direction numbers (Joe and Kuo, 2008). Up to 16 dimensions
+    are supported.
+
+    Args:
+        count (int): Number of points
+        dims (int): Number of dimensions
+        rng (numpy.random.Generator, optional): Randomise the sequence
+            by a random digital shift drawn from this generator
+
+    Returns:
+        array: Points of shape ``(count, dims)``
+
+    """
+
+    if dims > len(_sobol_directions) + 1:
+        raise ValueError("at most %d dimensions are supported"
+                % (len(_sobol_directions) + 1))
+
+    bits = max(1, int(count - 1).bit_length())
+    directions = np.zeros((bits, dims), dtype=np.uint64)
+    for dim in range(dims):
+        if dim == 0:
+            s, a, m = bits, 0, [1]*bits
+        else:
+            s, a, m = _sobol_directions[dim - 1]
+        v = [m[i] << (32 - i - 1) for i in range(min(s, bits))]
+        for i in range(s, bits):
+            value = v[i - s] ^ (v[i - s] >> s)
+            for k in range(1, s):
+                value ^= ((a >> (s - 1 - k)) & 1) * v[i - k]
+            v.append(value)
+        directions[:, dim] = v
+
+    index = np.arange(count, dtype=np.uint64)
+    gray = index ^ (index >> np.uint64(1))
+    points = np.zeros((count, dims), dtype=np.uint64)
+    for bit in range(bits):
+        points ^= ((gray >> np.uint64(bit)) & np.uint64(1))[:, None] \
+                * directions[bit]
+
+    if rng is not None:
+        points ^= rng.integers(0, 1 << 32, dims, dtype=np.uint64)
+
+    return points / float(1 << 32)
+
+# Joe and Kuo (2008) primitive polynomials (degree s, coefficients a)
+# and initial direction numbers m for dimensions 2 to 16
+_sobol_directions = [
+        (1, 0, [1]),
+        (2, 1, [1, 3]),
+        (3, 1, [1, 3, 1]),
+        (3, 2, [1, 1, 1]),
+        (4, 1, [1, 1, 3, 3]),
+        (4, 4, [1, 3, 5, 13]),
+        (5, 2, [1, 1, 5, 5, 17]),
+        (5, 4, [1, 1, 5, 5, 5]),
+        (5, 7, [1, 1, 7, 11, 19]),
+        (5, 11, [1, 1, 5, 1, 1]),
+        (5, 13, [1, 1, 1, 3, 11]),
+        (5, 14, [1, 3, 5, 5, 31]),
+        (6, 1, [1, 3, 3, 9, 7, 49]),
+        (6, 13, [1, 1, 1, 15, 21, 21]),
+        (6, 16, [1, 3, 1, 13, 27, 49])
+        ]
+
+def overlay(base, values):
+    """Return a copy of an MDP file with some options set.
+
+    Args:
+        base (MdpFile): A file
+        values (dict): Parameters and values to set
+
+    Returns:
+        MdpFile: The new file
+
+    """
+
+    mdp = MdpFile()
+    mdp.path = base.path
+    mdp.newline = base.newline
+    mdp.final_newline = base.final_newline
+    mdp.lines = [copy.copy(option) for option in base.lines]
+    mdp.options = {parameter: mdp.lines[option.index]
+            for parameter, option in base.options.items()}
+
+    for parameter, value in values.items():
+        mdp.set_option(parameter, value)
+
+    return mdp
+
+def _base_names(base, items):
+    """Return an ordered dictionary of items by parameter, naming the
+    parameters as in the base file.
+
+    Raises:
+        ValueError: If two parameters are the same
+
+    """
+
+    names = {normalise_key(parameter): parameter for parameter in base.options}
+
+    named = OrderedDict()
+    for parameter, value in items:
+        key = normalise_key(str(parameter))
+        parameter = names.setdefault(key, str(parameter))
+        if parameter in named:
+            raise ValueError("parameter '%s' given twice" % parameter)
+        named[parameter] = value
+
+    return named
+
+def _check_indices(indices, size):
+    """Return indices as an array, checking that they are in range."""
+
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    if len(indices) and (indices.min() < 0 or indices.max() >= size):
+        raise IndexError("variant index out of range")
+
+    return indices
+
+# Number of variants created from one evaluation of the rules
+_chunk_size = 4096
+
+# Functions available in rules
+_functions = {
+        'round': lambda x: np.rint(x).astype(np.int64),
+        'floor': lambda x: np.floor(x).astype(np.int64),
+        'ceil': lambda x: np.ceil(x).astype(np.int64),
+        'abs': np.abs,
+        'sqrt': np.sqrt,
+        'min': np.minimum,
+        'max': np.maximum,
+        }
+
+# A comment starting with a time, and time units in ps
+_time_comment = re.compile(
+        r'^(\s*)([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)(\s*(fs|ps|ns|us)\b)(.*)$',
+        re.S)
+_time_units = {'fs': 1e-3, 'ps': 1.0, 'ns': 1e3, 'us': 1e6}
+
+def _mix(indices):
+    """Hash an array of integers (the SplitMix64 finaliser)."""
+
+    z = indices.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+
+    return z ^ (z >> np.uint64(31))
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile as tmp
+
+from pygromacs.cache import *
+from pygromacs.gmxfiles import *
+from pygromacs.runs import render_mdp
+
+path = 'pygromacs/tests/grompp.mdp'
+
+def test_cache_directory():
+    environ = dict(os.environ)
+    try:
+        os.environ['PYGROMACS_CACHE'] = '/tmp/cache'
+        assert (cache_directory() == '/tmp/cache')
+        del os.environ['PYGROMACS_CACHE']
+        os.environ['XDG_CACHE_HOME'] = '/tmp/xdg'
+        assert (cache_directory() == '/tmp/xdg/pygromacs')
+    finally:
+        os.environ.clear()
+        os.environ.update(environ)
+
+def test_read_cached():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        source = os.path.join(tmp_dir, 'grompp.mdp')
+        shutil.copyfile(path, source)
+        target = cache_path(source, cache_dir)
+        assert (target.startswith(cache_dir))
+
+        mdp = read_cached(source, directory=cache_dir)
+        assert (os.path.exists(target))
+        cached = read_cached(source, directory=cache_dir)
+        assert (cached.path == source)
+        assert (render_mdp(cached) == render_mdp(mdp) == render_mdp(MdpFile(path)))
+        assert (sorted(cached.options) == sorted(mdp.options))
+        assert ([o.index for o in cached.lines] == list(range(len(mdp.lines))))
+
+        # Touched but unchanged: the cache is kept
+        os.utime(source, ns=(0, 0))
+        assert (render_mdp(read_cached(source, directory=cache_dir))
+                == render_mdp(mdp))
+
+        # Changed: parsed again
+        mdp.set_option('nsteps', 5)
+        mdp.save(source, verbose=False)
+        os.utime(source, ns=(0, 0))
+        assert (read_cached(source, directory=cache_dir).get_option('nsteps')
+                == '5')
+
+        # Bad cache files are replaced
+        with open(target, 'wb') as fp:
+            fp.write(b'garbage')
+        assert (read_cached(source, directory=cache_dir).get_option('nsteps')
+                == '5')
+
+        clear_cache(cache_dir)
+        assert (not os.path.exists(cache_dir))
+
+def test_read_cached_line_breaks():
+    with open(path, 'rb') as fp:
+        data = fp.read().replace(b'\n', b'\r\n')[:-2]
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        source = os.path.join(tmp_dir, 'grompp.mdp')
+        with open(source, 'wb') as fp:
+            fp.write(data)
+
+        read_cached(source, directory=cache_dir)
+        cached = read_cached(source, directory=cache_dir)
+        assert (render_mdp(cached) == data)
+
+def test_read_cached_corrupt():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        cache_dir = os.path.join(tmp_dir, 'cache')
+        source = os.path.join(tmp_dir, 'grompp.mdp')
+        shutil.copyfile(path, source)
+        expected = render_mdp(MdpFile(path))
+        target = cache_path(source, cache_dir)
+        read_cached(source, directory=cache_dir)
+        with open(target, 'rb') as fp:
+            data = fp.read()
+
+        # Truncated bodies, and a body with bad string indices
+        for corrupt in (data[:60], data[:len(data)//2], data[:-10],
+                data[:60] + b'\xff'*(len(data) - 60)):
+            with open(target, 'wb') as fp:
+                fp.write(corrupt)
+            assert (render_mdp(read_cached(source, directory=cache_dir)) == expected)
+            with open(target, 'rb') as fp:
+                assert (fp.read() == data)
@@ -0,0 +1,170 @@
+import io
+import os
+import shutil
+import sys
+import tempfile as tmp
+
+from pygromacs.cli import main
+from pygromacs.gmxfiles import *
+
+path = 'pygromacs/tests/grompp.mdp'
+
+def copy_mdp(tmp_dir, name='grompp.mdp'):
+    target = os.path.join(tmp_dir, name)
+    shutil.copyfile(path, target)
+    return target
+
+def test_get(capsys):
+    assert (main(['get', path, 'nsteps']) == 0)
+    assert (capsys.readouterr().out == "10000\n")
+    assert (main(['get', path, 'DT', 'ref-t']) == 0)
+    assert (capsys.readouterr().out == "dt = 0.004\nref_t = 300 300\n")
+    assert (main(['get', path, 'made-up']) == 1)
+    assert ("made-up" in capsys.readouterr().err)
+    assert (main(['get', 'no-such-file.mdp', 'dt']) == 1)
+
+def test_set(capsys):
+    with tmp.TemporaryDirectory() as tmp_dir:
+        mdp_path = copy_mdp(tmp_dir)
+        assert (main(['set', mdp_path, 'nsteps=500 ; short', 'new-parameter=1',
+            '-r', 'DT']) == 0)
+        mdp = MdpFile(mdp_path)
+        assert (mdp.get_option('nsteps') == '500')
+        assert (mdp.options['nsteps'].comment == 'short')
+        assert (mdp.get_option('new-parameter') == '1')
+        assert ('dt' not in mdp.options)
+        assert (os.listdir(tmp_dir) == ['grompp.mdp'])
+
+        output = os.path.join(tmp_dir, 'out.mdp')
+        assert (main(['set', mdp_path, 'nsteps=1', '-o', output]) == 0)
+        assert (MdpFile(mdp_path).get_option('nsteps') == '500')
+        assert (MdpFile(output).get_option('nsteps') == '1')
+
+        assert (main(['set', mdp_path, 'nsteps']) == 1)
+
+def test_diff(capsys):
+    with tmp.TemporaryDirectory() as tmp_dir:
+        mdp_path = copy_mdp(tmp_dir)
+        assert (main(['diff', path, mdp_path]) == 0)
+        main(['set', mdp_path, 'nsteps=5', '-r', 'dt'])
+        capsys.readouterr()
+        assert (main(['diff', path, mdp_path]) == 1)
+        lines = capsys.readouterr().out.splitlines()
+        assert ([line.split()[0] for line in lines] == ['dt', 'nsteps'])
+        assert (lines[0].endswith("0.004 | (missing)"))
+
+def test_search(capsys):
+    assert (main(['search', path, 'tau']) == 0)
+    assert ('tau_t' in capsys.readouterr().out)
+    assert (main(['search', path, 'made-up']) == 1)
+
+def test_sweep(capsys):
+    with tmp.TemporaryDirectory() as tmp_dir:
+        assert (main(['sweep', path, tmp_dir, '-p', 'dt=0.002,0.004',
+            '-p', 'ref_t=300 300,310 310', '-d', 'nsteps=round(total_ps / dt)',
+            '-C', 'total_ps=4000', '--shard', '1/2']) == 0)
+        assert (sorted(os.listdir(tmp_dir)) == ['2.mdp', '3.mdp'])
+        mdp = MdpFile(os.path.join(tmp_dir, '3.mdp'))
+        assert (mdp.get_option('dt') == '0.004')
+        assert (mdp.get_option('ref_t') == '310 310')
+        assert (mdp.get_option('nsteps') == '1000000')
+
+        assert (main(['sweep', path, tmp_dir, '-p', 'dt=1', '--shard', '2/2']) == 1)
+
+        # Bad rules are errors
+        for rule in ('nsteps=round(x / dt)', 'nsteps=round(', 'nsteps=dt*integrator'):
+            assert (main(['sweep', path, tmp_dir, '-p', 'dt=1', '-d', rule]) == 1)
+            assert ('bad rule' in capsys.readouterr().err)
+
+def test_validate(capsys):
+    with tmp.TemporaryDirectory() as tmp_dir:
+        mdp_path = copy_mdp(tmp_dir)
+        assert (main(['validate', path, mdp_path]) == 0)
+        main(['set', mdp_path, 'nsteps=x'])
+        capsys.readouterr()
+        assert (main(['validate', path, mdp_path]) == 1)
+        assert (capsys.readouterr().out
+                == "%s: nsteps = x: not an integer\n" % mdp_path)
+
+def test_batch(capsys, monkeypatch):
+    with tmp.TemporaryDirectory() as tmp_dir:
+        paths = [copy_mdp(tmp_dir, '%d.mdp' % i) for i in range(3)]
+        commands = ["set %s nstlog=%d" % (p, i) for i, p in enumerate(paths)]
+        commands += ["# a comment", "", "get %s nstlog" % paths[2], "bogus"]
+        monkeypatch.setattr(sys, 'stdin', io.StringIO("\n".join(commands)))
+
+        assert (main(['--batch']) == 2)
+        assert (capsys.readouterr().out == "2\n")
+        assert ([MdpFile(p).get_option('nstlog') for p in paths] == ['0', '1', '2'])
+
+        # Edits are written after an error in a later command
+        out = os.path.join(tmp_dir, 'out')
+        commands = ["set %s nsteps=7" % paths[0],
+                "sweep %s %s -p dt=1,2 -d nsteps=round(x/dt)" % (paths[0], out)]
+        monkeypatch.setattr(sys, 'stdin', io.StringIO("\n".join(commands)))
+        assert (main(['--batch']) == 1)
+        assert (MdpFile(paths[0]).get_option('nsteps') == '7')
+
+def test_socket(capsys):
+    import threading
+    import time
+    from pygromacs.server import Client
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        mdp_path = copy_mdp(tmp_dir)
+        socket = os.path.join(tmp_dir, 'server.sock')
+        server = threading.Thread(target=main, args=(['serve', socket],))
+        server.start()
+        while not os.path.exists(socket):
+            time.sleep(0.01)
+
+        try:
+            assert (main(['--socket', socket, 'set', mdp_path, 'nsteps=5 ; x']) == 0)
+            assert (MdpFile(mdp_path).options['nsteps'].comment == 'x')
+            assert (main(['--socket', socket, 'get', mdp_path, 'nsteps']) == 0)
+            assert (capsys.readouterr().out == "5\n")
+            assert (main(['--socket', socket, 'get', mdp_path, 'made-up']) == 1)
+            assert (main(['--socket', socket, 'set', mdp_path, 'dt=1',
+                '-o', 'out.mdp']) == 1)
+        finally:
+            with Client(socket) as client:
+                client.request('shutdown')
+            server.join()
+
+        assert (main(['--socket', socket, 'get', mdp_path, 'nsteps']) == 1)
+
+def test_edit(capsys):
+    with tmp.TemporaryDirectory() as tmp_dir:
+        paths = [copy_mdp(tmp_dir, '%d.mdp' % i) for i in range(3)]
+        main(['set', paths[0], 'nstlog=1'])
+        pattern = os.path.join(tmp_dir, '*.mdp')
+
+        assert (main(['edit', pattern, '-s', 'nstlog=2', '-w', 'nstlog=12500',
+            '--dry-run', '-j', '1']) == 0)
+        assert (capsys.readouterr().out == "Matched 3 files: 2 would change, "
+                "0 unchanged, 1 skipped, 0 failed.\n")
+        assert (main(['edit', pattern, '-s', 'nstlog=2', '-w', 'nstlog=12500',
+            '-j', '1']) == 0)
+        assert ([MdpFile(p).get_option('nstlog') for p in paths] == ['1', '2', '2'])
+
+def test_index_find(capsys):
+    with tmp.TemporaryDirectory() as tmp_dir:
+        paths = [copy_mdp(tmp_dir, name) for name in ('a.mdp', 'b.mdp')]
+        assert (main(['set', paths[1], 'coulombtype=PME']) == 0)
+
+        assert (main(['find', tmp_dir, 'dt']) == 1)
+        assert ("no index" in capsys.readouterr().err)
+
+        assert (main(['index', tmp_dir, '-j', '1']) == 0)
+        assert ("Indexed 2 files: 2 added" in capsys.readouterr().out)
+        assert (os.path.isfile(os.path.join(tmp_dir, 'mdp-index.db')))
+
+        assert (main(['find', tmp_dir, 'coulombtype=Reaction-Field']) == 0)
+        assert (capsys.readouterr().out == os.path.abspath(paths[0]) + "\n")
+        assert (main(['find', tmp_dir, 'DT=4e-3', 'tcoupl']) == 0)
+        assert (len(capsys.readouterr().out.split()) == 2)
+        assert (main(['find', tmp_dir, 'coulombtype=cut-off']) == 1)
+
+        assert (main(['index', tmp_dir]) == 0)
+        assert ("0 added, 0 updated, 0 removed, 2 unchanged"
+                in capsys.readouterr().out)
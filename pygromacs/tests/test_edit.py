@@ -0,0 +1,78 @@
+import os
+import tempfile as tmp
+
+from pygromacs.edit import *
+from pygromacs.gmxfiles import *
+
+mdp_path = 'pygromacs/tests/grompp.mdp'
+
+def make_tree(tmp_dir, count=6):
+    paths = []
+    for i in range(count):
+        directory = os.path.join(tmp_dir, 'runs', str(i))
+        os.makedirs(directory)
+        path = os.path.join(directory, 'production.mdp')
+        mdp = MdpFile(mdp_path)
+        mdp.set_option('cutoff-scheme', 'group' if i % 2 else 'Verlet')
+        mdp.save(path, verbose=False)
+        paths.append(path)
+    return paths
+
+def test_bulk_edit():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        paths = make_tree(tmp_dir)
+        pattern = os.path.join(tmp_dir, 'runs', '**', 'production.mdp')
+        before = {path: os.stat(path).st_mtime_ns for path in paths}
+
+        summary = bulk_edit(pattern, {'cutoff_scheme': 'Verlet'},
+                where={'Cutoff-Scheme': 'GROUP'}, dry_run=True, processes=2)
+        assert (summary == {'matched': 6, 'changed': 3, 'unchanged': 0,
+            'skipped': 3, 'errors': {}})
+        assert ([MdpFile(p).get_option('cutoff-scheme') for p in paths]
+                == ['Verlet', 'group']*3)
+
+        summary = bulk_edit([pattern], {'cutoff_scheme': 'Verlet'},
+                where={'cutoff-scheme': 'group'}, processes=2)
+        assert (summary['changed'] == 3)
+        assert ([MdpFile(p).get_option('cutoff-scheme') for p in paths]
+                == ['Verlet']*6)
+        assert ([os.stat(p).st_mtime_ns == before[p] for p in paths]
+                == [True, False]*3)
+
+        # Up to date files are not rewritten, and no backups are taken
+        summary = bulk_edit(pattern, {'cutoff-scheme': 'Verlet'}, processes=1)
+        assert ((summary['changed'], summary['unchanged']) == (0, 6))
+        assert (sorted(os.listdir(os.path.dirname(paths[1])))
+                == ['production.mdp'])
+
+def test_bulk_edit_line_endings():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        contents = [b'nsteps = 5\r\ndt = 0.002\r\n', b'nsteps = 5\ndt = 0.002']
+        paths = []
+        for i, data in enumerate(contents):
+            paths.append(os.path.join(tmp_dir, '%d.mdp' % i))
+            with open(paths[-1], 'wb') as fp:
+                fp.write(data)
+
+        summary = bulk_edit(os.path.join(tmp_dir, '*.mdp'), {'nsteps': 5},
+                processes=1)
+        assert ((summary['changed'], summary['unchanged']) == (0, 2))
+        for path, data in zip(paths, contents):
+            with open(path, 'rb') as fp:
+                assert (fp.read() == data)
+
+def test_bulk_edit_backup():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        paths = make_tree(tmp_dir, count=2)
+        os.chmod(paths[0], 0o640)
+        summary = bulk_edit(os.path.join(tmp_dir, 'runs', '*', '*.mdp'),
+                {'nsteps': 5}, remove=['dt'], backup=True, processes=1)
+        assert (summary['changed'] == 2)
+
+        mdp = MdpFile(paths[0])
+        assert (mdp.get_option('nsteps') == '5')
+        assert ('dt' not in mdp.options)
+        assert (os.stat(paths[0]).st_mode & 0o777 == 0o640)
+
+        backup = os.path.join(os.path.dirname(paths[0]), '#production.mdp.1#')
+        assert (MdpFile(backup).get_option('nsteps') == '10000')
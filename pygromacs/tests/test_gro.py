@@ -0,0 +1,158 @@
+import os
+import tempfile as tmp
+import numpy as np
+
+from pygromacs.gmxfiles import *
+
+path = 'pygromacs/tests/conf.gro'
+
+def test_empty_init():
+    gro = GroFile()
+    assert (gro.path == "")
+    assert (len(gro) == 0)
+
+def test_read():
+    gro = GroFile(path)
+    assert (gro.path == path)
+    assert (gro.title == 'Water and ions t=   0.00000')
+    assert (len(gro) == 8)
+
+    assert (list(gro.residue_numbers) == [1, 1, 1, 2, 2, 2, 3, 4])
+    assert (list(gro.residue_names[[0, 6, 7]]) == ['SOL', 'NA', 'CL'])
+    assert (list(gro.atom_names[:3]) == ['OW', 'HW1', 'HW2'])
+    assert (list(gro.atom_numbers) == list(range(1, 9)))
+    assert (np.allclose(gro.positions[0], [0.126, 1.624, 1.679]))
+    assert (np.allclose(gro.positions[-1], [1.702, 1.409, 0.337]))
+    assert (np.allclose(gro.velocities[1], [1.0491, -0.6082, -0.2018]))
+    assert (np.allclose(gro.box, [1.86206]*3))
+
+    # Try extension completion
+    gro = GroFile(path.rsplit('.gro')[0])
+    assert (gro.path == path)
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        gro = GroFile(os.path.join(tmp_dir, 'test.gro'))
+        assert (gro.path == "")
+
+def test_read_variants():
+    with open(path) as fp:
+        lines = fp.read().splitlines()
+    control = GroFile(path)
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        # Without velocities and with trailing whitespace on some lines
+        test_path = os.path.join(tmp_dir, 'novel.gro')
+        atoms = [line[:44] + ' '*(i % 3) for i, line in enumerate(lines[2:-1])]
+        with open(test_path, 'w') as fp:
+            fp.write('\n'.join(lines[:2] + atoms + lines[-1:]))
+        gro = GroFile(test_path)
+        assert (gro.velocities == None)
+        assert (np.allclose(gro.positions, control.positions))
+        assert (list(gro.atom_names) == list(control.atom_names))
+
+        # Higher precision and a triclinic box
+        test_path = os.path.join(tmp_dir, 'precision.gro')
+        atoms = ["%5d%-5s%5s%5d%10.5f%10.5f%10.5f" % (1, 'SOL', 'OW', i + 1,
+            i + 0.12345, 1.5, -2.25) for i in range(3)]
+        box = "   1.0 2.0 3.0 0.0 0.0 0.5 0.0 0.5 0.5"
+        with open(test_path, 'w') as fp:
+            fp.write('\n'.join(['precise', '3'] + atoms + [box, '']))
+        gro = GroFile(test_path)
+        assert (np.allclose(gro.positions[:, 0], [0.12345, 1.12345, 2.12345]))
+        assert (np.allclose(gro.positions[:, 2], -2.25))
+        assert (len(gro.box) == 9)
+
+        # The precision is kept when saving, unless overridden
+        assert (gro.precision == 5)
+        gro.save(test_path, verbose=False)
+        with open(test_path) as fp:
+            assert (fp.read().splitlines()[2:5] == atoms)
+        gro.save(test_path, verbose=False, precision=3)
+        assert (GroFile(test_path).precision == 3)
+        assert (np.allclose(GroFile(test_path).positions[:, 0], [0.123, 1.123, 2.123]))
+
+def test_save():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        gro = GroFile(path)
+        new_path = os.path.join(tmp_dir, 'new')
+        gro.save(new_path)
+
+        # An unmodified file is written byte for byte
+        with open(path, 'rb') as control, open(new_path + '.gro', 'rb') as test:
+            assert (control.read() == test.read())
+
+        # Backup when saving again
+        gro.save(new_path + '.gro')
+        assert (os.access(os.path.join(tmp_dir, '#new.gro.1#'), os.F_OK) == True)
+
+        # Modified positions, negative values and wrapped numbers
+        gro.positions[0] = [-1.5, -12.3456, 123.4564]
+        gro.atom_numbers[1] = 100003
+        gro.residue_numbers[-1] = 200000
+        gro.save(new_path + '.gro', verbose=False)
+        control = GroFile(new_path + '.gro')
+        assert (np.allclose(control.positions[0], [-1.5, -12.346, 123.456]))
+        assert (control.atom_numbers[1] == 3)
+        assert (control.residue_numbers[-1] == 0)
+        assert (np.allclose(control.velocities, gro.velocities))
+
+def test_save_mask():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        gro = GroFile(path)
+        new_path = os.path.join(tmp_dir, 'water.gro')
+        gro.save(new_path, mask=(gro.residue_names == 'SOL'))
+
+        control = GroFile(new_path)
+        assert (len(control) == 6)
+        assert (list(control.residue_names) == ['SOL']*6)
+        assert (np.allclose(control.positions, gro.positions[:6]))
+        assert (np.allclose(control.box, gro.box))
+
+        # Indices and no velocities, with higher precision
+        gro.velocities = None
+        gro.save(new_path, mask=[6, 7], precision=5)
+        control = GroFile(new_path)
+        assert (list(control.atom_names) == ['NA', 'CL'])
+        assert (control.velocities == None)
+        assert (np.allclose(control.positions, gro.positions[6:]))
+
+def test_frames():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        gro = GroFile(path)
+        traj_path = os.path.join(tmp_dir, 'traj.gro')
+        with open(traj_path, 'wb') as fp:
+            for i in range(5):
+                gro.title = 't= %d' % i
+                gro.positions[0, 0] = i
+                fp.write(gro._format())
+            fp.write(b'\n')
+
+        try:
+            GroFile().frames
+            assert (False)
+        except ValueError:
+            pass
+
+        # Only the first frame is read
+        traj = GroFile(traj_path)
+        assert (traj.title == 't= 0')
+
+        frames = traj.frames
+        assert (len(frames) == 5)
+        assert (frames[3].title == 't= 3')
+        assert (frames[-1].positions[0, 0] == 4)
+        assert (np.allclose(frames[2].velocities, gro.velocities))
+        assert ([frame.title for frame in frames[1::2]] == ['t= 1', 't= 3'])
+        assert (len(frames[10:]) == 0)
+
+        # The index is cached next to the file and reused
+        index_path = os.path.join(tmp_dir, '.traj.gro.frames.npy')
+        assert (os.access(index_path, os.F_OK) == True)
+        mtime = os.stat(index_path).st_mtime_ns
+        assert (list(GroFile.Frames(traj_path).offsets) == list(frames.offsets))
+        assert (os.stat(index_path).st_mtime_ns == mtime)
+
+        # A modified file is indexed again
+        with open(traj_path, 'ab') as fp:
+            fp.write(gro._format())
+        assert (len(GroFile(traj_path).frames) == 6)
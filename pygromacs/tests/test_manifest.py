@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile as tmp
+
+from pygromacs.gmxfiles import *
+from pygromacs.manifest import *
+from pygromacs.runs import generate_runs
+
+mdp_path = 'pygromacs/tests/grompp.mdp'
+top_path = 'pygromacs/tests/topol.top'
+
+def test_normalise_key():
+    assert (normalise_key('Tcoupl') == 'tcoupl')
+    assert (normalise_key(' ref-t ') == 'ref_t')
+
+def test_manifest():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            manifest.add_runs([
+                {'directory': 'a', 'parameters': {'ref-t': '310', 'dt': '0.002'},
+                    'files': [('grompp.mdp', '', 'abc')]},
+                {'directory': 'b', 'parameters': {'ref_t': '300', 'dt': '2e-3',
+                    'Tcoupl': 'v-rescale'}, 'files': []},
+                {'directory': 'c', 'parameters': {'ref_t': '310', 'dt': '0.004'},
+                    'files': []}
+                ])
+            assert (manifest.directories() == ['a', 'b', 'c'])
+            assert (manifest.query(ref_t=310, dt=0.002) == ['a'])
+            assert (manifest.query({'ref-t': '310'}) == ['a', 'c'])
+            assert (manifest.query(dt='0.002') == ['a', 'b'])
+            assert (manifest.query(tcoupl='v-rescale') == ['b'])
+            assert (manifest.query(tcoupl='berendsen') == [])
+            assert (manifest.query() == ['a', 'b', 'c'])
+
+            assert (manifest.get_parameters('a') == {'ref_t': '310', 'dt': '0.002'})
+            assert (manifest.get_files('a') == [('grompp.mdp', '', 'abc')])
+
+            # Records are replaced
+            manifest.add_runs([{'directory': 'a', 'parameters': {'dt': '0.004'},
+                'files': []}])
+            assert (manifest.query(dt=0.004) == ['a', 'c'])
+            assert (manifest.get_files('a') == [])
+
+        # The database persists
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            assert (manifest.directories() == ['a', 'b', 'c'])
+
+def test_rebuild_manifest():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        configurations = {}
+        for ref_t in (300, 310):
+            mdp = MdpFile(mdp_path)
+            mdp.set_option('ref_t', ref_t)
+            configurations['T%d' % ref_t] = mdp
+        generate_runs(tmp_dir, configurations, {'system': [top_path]},
+                verbose=False)
+
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            files = manifest.get_files(os.path.join('system', 'T300'))
+        os.remove(os.path.join(tmp_dir, 'manifest.db'))
+
+        manifest = rebuild_manifest(tmp_dir, processes=2)
+        assert (manifest.directories() == [os.path.join('system', 'T300'),
+            os.path.join('system', 'T310')])
+        assert (manifest.query(ref_t=310) == [os.path.join('system', 'T310')])
+
+        # Hashes match those recorded at generation
+        rebuilt = manifest.get_files(os.path.join('system', 'T300'))
+        assert (sorted(h for _, _, h in rebuilt) == sorted(h for _, _, h in files))
+        assert (hash_file(top_path) in [h for _, _, h in rebuilt])
+        manifest.close()
+
+def test_merge_manifests():
+    from pygromacs.sweep import ParameterSpace
+
+    def dump(path):
+        with Manifest(path) as manifest:
+            return list(manifest.connection.iterdump())
+
+    space = ParameterSpace(MdpFile(mdp_path), [('ref_t', [300, 310, 320]),
+        ('dt', [0.002, 0.004])])
+    inputs = {'system': [top_path]}
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        merged = []
+        for count, method in [(1, 'contiguous'), (2, 'contiguous'), (4, 'hash')]:
+            directory = os.path.join(tmp_dir, '%s%d' % (method, count))
+            sources = []
+            for i in range(count):
+                sources.append('manifest.%d.db' % i)
+                generate_runs(directory, space.shard(i, count, method), inputs,
+                        manifest_name=sources[-1], verbose=False)
+
+            path = os.path.join(directory, 'manifest.db')
+            merge_manifests(path, [os.path.join(directory, source)
+                for source in sources]).close()
+            merged.append(dump(path))
+
+        assert (merged[0] == merged[1] == merged[2])
+        assert (len([line for line in merged[0]
+            if line.startswith('INSERT INTO "runs"')]) == 6)
+
+        # Duplicate runs keep their first record
+        directory = os.path.join(tmp_dir, 'hash4')
+        sources = [os.path.join(directory, 'manifest.db')]*2
+        with merge_manifests(os.path.join(tmp_dir, 'twice.db'), sources) as manifest:
+            run = manifest.directories()[0]
+            assert (len(manifest.get_files(run)) == 2)
+
+def test_update_manifest():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        configurations = {}
+        for ref_t in (300, 310):
+            mdp = MdpFile(mdp_path)
+            mdp.set_option('ref_t', ref_t)
+            configurations['T%d' % ref_t] = mdp
+        generate_runs(tmp_dir, configurations, {'system': [top_path]},
+                verbose=False)
+        runs = [os.path.join('system', name) for name in ('T300', 'T310')]
+
+        path = os.path.join(tmp_dir, runs[0], 'grompp.mdp')
+        mdp = MdpFile(path)
+        mdp.set_option('ref_t', 320)
+        mdp.save(path, verbose=False)
+        shutil.rmtree(os.path.join(tmp_dir, runs[1]))
+
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            configuration = manifest.connection.execute("SELECT configuration "
+                    "FROM runs WHERE directory = ?", (runs[0],)).fetchone()
+            assert (update_manifest(manifest, runs, processes=1)
+                    == ([runs[0]], [runs[1]]))
+            assert (manifest.directories() == [runs[0]])
+            assert (manifest.query(ref_t=320) == [runs[0]])
+            assert (manifest.connection.execute("SELECT configuration FROM runs "
+                "WHERE directory = ?", (runs[0],)).fetchone() == configuration)
@@ -124,6 +124,60 @@ def test_comment():
     mdp.set_comment('not-a-parameter', 'really important parameter')
     assert ('not-a-parameter' not in mdp.options.keys())
 
+def test_undo_redo():
+    from pygromacs.runs import render_mdp
+
+    mdp = MdpFile(path)
+    original = render_mdp(mdp)
+    assert (mdp.undo() == False)
+
+    mdp.set_option('nsteps', 100, 'short')
+    mdp.set_option('new-parameter', 'yes')
+    mdp.remove_option('dt')
+    edited = render_mdp(mdp)
+
+    assert (mdp.undo() == True)
+    assert (mdp.get_option('dt') == '0.004')
+    assert (mdp.lines[mdp.options['dt'].index] is mdp.options['dt'])
+    mdp.undo()
+    assert ('new-parameter' not in mdp.options)
+    mdp.undo()
+    assert (render_mdp(mdp) == original)
+    assert (mdp.options['nsteps'].comment == '4 ns')
+
+    while mdp.redo():
+        pass
+    assert (render_mdp(mdp) == edited)
+    assert ([option.index for option in mdp.lines] == list(range(len(mdp.lines))))
+
+def test_snapshot():
+    from pygromacs.runs import render_mdp
+
+    mdp = MdpFile(path)
+    start = mdp.snapshot()
+    mdp.set_option('nsteps', 100)
+    middle, data = mdp.snapshot(), render_mdp(mdp)
+    mdp.remove_option('nstlog')
+    mdp.set_comment('dt', 'ps')
+
+    mdp.restore(middle)
+    assert (render_mdp(mdp) == data)
+    mdp.restore(start)
+    assert (render_mdp(mdp) == render_mdp(MdpFile(path)))
+
+    # Redone by restoring a later snapshot, lost after a new edit
+    mdp.restore(middle)
+    assert (mdp.get_option('nsteps') == '100')
+    mdp.set_option('dt', 0.001)
+    mdp.restore(start)
+    mdp.set_option('nsteps', 200)
+    try:
+        mdp.restore(middle)
+    except ValueError:
+        pass
+    else:
+        assert False
+
 def test_search():
     mdp = MdpFile(path)
     assert (mdp.search('step') == 4)
@@ -136,6 +190,85 @@ def test_print():
     mdp.print(True)
     mdp.print(False)
 
+def test_round_trip():
+    with open(path, 'rb') as fp:
+        original = fp.read()
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        mdp = MdpFile(path)
+        tmp_path = os.path.join(tmp_dir, 'grompp.mdp')
+        mdp.save(tmp_path, verbose=False)
+        with open(tmp_path, 'rb') as fp:
+            assert (fp.read() == original)
+
+        # Only modified lines are formatted
+        mdp.set_option('nstcalcenergy', 100)
+        mdp.set_comment('tau_t', 'ps')
+        mdp.save(tmp_path, verbose=False)
+        with open(tmp_path, 'rb') as fp:
+            lines = fp.read().splitlines()
+        changed = [line for line, control in zip(lines, original.splitlines())
+                if line != control]
+        assert (changed == [b'nstcalcenergy            = 100',
+            b'tau_t                    = 1  10; ps'])
+
+def test_round_trip_line_breaks():
+    from pygromacs.runs import render_mdp
+
+    with open(path, 'rb') as fp:
+        original = fp.read()
+    variants = [original.replace(b'\n', b'\r\n'), original[:-1],
+            original.replace(b'\n', b'\r\n')[:-2]]
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, 'grompp.mdp')
+        for data in variants:
+            with open(tmp_path, 'wb') as fp:
+                fp.write(data)
+            mdp = MdpFile(tmp_path)
+            assert (mdp.get_option('nsteps') == '10000')
+            assert (render_mdp(mdp) == data)
+            mdp.save(tmp_path, verbose=False)
+            with open(tmp_path, 'rb') as fp:
+                assert (fp.read() == data)
+
+            # Set and new lines take the line break of the file
+            template = mdp.compile(['dt', 'new-parameter'])
+            mdp.set_option('dt', 0.001)
+            mdp.set_option('new-parameter', 'yes')
+            assert (template.render({'dt': 0.001, 'new-parameter': 'yes'})
+                    == render_mdp(mdp))
+            newline = mdp.newline.encode()
+            rendered = render_mdp(mdp)
+            assert (rendered.count(b'\n') == rendered.count(newline))
+            assert (rendered.endswith(b'new-parameter            = yes'
+                + (newline if data.endswith(b'\n') else b'')))
+
+def test_compile():
+    from pygromacs.runs import render_mdp
+
+    mdp = MdpFile(path)
+    template = mdp.compile(['dt', 'nsteps', 'new-parameter'])
+    assert (template.parameters == ['dt', 'nsteps', 'new-parameter'])
+    assert (len(template.chunks) == 4)
+
+    variant = MdpFile(path)
+    variant.set_option('dt', 0.001)
+    variant.set_option('new-parameter', 'yes')
+    rendered = template.render({'dt': 0.001, 'new-parameter': 'yes'})
+    assert (rendered == render_mdp(variant))
+
+    variant.set_comment('nsteps', '1 ns')
+    rendered = template.render({'dt': 0.001, 'new-parameter': 'yes'},
+            {'nsteps': '1 ns'})
+    assert (rendered == render_mdp(variant))
+
+    variant = MdpFile(path)
+    variant.set_option('dt', 0.001)
+    template = mdp.compile(['dt'], comment=False)
+    assert (template.render({'dt': 0.001}, {'dt': 'ignored'})
+            == render_mdp(variant, comment=False))
+
 def test_save():
     # Find a default backup path
     def backup_path(path, i=1):
@@ -189,3 +322,51 @@ def test_save():
         ext_path = '.'.join([new_path, ext])
         mdp.save(ext_path, ext=ext)
         assert (os.access(ext_path, os.F_OK) == True)
+
+def test_async():
+    import asyncio
+
+    async def main(tmp_dir):
+        mdp = await MdpFile.aread(path)
+        assert (mdp.get_option('nsteps') == '10000')
+
+        new_path = os.path.join(tmp_dir, 'async.mdp')
+        mdp.set_option('nsteps', 5)
+        await mdp.asave(new_path, verbose=False)
+        assert (MdpFile(new_path).get_option('nsteps') == '5')
+
+        paths = [os.path.join(tmp_dir, 'file%d.mdp' % i) for i in range(20)]
+        files = [MdpFile(path) for _ in paths]
+        for i, mdp in enumerate(files):
+            mdp.set_option('nsteps', i)
+        await MdpFile.asave_many(files, paths, limit=4, verbose=False)
+
+        files = await MdpFile.aread_many(paths, limit=4)
+        assert ([mdp.get_option('nsteps') for mdp in files]
+                == [str(i) for i in range(20)])
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        asyncio.run(main(tmp_dir))
+
+def test_async_save_concurrent():
+    import asyncio
+    import sys
+
+    async def main(tmp_dir):
+        paths = [os.path.join(tmp_dir, 'file%d.mdp' % i) for i in range(200)]
+        files = [MdpFile(path) for _ in paths]
+        for i, mdp in enumerate(files):
+            mdp.set_option('nsteps', i)
+        await MdpFile.asave_many(files, paths, limit=32, verbose=False)
+
+        for mdp, new_path in zip(files, paths):
+            with open(new_path) as fp:
+                assert (fp.read() == mdp.format())
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with tmp.TemporaryDirectory() as tmp_dir:
+            asyncio.run(main(tmp_dir))
+    finally:
+        sys.setswitchinterval(interval)
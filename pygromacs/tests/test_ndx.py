@@ -0,0 +1,85 @@
+import os
+import tempfile as tmp
+import numpy as np
+
+from pygromacs.gmxfiles import *
+
+path = 'pygromacs/tests/index.ndx'
+
+def test_empty_init():
+    ndx = NdxFile()
+    assert (ndx.path == "")
+    assert (ndx.groups == {})
+
+def test_read():
+    ndx = NdxFile(path)
+    assert (ndx.path == path)
+    assert (list(ndx.groups.keys())
+            == ['System', 'Protein', 'SOL', 'Water_and_ions'])
+    assert (list(ndx.get_group('System')) == list(range(1, 21)))
+    assert (list(ndx.get_group('SOL')) == list(range(9, 21)))
+    assert (ndx.get_group('not-a-group').size == 0)
+
+    # Try extension completion
+    ndx = NdxFile(path.rsplit('.ndx')[0])
+    assert (ndx.path == path)
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        ndx = NdxFile(os.path.join(tmp_dir, 'test.ndx'))
+        assert (ndx.path == "")
+
+        # Free formatting and empty groups
+        test_path = os.path.join(tmp_dir, 'free.ndx')
+        with open(test_path, 'w') as fp:
+            fp.write("[ empty ]\n[ a ]\n1 2\n3\n\n[b]\n 4")
+        ndx = NdxFile(test_path)
+        assert (ndx.get_group('empty').size == 0)
+        assert (list(ndx.get_group('a')) == [1, 2, 3])
+        assert (list(ndx.get_group('b')) == [4])
+
+        # Bad atom numbers are not dropped
+        with open(test_path, 'w') as fp:
+            fp.write("[ a ]\n1 2\n3 x 4\n")
+        try:
+            NdxFile(test_path)
+            assert (False)
+        except ValueError as error:
+            assert ("'a'" in str(error))
+
+def test_set_group():
+    ndx = NdxFile(path)
+    ndx.set_group('Ions', [19, 20])
+    assert (list(ndx.groups.keys())[-1] == 'Ions')
+    assert (ndx.get_group('Ions').dtype == np.int64)
+
+    ndx.remove_group('Ions')
+    assert ('Ions' not in ndx.groups)
+    ndx.remove_group('Ions')
+
+def test_algebra():
+    ndx = NdxFile(path)
+    assert (list(ndx.union('Protein', [3, 30, 21])) == list(range(1, 9)) + [21, 30])
+    assert (list(ndx.intersection('System', np.array([25, 5, 1, 5])))
+            == [1, 5])
+    assert (list(ndx.difference('System', 'SOL', 'Non-water'))
+            == list(range(1, 9)))
+    assert (list(ndx.groups.keys())[-1] == 'Non-water')
+    assert (ndx.difference('SOL', 'Water_and_ions').size == 0)
+
+def test_save():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        ndx = NdxFile(path)
+        new_path = os.path.join(tmp_dir, 'new')
+        ndx.save(new_path)
+
+        # The Gromacs format is kept byte for byte
+        with open(path, 'rb') as control, open(new_path + '.ndx', 'rb') as test:
+            assert (control.read() == test.read())
+
+        ndx.set_group('Large', np.arange(99990, 100010))
+        ndx.save(new_path)
+        assert (os.access(os.path.join(tmp_dir, '#new.ndx.1#'), os.F_OK) == True)
+
+        control = NdxFile(new_path + '.ndx')
+        for name, atoms in ndx.groups.items():
+            assert (list(control.get_group(name)) == list(atoms))
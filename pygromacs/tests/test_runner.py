@@ -0,0 +1,99 @@
+import os
+import sys
+import tempfile as tmp
+
+from pygromacs.gmxfiles import *
+from pygromacs.manifest import Manifest
+from pygromacs.runner import *
+from pygromacs.runs import generate_runs
+
+mdp_path = 'pygromacs/tests/grompp.mdp'
+top_path = 'pygromacs/tests/topol.top'
+
+# Stand-in for grompp: fails on its first call in a directory if asked to,
+# otherwise writes an output file
+grompp = """
+import os, sys
+if os.path.exists('fail') and not os.path.exists('failed'):
+    open('failed', 'w').close()
+    sys.exit('Fatal error: first try')
+if os.path.exists('broken'):
+    sys.exit('Fatal error: broken')
+open(sys.argv[2], 'w').write(os.getcwd())
+print('wrote', sys.argv[2])
+"""
+
+def setup_tree(tmp_dir):
+    configurations = {}
+    for name in ('a', 'b', 'c'):
+        configurations[name] = MdpFile(mdp_path)
+    generate_runs(tmp_dir, configurations, {'system': [top_path]}, verbose=False)
+
+    script = os.path.join(tmp_dir, 'grompp.py')
+    with open(script, 'w') as fp:
+        fp.write(grompp)
+
+    return '"%s" "%s" -o topol.tpr {run}' % (sys.executable, script)
+
+def test_run_commands():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        command = setup_tree(tmp_dir)
+        run_a, run_b, run_c = [os.path.join('system', name) for name in 'abc']
+        open(os.path.join(tmp_dir, run_b, 'fail'), 'w').close()
+        open(os.path.join(tmp_dir, run_c, 'broken'), 'w').close()
+
+        results = run_commands(tmp_dir, command, processes=2, retries=1)
+        assert (results == {run_a: 0, run_b: 0, run_c: 1})
+        with open(os.path.join(tmp_dir, run_a, 'topol.tpr')) as fp:
+            assert (fp.read() == os.path.realpath(os.path.join(tmp_dir, run_a)))
+
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            returncode, stdout, stderr, attempts = manifest.get_command(run_a, command)
+            assert ((returncode, stdout, attempts) == (0, 'wrote topol.tpr\n', 1))
+            assert (manifest.get_command(run_b, command)[3] == 2)
+            returncode, _, stderr, attempts = manifest.get_command(run_c, command)
+            assert ((returncode, attempts) == (1, 2))
+            assert ('broken' in stderr)
+
+        # Resuming only reruns the failed command
+        os.remove(os.path.join(tmp_dir, run_c, 'broken'))
+        os.remove(os.path.join(tmp_dir, run_a, 'topol.tpr'))
+        results = run_commands(tmp_dir, command, processes=1)
+        assert (results == {run_a: 0, run_b: 0, run_c: 0})
+        assert (not os.path.exists(os.path.join(tmp_dir, run_a, 'topol.tpr')))
+        assert (os.path.exists(os.path.join(tmp_dir, run_c, 'topol.tpr')))
+
+        run_commands(tmp_dir, command, resume=False, verbose=False)
+        assert (os.path.exists(os.path.join(tmp_dir, run_a, 'topol.tpr')))
+
+        # A manifest of another name is rebuilt once, and then resumed
+        os.remove(os.path.join(tmp_dir, 'manifest.db'))
+        results = run_commands(tmp_dir, command, manifest_name='runs.db',
+                verbose=False)
+        assert (results == {run_a: 0, run_b: 0, run_c: 0})
+        assert (not os.path.exists(os.path.join(tmp_dir, 'manifest.db')))
+        os.remove(os.path.join(tmp_dir, run_a, 'topol.tpr'))
+        run_commands(tmp_dir, command, manifest_name='runs.db', verbose=False)
+        assert (not os.path.exists(os.path.join(tmp_dir, run_a, 'topol.tpr')))
+
+def test_run_commands_without_manifest():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        command = setup_tree(tmp_dir)
+        os.remove(os.path.join(tmp_dir, 'manifest.db'))
+
+        results = run_commands(tmp_dir, command + ' --missing-file', verbose=False)
+        assert (sorted(results.values()) == [0, 0, 0])
+
+        # Only the placeholders are substituted
+        command = '"%s" -c "import sys; open(sys.argv[1], \'w\').write(sys.argv[2])" ' \
+                'out {{}}{run}{0}{path}' % sys.executable
+        results = run_commands(tmp_dir, command, verbose=False)
+        assert (sorted(results.values()) == [0, 0, 0])
+        run_a = os.path.join('system', 'a')
+        with open(os.path.join(tmp_dir, run_a, 'out')) as fp:
+            assert (fp.read() == '{{}}%s{0}%s' % (run_a,
+                os.path.join(os.path.abspath(tmp_dir), run_a)))
+
+        # Commands which cannot be run fail
+        results = run_commands(tmp_dir, 'not-an-executable', verbose=False)
+        assert (set(results.values()) == {-1})
@@ -0,0 +1,139 @@
+import os
+import tempfile as tmp
+
+from pygromacs.gmxfiles import *
+from pygromacs.manifest import *
+from pygromacs.runs import *
+
+mdp_path = 'pygromacs/tests/grompp.mdp'
+inputs = {
+        'water': ['pygromacs/tests/topol.top', 'pygromacs/tests/conf.gro'],
+        'ions': ['pygromacs/tests/topol.top']
+        }
+
+def configurations():
+    short, long = MdpFile(mdp_path), MdpFile(mdp_path)
+    short.set_option('nsteps', 100)
+    long.set_option('nsteps', 100000)
+    return {'short': short, 'long': long}
+
+def test_render_mdp():
+    mdp = MdpFile(mdp_path)
+    data = render_mdp(mdp)
+    assert (data.startswith(b";\n;\tFile 'mdout.mdp' was generated\n"))
+    assert (b'nsteps                   = 10000 ; 4 ns\n' in data)
+    assert (b'4 ns' not in render_mdp(mdp, comment=False))
+
+    mdp.set_option('nsteps', 20000)
+    assert (b'nsteps                   = 20000; 4 ns\n' in render_mdp(mdp))
+
+def test_generate_runs():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        runs = generate_runs(tmp_dir, configurations(), inputs, processes=1)
+        assert ([run['directory'] for run in runs] == [
+            os.path.join('ions', 'long'), os.path.join('ions', 'short'),
+            os.path.join('water', 'long'), os.path.join('water', 'short')])
+
+        for run in runs:
+            path = os.path.join(tmp_dir, run['directory'])
+            assert (sorted(os.listdir(path)) == sorted(run['files']))
+
+        mdp = MdpFile(os.path.join(tmp_dir, 'water', 'short', 'grompp.mdp'))
+        assert (mdp.get_option('nsteps') == '100')
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            assert (manifest.directories()
+                    == [run['directory'] for run in runs])
+            assert (manifest.query(nsteps=100) == [os.path.join('ions', 'short'),
+                os.path.join('water', 'short')])
+
+        # Regenerating only writes changed files
+        mtime = os.stat(os.path.join(tmp_dir, 'ions', 'long', 'topol.top')).st_mtime_ns
+        changed = configurations()
+        changed['short'].set_option('nsteps', 200)
+        assert (generate_runs(tmp_dir, changed, inputs, processes=2) == runs)
+        assert (os.stat(os.path.join(tmp_dir, 'ions', 'long', 'topol.top'))
+                .st_mtime_ns == mtime)
+        mdp = MdpFile(os.path.join(tmp_dir, 'ions', 'short', 'grompp.mdp'))
+        assert (mdp.get_option('nsteps') == '200')
+
+def test_generate_runs_names():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        runs = generate_runs(tmp_dir, [MdpFile(mdp_path)],
+                [inputs['water']], verbose=False)
+        assert (runs[0]['directory'] == os.path.join('topol', 'grompp'))
+
+        try:
+            generate_runs(tmp_dir, [MdpFile(mdp_path)]*2, inputs)
+            assert (False)
+        except ValueError:
+            pass
+
+def test_generate_runs_inputs():
+    import pygromacs.runs
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        # Inputs with the same file name are told apart
+        source = os.path.join(tmp_dir, 'input')
+        for name in ('a', 'b'):
+            os.makedirs(os.path.join(source, name))
+            with open(os.path.join(source, name, 'topol.top'), 'w') as fp:
+                fp.write(name)
+        files = {name: [os.path.join(source, name, 'topol.top')]
+                for name in ('a', 'b')}
+        generate_runs(tmp_dir, configurations(), files, processes=1,
+                verbose=False)
+        assert (not pygromacs.runs._sources)
+        for name in ('a', 'b'):
+            with open(os.path.join(tmp_dir, name, 'long', 'topol.top')) as fp:
+                assert (fp.read() == name)
+
+        try:
+            generate_runs(tmp_dir, configurations(),
+                    {'ab': files['a'] + files['b']}, verbose=False)
+            assert (False)
+        except ValueError:
+            pass
+
+def test_generate_runs_space():
+    from pygromacs.sweep import ParameterSpace
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        space = ParameterSpace(MdpFile(mdp_path), [('ref_t', range(10)),
+            ('dt', [0.001, 0.002])])
+        runs = generate_runs(tmp_dir, space[4:7], {'ions': inputs['ions']},
+                verbose=False)
+        assert ([run['configuration'] for run in runs] == ['04', '05', '06'])
+
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            assert (manifest.query(ref_t=2, dt=0.002)
+                    == [os.path.join('ions', '05')])
+
+def test_generate_runs_space_streamed():
+    from pygromacs.sweep import ParameterSpace
+
+    class CheckedSpace(ParameterSpace):
+        # Every variant is written before the next one is rendered,
+        # and the values of all variants are never computed at once
+        def rendered(self, comment=True, values=False):
+            previous = None
+            for variant in ParameterSpace.rendered(self, comment, values):
+                if previous is not None:
+                    assert (os.path.isfile(os.path.join(self.directory,
+                        'ions', previous, 'grompp.mdp')))
+                previous = variant[0]
+                yield variant
+
+        def table(self, indices=None):
+            assert (False)
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        space = CheckedSpace(MdpFile(mdp_path), [('ref_t', range(5))])
+        space.directory = tmp_dir
+        runs = generate_runs(tmp_dir, space, {'ions': inputs['ions']},
+                processes=1, verbose=False)
+        assert (len(runs) == 5)
+
+        # The manifest has the parameters of the base file and the variant
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            assert (manifest.query(ref_t=3, nsteps=10000)
+                    == [os.path.join('ions', '3')])
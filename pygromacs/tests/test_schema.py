@@ -0,0 +1,58 @@
+from pygromacs.gmxfiles import *
+from pygromacs.schema import *
+from pygromacs.sweep import ParameterSpace
+
+mdp_path = 'pygromacs/tests/grompp.mdp'
+
+def test_normalise_value():
+    assert (normalise_value(' V-Rescale ') == 'vrescale')
+    assert (normalise_value('Nose_Hoover') == 'nosehoover')
+
+def test_validate():
+    mdp = MdpFile(mdp_path)
+    assert (validate(mdp) == [])
+    assert (validate(mdp, strict=True) == [])
+
+def test_validate_errors():
+    mdp = MdpFile(mdp_path)
+    mdp.set_option('Tcoupl', 'v-rescal')
+    mdp.set_option('nstxtcout', -5)
+    mdp.set_option('dt', 'abc')
+    mdp.set_option('nsteps', '1 2')
+    errors = {error.parameter: error.message for error in validate(mdp)}
+    assert (set(errors) == {'Tcoupl', 'nstxtcout', 'dt', 'nsteps'})
+    assert errors['Tcoupl'].startswith('not one of')
+    assert (errors['nstxtcout'] == 'must be at least 0')
+    assert (errors['dt'] == 'not a number')
+    assert (errors['nsteps'] == 'expected a single value')
+
+def test_validate_dependencies():
+    mdp = MdpFile(mdp_path)
+    mdp.set_option('ref_t', '300')
+    errors = validate(mdp)
+    assert (len(errors) == 1)
+    assert (errors[0].parameter == 'ref_t')
+
+    mdp.set_option('ref_t', '300 300')
+    mdp.set_option('pcoupl', 'berendsen')
+    mdp.set_option('pcoupltype', 'semiisotropic')
+    mdp.set_option('tau_p', 1.0)
+    mdp.set_option('ref_p', '1.0')
+    mdp.set_option('compressibility', '4.5e-5 4.5e-5')
+    errors = validate(mdp)
+    assert ([error.parameter for error in errors] == ['ref_p'])
+
+def test_validate_strict():
+    mdp = MdpFile(mdp_path)
+    mdp.set_option('made-up', 1)
+    assert (validate(mdp) == [])
+    errors = validate(mdp, strict=True)
+    assert ([(e.parameter, e.message) for e in errors]
+            == [('made-up', 'unknown parameter')])
+
+def test_validate_many():
+    space = ParameterSpace(MdpFile(mdp_path),
+            {'dt': [0.001, -0.002, 0.004], 'nsteps': [10, 'x']})
+    errors = validate_many(list(space))
+    assert (sorted((e.index, e.parameter) for e in errors)
+            == [(1, 'nsteps'), (2, 'dt'), (3, 'dt'), (3, 'nsteps'), (5, 'nsteps')])
@@ -0,0 +1,88 @@
+import os
+import tempfile as tmp
+
+from pygromacs.gmxfiles import *
+from pygromacs.search import *
+
+mdp_path = 'pygromacs/tests/grompp.mdp'
+
+def make_tree(tmp_dir):
+    paths = []
+    for i, (coulombtype, dt) in enumerate([('reaction-field', '0.002'),
+            ('PME', '2e-3'), ('Reaction_Field', '0.004')]):
+        path = os.path.join(tmp_dir, 'runs', str(i), 'grompp.mdp')
+        os.makedirs(os.path.dirname(path))
+        mdp = MdpFile(mdp_path)
+        mdp.set_option('coulombtype', coulombtype)
+        mdp.set_option('dt', dt)
+        mdp.save(path, verbose=False)
+        paths.append(path)
+    return paths
+
+def test_search_index():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        paths = make_tree(tmp_dir)
+        db_path = os.path.join(tmp_dir, 'mdp-index.db')
+
+        with SearchIndex(db_path) as index:
+            summary = index.update(tmp_dir, processes=2)
+            assert (summary == {'added': 3, 'updated': 0, 'removed': 0,
+                'unchanged': 0, 'errors': {}})
+            assert (index.paths() == paths)
+            assert (index.query(coulombtype='reaction-field') == [paths[0], paths[2]])
+            assert (index.query({'CoulombType': 'pme'}) == [paths[1]])
+            assert (index.query(dt=0.002) == paths[:2])
+            assert (index.query(coulombtype='reaction-field', dt='0.004') == [paths[2]])
+            assert (index.query(tcoupl=None) == paths)
+            assert (index.query(made_up=None) == [])
+            assert (index.query() == paths)
+            assert (index.values('Coulombtype') == {'pme': 1, 'reactionfield': 2})
+
+        # Only changed files are read again
+        mdp = MdpFile(paths[1])
+        mdp.set_option('coulombtype', 'Reaction-Field')
+        mdp.save(paths[1], verbose=False)
+        os.remove(paths[2])
+        with SearchIndex(db_path) as index:
+            summary = index.update(tmp_dir)
+            assert (summary == {'added': 0, 'updated': 1, 'removed': 1,
+                'unchanged': 1, 'errors': {}})
+            assert (index.query(coulombtype='reaction-field') == paths[:2])
+            assert (len(index) == 2)
+
+def test_update_files():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        paths = make_tree(tmp_dir)
+
+        with SearchIndex(os.path.join(tmp_dir, 'mdp-index.db')) as index:
+            summary = index.update_files(paths[:2])
+            assert (summary['added'] == 2)
+            assert (index.paths() == paths[:2])
+
+            os.remove(paths[0])
+            summary = index.update_files([paths[0], paths[1], paths[2],
+                os.path.join(tmp_dir, 'missing.mdp')])
+            assert (summary == {'added': 1, 'updated': 0, 'removed': 1,
+                'unchanged': 1, 'errors': {}})
+            assert (index.paths() == paths[1:])
+
+            # Files outside an updated directory are kept
+            index.update(os.path.join(tmp_dir, 'runs', '1'))
+            assert (index.paths() == paths[1:])
+
+def test_update_errors():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'bad.mdp')
+        with open(path, 'wb') as fp:
+            fp.write(b'dt = \xff\n')
+
+        with SearchIndex(os.path.join(tmp_dir, 'mdp-index.db')) as index:
+            summary = index.update(tmp_dir)
+            assert (list(summary['errors']) == [path])
+            assert (len(index) == 0)
+
+def test_read_options():
+    from pygromacs.search import _read_options
+
+    assert (_read_options(mdp_path) == {key: option.value
+        for key, option in MdpFile(mdp_path).options.items()})
@@ -0,0 +1,64 @@
+import io
+import json
+import os
+import tempfile as tmp
+
+from pygromacs.gmxfiles import *
+from pygromacs.runs import render_mdp
+from pygromacs.serialise import *
+
+path = 'pygromacs/tests/grompp.mdp'
+
+def test_dict():
+    mdp = MdpFile(path)
+    data = mdp.to_dict()
+    assert (data['path'] == path)
+    assert ({'parameter': 'nsteps', 'value': '10000', 'comment': '4 ns'}
+            in data['lines'])
+    assert (json.loads(json.dumps(data)) == data)
+
+    copy = MdpFile.from_dict(data)
+    assert (copy.to_dict() == data)
+    assert (render_mdp(MdpFile.from_dict(mdp.to_dict(raw=True)))
+            == render_mdp(mdp))
+
+    # Stale raw lines are dropped, options are set after lines
+    data = mdp.to_dict(raw=True)
+    line = [l for l in data['lines'] if l.get('parameter') == 'nsteps'][0]
+    line['value'] = '20000'
+    data['options'] = {'dt': 0.002, 'new-parameter': 'yes'}
+    copy = MdpFile.from_dict(data)
+    assert (b'nsteps                   = 20000; 4 ns\n' in render_mdp(copy))
+    assert (copy.get_option('dt') == '0.002')
+    assert (copy.get_option('new-parameter') == 'yes')
+    assert (copy.undo() == False)
+
+def test_jsonl():
+    def files():
+        for nsteps in range(5):
+            mdp = MdpFile(path)
+            mdp.set_option('nsteps', nsteps)
+            yield mdp
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        jsonl = os.path.join(tmp_dir, 'files.jsonl')
+        assert (dump_jsonl(files(), jsonl) == 5)
+        loaded = list(load_jsonl(jsonl))
+        assert ([name for name, _ in loaded] == ['grompp']*5)
+        assert ([mdp.get_option('nsteps') for _, mdp in loaded]
+                == [str(n) for n in range(5)])
+
+    buf = io.StringIO()
+    dump_jsonl({'a': MdpFile(path), 'b': MdpFile(path)}, buf, raw=True)
+    buf.seek(0)
+    loaded = dict(load_jsonl(buf))
+    assert (sorted(loaded) == ['a', 'b'])
+    assert (render_mdp(loaded['b']) == render_mdp(MdpFile(path)))
+
+def test_toml():
+    mdp = MdpFile(path)
+    mdp.set_comment('dt', 'a "quoted" comment')
+    text = dump_toml(mdp)
+    assert ('[[lines]]\nparameter = "dt"\n' in text)
+    assert (load_toml(text).to_dict() == mdp.to_dict())
+    assert (render_mdp(load_toml(dump_toml(mdp, raw=True))) == render_mdp(mdp))
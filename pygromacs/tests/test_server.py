@@ -0,0 +1,132 @@
+import os
+import shutil
+import tempfile as tmp
+import threading
+import time
+
+from pygromacs.gmxfiles import *
+from pygromacs.server import *
+
+mdp_path = 'pygromacs/tests/grompp.mdp'
+top_path = 'pygromacs/tests/topol.top'
+
+def test_file_cache():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        paths = [os.path.join(tmp_dir, '%d.mdp' % i) for i in range(3)]
+        for path in paths:
+            shutil.copyfile(mdp_path, path)
+
+        cache = FileCache(size=2)
+        first = cache.get(paths[0])
+        assert (cache.get(paths[0]) is first)
+        assert ((cache.hits, cache.misses) == (1, 1))
+
+        # Least recently used files are dropped
+        cache.get(paths[1])
+        cache.get(paths[0])
+        cache.get(paths[2])
+        assert (len(cache) == 2)
+        assert (cache.get(paths[0]) is first)
+        cache.get(paths[1])
+        assert (cache.misses == 4)
+
+        # Modified files are read again
+        mdp = MdpFile(paths[0])
+        mdp.set_option('nsteps', 1)
+        mdp.save(paths[0], verbose=False)
+        os.utime(paths[0], ns=(0, 0))
+        assert (cache.get(paths[0]).get_option('nsteps') == '1')
+
+        shutil.copyfile(top_path, os.path.join(tmp_dir, 'topol.top'))
+        assert (isinstance(cache.get(os.path.join(tmp_dir, 'topol.top')), Topol))
+
+def test_server():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'grompp.mdp')
+        top = os.path.join(tmp_dir, 'topol.top')
+        shutil.copyfile(mdp_path, path)
+        shutil.copyfile(top_path, top)
+
+        socket = os.path.join(tmp_dir, 'server.sock')
+        server = threading.Thread(target=serve, args=(socket,))
+        server.start()
+        while not os.path.exists(socket):
+            time.sleep(0.01)
+
+        try:
+            with Client(socket) as client:
+                assert (client.get(path, 'nsteps', 'DT', 'made-up')
+                        == {'nsteps': '10000', 'DT': '0.004', 'made-up': None})
+
+                client.set(path, {'nsteps': 5}, {'nsteps': 'short'}, remove=['dt'])
+                mdp = MdpFile(path)
+                assert (mdp.get_option('nsteps') == '5')
+                assert (mdp.options['nsteps'].comment == 'short')
+                assert ('dt' not in mdp.options)
+
+                client.set(path, {'nsteps': 6}, save=False)
+                assert (MdpFile(path).get_option('nsteps') == '5')
+                output = os.path.join(tmp_dir, 'out.mdp')
+                client.save(path, output)
+                assert (MdpFile(output).get_option('nsteps') == '6')
+
+                count = client.get(top, 'SOL')['SOL']
+                client.set(top, {'SOL': count + 1})
+                assert (Topol(top).get_molecule('SOL') == count + 1)
+
+                assert (client.request('stats')['files'] == 2)
+                try:
+                    client.get(os.path.join(tmp_dir, 'missing.mdp'), 'dt')
+                except RuntimeError:
+                    pass
+                else:
+                    assert False
+
+                # Another server can not use the socket
+                try:
+                    serve(socket)
+                except OSError:
+                    pass
+                else:
+                    assert False
+        finally:
+            with Client(socket) as client:
+                client.request('shutdown')
+            server.join()
+
+        assert (not os.path.exists(socket))
+
+        # Other files are not taken for a stale socket
+        try:
+            serve(path)
+        except OSError:
+            pass
+        else:
+            assert False
+        assert (MdpFile(path).get_option('nsteps') == '5')
+
+def test_handle_request_line():
+    import json
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'grompp.mdp')
+        shutil.copyfile(mdp_path, path)
+        mode = os.stat(path).st_mode
+
+        server = Server(os.path.join(tmp_dir, 'server.sock'))
+        try:
+            for line in (b'[]', b'1', b'"x"', b'{', b'{"command": "made-up"}'):
+                response = json.loads(server.handle_request_line(line))
+                assert (response['ok'] == False and response['error'])
+
+            request = {'command': 'set', 'file': path, 'options': {'nsteps': 5}}
+            response = server.handle_request_line(json.dumps(request).encode())
+            assert (json.loads(response) == {'ok': True})
+            assert (MdpFile(path).get_option('nsteps') == '5')
+            assert (os.stat(path).st_mode == mode)
+            assert (sorted(os.listdir(tmp_dir)) == ['grompp.mdp', 'server.sock'])
+
+            # Cached files do not keep a history of edits
+            assert (server.cache.get(path).undo() == False)
+        finally:
+            server.server_close()
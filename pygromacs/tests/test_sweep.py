@@ -0,0 +1,199 @@
+import itertools
+import numpy as np
+
+from pygromacs.gmxfiles import *
+from pygromacs.sweep import *
+
+path = 'pygromacs/tests/grompp.mdp'
+parameters = [('ref_t', [300, 310, 320]), ('dt', [0.002, 0.004]),
+        ('nsteps', [1000, 2000, 3000, 4000])]
+
+def test_overlay():
+    base = MdpFile(path)
+    mdp = overlay(base, {'nsteps': 5, 'new-parameter': 'yes'})
+    assert (mdp.get_option('nsteps') == '5')
+    assert (mdp.get_option('new-parameter') == 'yes')
+    assert (mdp.options['nsteps'].comment == '4 ns')
+    assert (base.get_option('nsteps') == '10000')
+    assert ('new-parameter' not in base.options)
+
+    # Modifying the variant leaves the base untouched
+    mdp.set_option('dt', 0.1)
+    mdp.remove_option('tinit')
+    assert (base.get_option('dt') == '0.004')
+    assert (base.get_option('tinit') == '0')
+    assert (len(mdp.lines) == len(base.lines))
+
+def test_parameter_space():
+    space = ParameterSpace(MdpFile(path), parameters)
+    assert (len(space) == 24)
+
+    product = list(itertools.product(*[values for _, values in parameters]))
+    for index, values in enumerate(product):
+        assert (list(space.values(index).values()) == [str(v) for v in values])
+
+    mdp = space[11]
+    assert (mdp.get_option('ref_t') == '310')
+    assert (mdp.get_option('dt') == '0.002')
+    assert (mdp.get_option('nsteps') == '4000')
+    assert (space[-1].get_option('ref_t') == '320')
+
+    try:
+        space.values(24)
+        assert (False)
+    except IndexError:
+        pass
+
+def test_slicing():
+    space = ParameterSpace(MdpFile(path), dict(parameters))
+    part = space[5:20:3]
+    assert (len(part) == 5)
+    assert (list(part.indices) == [5, 8, 11, 14, 17])
+    assert ([name for name, _ in part.items()] == ['05', '08', '11', '14', '17'])
+    assert (part[1].get_option('nsteps') == space[8].get_option('nsteps'))
+    assert (len(part[2:][1:]) == 2)
+
+    # Iteration over a huge space is lazy
+    huge = ParameterSpace(MdpFile(path), [('p%d' % i, range(10)) for i in range(8)])
+    assert (len(huge) == 10**8)
+    assert (huge.name(12345) == '00012345')
+    assert (huge[12345678].get_option('p1') == '2')
+    first = next(iter(huge[10**8 - 3:]))
+    assert ([first.get_option('p%d' % i) for i in range(8)] == ['9']*7 + ['7'])
+
+def test_shard():
+    space = ParameterSpace(MdpFile(path), parameters)
+    for method in ('contiguous', 'hash'):
+        for count in (1, 3, 5, 30):
+            shards = [space.shard(i, count, method) for i in range(count)]
+            indices = sorted(int(i) for shard in shards for i in shard.indices)
+            assert (indices == list(range(len(space))))
+
+        shard = space.shard('1/3', method=method)
+        assert ([mdp.get_option('dt') for mdp in shard]
+                == [space[int(i)].get_option('dt') for i in shard.indices])
+
+    assert (list(space.shard(2, 3).indices) == list(range(16, 24)))
+
+    # Shards of slices keep their variant indices
+    part = space[10:20].shard(0, 2)
+    assert (list(part.indices) == list(range(10, 15)))
+    assert (space[10:20].shard(1, 2, 'hash').name(12) == '12')
+
+    for bad in [(3, 3), (-1, 3)]:
+        try:
+            space.shard(*bad)
+            assert (False)
+        except ValueError:
+            pass
+
+def test_sobol():
+    points = sobol(4, 2)
+    assert (points.tolist() == [[0, 0], [0.5, 0.5], [0.75, 0.25], [0.25, 0.75]])
+
+    # Every dyadic interval of a dimension holds equally many points
+    points = sobol(256, 16)
+    for dim in range(16):
+        assert (np.bincount((points[:, dim]*16).astype(int)).tolist() == [16]*16)
+
+    shifted = sobol(256, 3, np.random.default_rng(1))
+    assert (not np.allclose(shifted, sobol(256, 3)))
+    assert (np.all((shifted >= 0) & (shifted < 1)))
+
+def test_parameter_sample():
+    ranges = [('ref_t', (290.0, 330.0)), ('tau_t', (0.1, 1.0)), ('nstlist', (5, 20))]
+    for method in ('random', 'latin', 'sobol'):
+        sample = ParameterSample(MdpFile(path), ranges, 50, method, seed=3)
+        assert (len(sample) == 50)
+        assert (sample.points.shape == (50, 3))
+        assert (np.all((sample.points[:, 0] >= 290) & (sample.points[:, 0] <= 330)))
+        assert (np.all((sample.points[:, 2] >= 5) & (sample.points[:, 2] <= 20)))
+
+        mdp = sample[7]
+        assert (float(mdp.get_option('ref_t')) == sample.points[7, 0])
+        assert (mdp.get_option('nstlist') == str(int(sample.points[7, 2])))
+
+        # Seeded samples are reproducible
+        again = ParameterSample(MdpFile(path), ranges, 50, method, seed=3)
+        assert (np.array_equal(again.points, sample.points))
+
+        # Slicing and sharding as for a full space
+        assert (sample[10:20].shard(1, 2)[0].get_option('tau_t')
+                == sample[15].get_option('tau_t'))
+
+    # A Latin hypercube has one point in every stratum of every parameter
+    sample = ParameterSample(MdpFile(path), dict(ranges[:2]), 40, 'latin',
+            decimals=12)
+    for dim, (low, high) in enumerate([(290, 330), (0.1, 1.0)]):
+        strata = ((sample.points[:, dim] - low)/(high - low)*40).astype(int)
+        assert (sorted(strata) == list(range(40)))
+
+    try:
+        ParameterSample(MdpFile(path), ranges, 10, 'grid')
+        assert (False)
+    except ValueError:
+        pass
+
+def test_derive():
+    mdp = MdpFile(path)
+    space = ParameterSpace(mdp, {'dt': [0.002, 0.004], 'ref-t': ['300 300']})
+    derived = space.derive({'nsteps': 'round(total_ps / dt)',
+        'nstxtcout': 'round(10 / dt)'}, {'total_ps': 4000})
+    assert (space.rules == {})
+
+    table = derived.table()
+    assert (list(table['nsteps']) == ['2000000', '1000000'])
+    assert (list(table['nstxtcout']) == ['5000', '2500'])
+
+    variants = list(derived)
+    assert ([v.options['nsteps'].value for v in variants] == ['2000000', '1000000'])
+    assert (variants[1].options['nstxtcout'].value == '2500')
+    assert (variants[1].options['nsteps'].comment == '4 ns')
+    assert (derived[1:][0].options['nsteps'].value == '1000000')
+
+    # Later rules use earlier ones and base options, comments follow dt
+    steps = ParameterSpace(mdp, {'nstlog': [100, 200]}).derive(
+            [('nsteps', 'round(nstlog * 10)'),
+                ('nstenergy', 'round(max(nsteps / 4, 1))')])
+    table = steps.table()
+    assert (list(table['nsteps']) == ['1000', '2000'])
+    assert (list(table['nstenergy']) == ['250', '500'])
+    assert (steps[0].options['nsteps'].comment == '0.004 ns')
+
+    sample = ParameterSample(mdp, {'dt': (0.001, 0.004)}, 8, seed=1) \
+            .derive({'nsteps': 'round(4000 / dt)'})
+    expected = np.rint(4000 / sample.points[:, 0]).astype(int)
+    assert (list(sample.table()['nsteps']) == [str(n) for n in expected])
+
+def test_derive_errors():
+    space = ParameterSpace(MdpFile(path), {'dt': [0.002]})
+    try:
+        space.derive({'nsteps': 'total / dt'}).table()
+    except ValueError as error:
+        assert ('total' in str(error))
+    else:
+        assert False
+
+def test_rendered():
+    from pygromacs.runs import render_mdp
+
+    space = ParameterSpace(MdpFile(path), {'dt': [0.002, 0.004],
+        'ref-t': ['300 300', '310 310']}).derive(
+                {'nsteps': 'round(total_ps / dt)'}, {'total_ps': 4000})
+    rendered = list(space[1:].rendered())
+    assert ([name for name, _ in rendered] == ['1', '2', '3'])
+    assert ([data for _, data in rendered]
+            == [render_mdp(mdp) for mdp in space[1:]])
+
+    # Swept parameters replace the line of the base file
+    assert (list(space.parameters) == ['dt', 'ref_t'])
+    lines = rendered[0][1].decode().splitlines()
+    assert ([line for line in lines if line.startswith('ref')]
+            == ['ref_t                    = 310 310'])
+    assert (len(space[0].lines) == len(MdpFile(path).lines))
+
+    try:
+        ParameterSpace(MdpFile(path), [('ref-t', [300]), ('REF_T', [310])])
+        assert False
+    except ValueError:
+        pass
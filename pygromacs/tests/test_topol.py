@@ -0,0 +1,142 @@
+import os
+import shutil
+import tempfile as tmp
+
+from pygromacs.gmxfiles import *
+
+path = 'pygromacs/tests/topol.top'
+
+def test_empty_init():
+    top = Topol()
+    assert (top.path == "")
+    assert (top.molecules == [])
+
+def test_read():
+    top = Topol(path)
+    assert (top.path == path)
+    assert ([name for name, _, _ in top.sections]
+            == ['moleculetype', 'atoms', 'system', 'molecules'])
+
+    # Section offsets point at the headers
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    for name, start, end in top.sections:
+        assert (data[start:end].lstrip().startswith(b'['))
+        assert (name.encode() in data[start:end].split(b'\n')[0])
+
+    # Try extension completion
+    top = Topol(path.rsplit('.top')[0])
+    assert (top.path == path)
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        top = Topol(os.path.join(tmp_dir, 'test.top'))
+        assert (top.path == "")
+
+def test_get_molecule():
+    top = Topol(path)
+    assert (top.get_molecule('Protein_chain_A') == 1)
+    assert (top.get_molecule('SOL') == 10832)
+    assert (top.get_molecule('NA') == 12)
+    assert (top.get_molecule('not-a-molecule') == 0)
+
+def test_set_molecule():
+    top = Topol(path)
+    top.set_molecule('SOL', 10800, 'after ions')
+    assert (top.get_molecule('SOL') == 10800)
+    top.set_molecule('CL', 4)
+    assert (top.molecules[-1].name == 'CL')
+    top.remove_molecule('NA')
+    assert (top.get_molecule('NA') == 0)
+
+def test_save():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, 'topol.top')
+        shutil.copyfile(path, tmp_path)
+
+        # An unmodified file is saved byte for byte
+        top = Topol(tmp_path)
+        top.save()
+        with open(path, 'rb') as control, open(tmp_path, 'rb') as test:
+            assert (control.read() == test.read())
+
+        # Modify in place without backup, keeping the head of the file
+        top.set_molecule('SOL', 7)
+        top.set_molecule('CL', 12)
+        top.save()
+        assert (os.listdir(tmp_dir) == ['topol.top'])
+        with open(path, 'rb') as control, open(tmp_path, 'rb') as test:
+            head = control.read(top._offset)
+            assert (test.read(top._offset) == head)
+
+        control = Topol(tmp_path)
+        assert (control.get_molecule('SOL') == 7)
+        assert (control.get_molecule('CL') == 12)
+        assert (control.molecules[0].raw == top.molecules[0].raw)
+
+        # Save to a new path
+        new_path = os.path.join(tmp_dir, 'new')
+        top.set_molecule('SOL', 8)
+        top.save(new_path)
+        control = Topol(new_path)
+        assert (control.path == new_path + '.top')
+        assert (control.get_molecule('SOL') == 8)
+        assert (control.sections == Topol(tmp_path).sections)
+
+def test_save_without_molecules():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, 'topol.top')
+        with open(tmp_path, 'w') as fp:
+            fp.write("[ system ]\nWater")
+
+        top = Topol(tmp_path)
+        assert (top.molecules == [])
+        top.set_molecule('SOL', 216)
+        top.save()
+
+        control = Topol(tmp_path)
+        assert ([name for name, _, _ in control.sections]
+                == ['system', 'molecules'])
+        assert (control.get_molecule('SOL') == 216)
+
+def test_save_unterminated_header():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, 'topol.top')
+        with open(tmp_path, 'w') as fp:
+            fp.write("[ system ]\nWater\n\n[ molecules ]")
+
+        top = Topol(tmp_path)
+        top.set_molecule('SOL', 216)
+        top.set_molecule('NA', 2)
+        top.save(verbose=False)
+        top.save(verbose=False)
+
+        with open(tmp_path) as fp:
+            assert (fp.read().splitlines()[-3:]
+                    == ["[ molecules ]", "%-15s %8d" % ('SOL', 216),
+                        "%-15s %8d" % ('NA', 2)])
+        control = Topol(tmp_path)
+        assert ((control.get_molecule('SOL'), control.get_molecule('NA')) == (216, 2))
+
+def test_save_crlf():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        tmp_path = os.path.join(tmp_dir, 'topol.top')
+        with open(tmp_path, 'wb') as fp:
+            fp.write(b"[ system ]\r\nWater\r\n\r\n[ molecules ]\r\n"
+                    b"SOL    10\r\n\r\n[ extra ]\r\n")
+
+        # Added molecules follow the last one, and lines keep the line break
+        top = Topol(tmp_path)
+        top.set_molecule('SOL', 9)
+        top.set_molecule('NA', 2)
+        top.save(verbose=False)
+        with open(tmp_path, 'rb') as fp:
+            assert (fp.read() == b"[ system ]\r\nWater\r\n\r\n[ molecules ]\r\n"
+                    + ("%-15s %8d\r\n%-15s %8d\r\n" % ('SOL', 9, 'NA', 2)).encode()
+                    + b"\r\n[ extra ]\r\n")
+
+def test_molecule_format(capsys):
+    molecule = Topol.Molecule('SOL', 216, 'water')
+    assert (molecule.format() == "%-15s %8d ; water\n" % ('SOL', 216))
+    assert (molecule.format("\r\n").endswith("water\r\n"))
+    molecule.print()
+    assert (capsys.readouterr().out == molecule.format())
@@ -1,5 +1,18 @@
 from pygromacs.utils import *
 
+def test_lazy_import():
+    import sys
+
+    sys.modules.pop('colorsys', None)
+    colorsys = lazy_import('colorsys')
+    assert ('colorsys' not in sys.modules)
+    assert (colorsys.rgb_to_hsv(1, 0, 0) == (0, 1, 1))
+
+    # Other imports get the module itself
+    import colorsys as module
+    assert (module is not colorsys)
+    assert (lazy_import('colorsys') is module)
+
 def test_prepare_path():
     path = 'pygromacs/tests/grompp.mdp'
     directory, filename = os.path.split(path)
@@ -18,3 +31,87 @@ def test_prepare_path():
     assert (backup == "")
     assert (os.path.isdir(newdir) == True)
     os.rmdir(newdir)
+
+def test_replace_file():
+    import tempfile as tmp
+
+    umask = os.umask(0o027)
+    try:
+        with tmp.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'new.mdp')
+            replace_file(path, b'a')
+            assert (os.stat(path).st_mode & 0o777 == 0o640)
+
+            # Existing files keep their permissions
+            os.chmod(path, 0o604)
+            assert (replace_file(path, b'b', backup=True) != "")
+            assert (os.stat(path).st_mode & 0o777 == 0o604)
+            with open(path, 'rb') as fp:
+                assert (fp.read() == b'b')
+    finally:
+        os.umask(umask)
+
+def test_map_parallel():
+    items = ['a', 'bb', 'ccc']
+    assert (map_parallel(len, items, processes=1) == [1, 2, 3])
+    assert (map_parallel(len, items, processes=2) == [1, 2, 3])
+    assert (map_parallel(len, [], processes=2) == [])
+
+def test_imap_parallel():
+    taken = []
+    def items():
+        for i in range(100):
+            taken.append(i)
+            yield 'x'*i
+
+    results = imap_parallel(len, items(), processes=2, window=3)
+    assert (next(results) == 0)
+    assert (len(taken) <= 4)
+    assert (list(results) == list(range(1, 100)))
+    assert (list(imap_parallel(len, items(), processes=1)) == list(range(100)))
+
+def test_scan_tree():
+    import tempfile as tmp
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        for name in ('a.mdp', os.path.join('sub', 'b.mdp'),
+                os.path.join('sub', 'deeper', 'c.mdp'), 'd.txt'):
+            path = os.path.join(tmp_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'w') as fp:
+                fp.write(name)
+
+        found = sorted(scan_tree(tmp_dir, '*.mdp'))
+        assert ([os.path.relpath(p, tmp_dir) for p, _, _ in found] == ['a.mdp',
+            os.path.join('sub', 'b.mdp'), os.path.join('sub', 'deeper', 'c.mdp')])
+        assert (found[0][1:] == (5, os.stat(found[0][0]).st_mtime_ns))
+        assert (len(list(scan_tree(tmp_dir))) == 4)
+        assert (list(scan_tree(os.path.join(tmp_dir, 'missing'))) == [])
+
+def test_map_async():
+    import asyncio
+    import time
+
+    calls = []
+    def work(item):
+        calls.append(item)
+        time.sleep(0.01)
+        return item*2
+
+    async def main():
+        assert (await map_async(work, range(10), limit=3) == list(range(0, 20, 2)))
+
+        # Calls which have not started are cancelled
+        del calls[:]
+        task = asyncio.ensure_future(map_async(work, range(100), limit=2))
+        await asyncio.sleep(0.03)
+        task.cancel()
+        try:
+            await task
+            assert (False)
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(0.05)
+        assert (len(calls) < 100)
+
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile as tmp
+
+from pygromacs.gmxfiles import *
+from pygromacs.manifest import Manifest, rebuild_manifest
+from pygromacs.search import SearchIndex
+from pygromacs.watch import *
+
+mdp_path = 'pygromacs/tests/grompp.mdp'
+
+def write_mdp(path, **options):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    mdp = MdpFile(mdp_path)
+    for parameter, value in options.items():
+        mdp.set_option(parameter, value)
+    mdp.save(path, verbose=False)
+
+def check_watcher(polling):
+    with tmp.TemporaryDirectory() as tmp_dir:
+        first = os.path.join(tmp_dir, 'a', 'grompp.mdp')
+        write_mdp(first)
+
+        with Watcher(tmp_dir, debounce=0.1, interval=0.05,
+                polling=polling) as watcher:
+            assert (watcher.method == 'polling' or not polling)
+            assert (watcher.changes(timeout=0.2) is None)
+
+            # A burst of writes is one batch, other files are ignored
+            write_mdp(first, nsteps=1)
+            write_mdp(first, nsteps=2)
+            with open(os.path.join(tmp_dir, 'a', 'notes.txt'), 'w') as fp:
+                fp.write("notes")
+            changes = watcher.changes(timeout=5)
+            assert (changes.files == {first})
+            assert (watcher.changes(timeout=0.3) is None)
+
+            # New directories are watched
+            second = os.path.join(tmp_dir, 'b', 'c', 'grompp.mdp')
+            write_mdp(second)
+            changes = watcher.changes(timeout=5)
+            if watcher.method == 'inotify':
+                assert (changes == Changes(set(), {os.path.join(tmp_dir, 'b')}))
+                write_mdp(second, nsteps=3)
+                assert (watcher.changes(timeout=5).files == {second})
+            else:
+                assert (changes == Changes({second}, set()))
+
+            os.remove(first)
+            assert (watcher.changes(timeout=5).files == {first})
+
+def test_watcher():
+    check_watcher(polling=False)
+
+def test_watcher_polling():
+    check_watcher(polling=True)
+
+def test_apply_changes():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        for name in ('a', 'b'):
+            write_mdp(os.path.join(tmp_dir, 'runs', name, 'grompp.mdp'))
+        rebuild_manifest(tmp_dir, processes=1).close()
+
+        with SearchIndex(os.path.join(tmp_dir, 'mdp-index.db')) as index, \
+                Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            index.update(tmp_dir, processes=1)
+            runs = [os.path.join('runs', name) for name in ('a', 'b', 'c')]
+
+            path = os.path.join(tmp_dir, runs[0], 'grompp.mdp')
+            write_mdp(path, coulombtype='PME')
+            summary = apply_changes(Changes({path}, set()), index, manifest,
+                    processes=1)
+            assert (summary['updated'] == 1)
+            assert (index.query(coulombtype='pme') == [path])
+            assert (manifest.query(coulombtype='PME') == [runs[0]])
+
+            # A replaced tree
+            shutil.rmtree(os.path.join(tmp_dir, 'runs', 'b'))
+            write_mdp(os.path.join(tmp_dir, runs[2], 'grompp.mdp'))
+            summary = apply_changes(Changes(set(), {os.path.join(tmp_dir, 'runs')}),
+                    index, manifest, processes=1)
+            assert ((summary['added'], summary['removed']) == (1, 1))
+            assert (manifest.directories() == [runs[0], runs[2]])
+            assert (len(index.query(coulombtype='reaction-field')) == 1)
+
+def test_apply_changes_keeps_records():
+    from pygromacs.runs import generate_runs
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        generate_runs(tmp_dir, {'r1': MdpFile(mdp_path)},
+                {'system': ['pygromacs/tests/topol.top']}, verbose=False)
+        run = os.path.join('system', 'r1')
+        path = os.path.join(tmp_dir, run, 'grompp.mdp')
+
+        with Manifest(os.path.join(tmp_dir, 'manifest.db')) as manifest:
+            manifest.record_command(run, 'gmx grompp', 0, "done")
+            sources = {name: source for name, source, _ in manifest.get_files(run)}
+
+            write_mdp(path, nsteps=5)
+            apply_changes(Changes({path}, set()), manifest=manifest, processes=1)
+
+            assert (manifest.query(nsteps=5) == [run])
+            assert (manifest.get_command(run, 'gmx grompp') == (0, "done", "", 1))
+            files = {name: source for name, source, _ in manifest.get_files(run)}
+            assert (all(files[name] == source for name, source in sources.items()))
+            assert (sources['topol.top'].endswith('topol.top'))
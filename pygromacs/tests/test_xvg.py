@@ -0,0 +1,80 @@
+import os
+import tempfile as tmp
+import numpy as np
+
+from pygromacs.gmxfiles import *
+
+path = 'pygromacs/tests/energy.xvg'
+
+def test_empty_init():
+    xvg = XvgFile()
+    assert (xvg.path == "")
+    assert (xvg.blocks == [])
+    assert (xvg.data.size == 0)
+
+def test_read():
+    xvg = XvgFile(path)
+    assert (xvg.path == path)
+    assert (xvg.title == 'GROMACS Energies')
+    assert (xvg.xlabel == 'Time (ps)')
+    assert (xvg.ylabel == '(kJ/mol), (K)')
+    assert (xvg.legends == ['Potential', 'Temperature'])
+    assert ('TYPE xy' in xvg.headers)
+
+    assert (xvg.data.shape == (5, 3))
+    assert (np.allclose(xvg.data[:, 0], range(5)))
+    assert (np.isclose(xvg.data[1, 2], 299.452148))
+
+    # Try extension completion
+    xvg = XvgFile(path.rsplit('.xvg')[0])
+    assert (xvg.path == path)
+
+    with tmp.TemporaryDirectory() as tmp_dir:
+        xvg = XvgFile(os.path.join(tmp_dir, 'test.xvg'))
+        assert (xvg.path == "")
+
+def test_read_blocks():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        test_path = os.path.join(tmp_dir, 'blocks.xvg')
+        with open(test_path, 'w') as fp:
+            fp.write('@ s0 legend "first"\n0 1\n1 2\n&\n'
+                    '@ s1 legend "second"\n# comment\n0 3 4\n1 5 6\n2 7')
+        xvg = XvgFile(test_path)
+        assert (xvg.legends == ['first', 'second'])
+        assert (len(xvg.blocks) == 2)
+        assert (xvg.blocks[0].tolist() == [[0, 1], [1, 2]])
+
+        # Incomplete last rows are discarded
+        assert (xvg.blocks[1].tolist() == [[0, 3, 4], [1, 5, 6]])
+
+        # Bad values and rows are not dropped
+        for text in ('0 1\n1 x\n2 3\n', '0 1\n1 2 3\n2 3\n', '0 1\n1\n2 3\n'):
+            with open(test_path, 'w') as fp:
+                fp.write(text)
+            try:
+                XvgFile(test_path)
+                assert (False)
+            except ValueError:
+                pass
+
+def test_chunks():
+    with tmp.TemporaryDirectory() as tmp_dir:
+        test_path = os.path.join(tmp_dir, 'large.xvg')
+        data = np.column_stack((np.arange(20000), np.arange(20000)*0.5))
+        with open(path) as control, open(test_path, 'w') as fp:
+            fp.writelines(line for line in control if line[0] in '#@')
+            np.savetxt(fp, data, fmt='%10.4f')
+
+        xvg = XvgFile()
+        chunks = list(xvg.chunks(test_path, rows=1000))
+        assert (len(chunks) > 1)
+        assert (np.allclose(np.concatenate(chunks), data))
+        assert (xvg.legends == ['Potential', 'Temperature'])
+        assert (xvg.blocks == [])
+
+def test_read_many():
+    files = XvgFile.read_many([path]*4, processes=2)
+    assert (len(files) == 4)
+    for xvg in files:
+        assert (xvg.legends == ['Potential', 'Temperature'])
+        assert (np.allclose(xvg.data, XvgFile(path).data))
@@ -1,4 +1,36 @@
+import fnmatch
+import functools
+import importlib
 import os
+import sys
+import tempfile
+import types
+
+def lazy_import(name):
+    """Return a module which is only loaded when first used.
+
+    Keeps heavy modules like NumPy out of the start up time of
+    short-lived processes like the command line tool. The returned
+    proxy is only known to the importing module: it is not added to
+    :data:`sys.modules`, so other imports of the module are unchanged.
+
+    """
+
+    if name in sys.modules:
+        return sys.modules[name]
+
+    return _LazyModule(name)
+
+class _LazyModule(types.ModuleType):
+    """A proxy which imports a module on first access of an attribute."""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+
+        # Later accesses find the attributes without this method
+        self.__dict__.update(module.__dict__)
+
+        return getattr(module, attr)
 
 def prepare_path(path, verbose=True):
     """Prepare a path for writing.
@@ -24,15 +56,8 @@ def prepare_path(path, verbose=True):
     if not os.path.exists(directory):
         os.makedirs(directory)
 
-    # Search for first non-existent filename based on path
-    i = 1
-    backup = path
-    while os.path.exists(backup):
-        new_file = ''.join(['#', filename, '.%d#' % i])
-        backup = os.path.join(directory, new_file)
-        i += 1
-
     # If there was a conflict, move file to backup location
+    backup = backup_path(path) if os.path.exists(path) else path
     if backup != path:
         os.rename(path, backup)
         if verbose:
@@ -41,3 +66,265 @@ def prepare_path(path, verbose=True):
         backup = ""
 
     return backup
+
+def backup_path(path):
+    """Return the first free Gromacs style backup path ``#name.N#`` of a file."""
+
+    directory, filename = os.path.split(path)
+
+    i = 1
+    while True:
+        backup = os.path.join(directory, '#%s.%d#' % (filename, i))
+        if not os.path.exists(backup):
+            return backup
+        i += 1
+
+def replace_file(path, data, backup=False):
+    """Atomically replace the content of a file.
+
+    The data is written to a temporary file in the same directory, which
+    is then renamed over the file, so that readers see either the old or
+    the new file. The permissions of the file are kept, and a new file
+    gets the default permissions (``0o666`` less the umask).
+
+    Args:
+        path (str): Path to file
+        data (bytes): Content to write
+        backup (bool, optional): Keep the old file at a Gromacs style
+            backup path (see :func:`backup_path`)
+
+    Returns:
+        str: The path to a backed up file, empty if no backup was taken
+
+    """
+
+    directory = os.path.dirname(path) or "."
+    fd, temp = tempfile.mkstemp(dir=directory, prefix='.tmp.')
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = 0o666 & ~_umask()
+        os.chmod(temp, mode)
+
+        saved = ""
+        if backup and os.path.exists(path):
+            saved = backup_path(path)
+            os.link(path, saved)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+    return saved
+
+def _umask():
+    """Return the umask of the process."""
+
+    # Reading the umask by setting it is not thread-safe, Linux reports it
+    try:
+        with open('/proc/self/status') as fp:
+            for line in fp:
+                if line.startswith('Umask:'):
+                    return int(line.split()[1], 8)
+    except OSError:
+        pass
+
+    umask = os.umask(0o022)
+    os.umask(umask)
+
+    return umask
+
+def map_parallel(function, items, processes=None):
+    """Apply a function to all items in a pool of processes.
+
+    Falls back to a plain loop for a single process or item, which
+    avoids the cost of starting workers.
+
+    Args:
+        function: A function which can be pickled (defined at module level)
+        items (iterable): Arguments to apply the function to
+        processes (int, optional): Number of worker processes
+            (default: number of processors)
+
+    Returns:
+        list: The results, in the order of the items
+
+    """
+
+    items = list(items)
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    chunksize = max(1, len(items) // (4*processes))
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(function, items, chunksize=chunksize))
+
+def imap_parallel(function, items, processes=None, window=None):
+    """Like :func:`map_parallel`, but yield the results as they are needed.
+
+    At most ``window`` items are submitted to the pool ahead of the
+    result being taken, so that no more results than that are held when
+    the caller is slower than the workers. Items are taken from the
+    iterable as they are submitted.
+
+    Args:
+        function: A function which can be pickled (defined at module level)
+        items (iterable): Arguments to apply the function to
+        processes (int, optional): Number of worker processes
+            (default: number of processors)
+        window (int, optional): Number of items in flight (default: four
+            per process)
+
+    Yields:
+        The results, in the order of the items
+
+    """
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    if processes <= 1:
+        yield from map(function, items)
+        return
+
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    window = window or 4*processes
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        try:
+            for item in items:
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(function, item))
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+def scan_tree(directory, pattern='*'):
+    """Yield the path, size and modification time of files in a tree.
+
+    Uses :func:`os.scandir`, which for most files gets the type without
+    a further system call, and does not follow symbolic links to
+    directories.
+
+    Args:
+        directory (str): Base directory of the tree
+        pattern (str, optional): Shell pattern of file names to yield
+
+    Yields:
+        tuple: The ``(path, size, mtime_ns)`` of every matching file
+
+    """
+
+    stack = [directory]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif fnmatch.fnmatchcase(entry.name, pattern) and entry.is_file():
+                    stat = entry.stat()
+                    yield entry.path, stat.st_size, stat.st_mtime_ns
+            except OSError:
+                pass
+
+def write_if_changed(path, data):
+    """Write bytes to a file unless it already has that content.
+
+    Creates required directories. No backup is taken of a replaced file.
+
+    Args:
+        path (str): Path to file
+        data (bytes): Content to write
+
+    Returns:
+        bool: Whether or not the file was written
+
+    """
+
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, 'rb') as fp:
+                if fp.read() == data:
+                    return False
+    except OSError:
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    with open(path, 'wb') as fp:
+        fp.write(data)
+
+    return True
+
+_executor = None
+
+def get_executor():
+    """Return the shared thread pool used for blocking I/O in coroutines."""
+
+    global _executor
+    if _executor is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _executor = ThreadPoolExecutor(
+                max_workers=min(32, (os.cpu_count() or 1) + 4))
+
+    return _executor
+
+async def run_blocking(function, *args, **kwargs):
+    """Run a blocking function in the shared thread pool and await it.
+
+    Awaiting this does not block the event loop. If the awaiting task
+    is cancelled before the function has started it is not run.
+
+    """
+
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_executor(),
+            functools.partial(function, *args, **kwargs))
+
+async def map_async(function, items, limit=64):
+    """Apply a blocking function to all items concurrently.
+
+    At most ``limit`` calls are submitted to the thread pool at a time,
+    so that other work on the event loop is not starved. Cancelling the
+    returned coroutine cancels all calls which have not started.
+
+    Args:
+        function: A blocking function
+        items (iterable): Arguments to apply the function to
+        limit (int, optional): Maximum number of concurrent calls
+
+    Returns:
+        list: The results, in the order of the items
+
+    """
+
+    import asyncio
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def run(item):
+        async with semaphore:
+            return await run_blocking(function, item)
+
+    return await asyncio.gather(*[run(item) for item in items])
@@ -0,0 +1,406 @@
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import os
+import select
+import struct
+import time
+from collections import namedtuple
+from pygromacs.utils import scan_tree
+
+"""Watching of directory trees, to keep indices of their files up to date.
+
+On Linux changes are reported by inotify, for which every directory of
+the tree is watched. Elsewhere, or if the tree has more directories than
+inotify allows watches (see ``/proc/sys/fs/inotify/max_user_watches``),
+the tree is polled instead: the size and modification time of all
+matching files are compared to those of the previous poll.
+
+"""
+
+Changes = namedtuple('Changes', ['files', 'trees'])
+Changes.__doc__ = """A batch of changes in a watched tree.
+
+Attributes:
+    files: A set of paths of matching files which were created,
+        modified or removed.
+
+    trees: A set of directories which were created, moved or removed
+        as a whole, within which any file may have changed. Files in
+        these are not also in :attr:`files`.
+
+"""
+
+# inotify flags, from <sys/inotify.h>
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_IN_IGNORED = 0x8000
+_IN_ONLYDIR = 0x1000000
+_IN_ISDIR = 0x40000000
+
+_mask = (_IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO
+        | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+        | _IN_ONLYDIR)
+
+# Header of an inotify event: watch, mask, cookie and length of the name
+_event = struct.Struct('iIII')
+
+class Watcher(object):
+    """A watcher of the files in a directory tree.
+
+    Changes are collected in batches: once a file changes, the batch
+    is only complete after no further change for ``debounce`` seconds,
+    so that a burst of writes (e.g. a run tree being copied) gives one
+    batch. To not delay a steady stream of changes forever, a batch
+    is also complete ``10 * debounce`` seconds after its first change.
+
+    Args:
+        directory (str): Base directory of the tree
+        pattern (str, optional): Shell pattern of the file names to watch
+        debounce (float, optional): Seconds without changes which end
+            a batch
+        interval (float, optional): Seconds between polls of the tree,
+            if it is polled
+        polling (bool, optional): Poll the tree even if inotify is available
+
+    Attributes:
+        directory: The absolute path of the base directory.
+
+        method: ``'inotify'`` or ``'polling'``.
+
+    Example:
+        ::
+
+            with Watcher('/proj') as watcher:
+                for changes in watcher:
+                    print(sorted(changes.files))
+
+    """
+
+    def __init__(self, directory, pattern='*.mdp', debounce=0.5,
+            interval=2.0, polling=False):
+        self.directory = os.path.abspath(directory)
+        self.pattern = pattern
+        self.debounce = debounce
+
+        self._source = None
+        if not polling:
+            try:
+                self._source = _Inotify(self.directory, pattern)
+            except OSError:
+                pass
+        if self._source is None:
+            self._source = _Poller(self.directory, pattern, interval)
+
+        self.method = self._source.method
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            yield self.changes()
+
+    def close(self):
+        """Stop watching."""
+
+        self._source.close()
+
+    def changes(self, timeout=None):
+        """Wait for the next batch of changes.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a first change
+
+        Returns:
+            Changes: The batch, or None if nothing changed before the timeout
+
+        """
+
+        start = time.monotonic()
+        files, trees = set(), set()
+        while not (files or trees):
+            remaining = None if timeout is None \
+                    else start + timeout - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return None
+            self._source.read(files, trees, remaining)
+
+        first = time.monotonic()
+        quiet = first + self.debounce
+        while True:
+            now = time.monotonic()
+            if now >= quiet:
+                break
+            if self._source.read(files, trees, quiet - now):
+                quiet = min(time.monotonic() + self.debounce,
+                        first + 10*self.debounce)
+
+        # Files in changed trees are covered by those
+        prefixes = tuple(os.path.join(tree, '') for tree in trees)
+        files = set(path for path in files if not path.startswith(prefixes))
+
+        return Changes(files, trees)
+
+class _Inotify(object):
+    """Changes reported by inotify, with a watch on every directory."""
+
+    method = 'inotify'
+
+    def __init__(self, directory, pattern):
+        self.directory = directory
+        self.pattern = pattern
+        self._watches = {}
+
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        try:
+            self._init = libc.inotify_init1
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+        except AttributeError:
+            raise OSError("inotify is not available")
+
+        self.fd = self._init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "could not initialise inotify")
+        try:
+            self._watch_tree(directory)
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    def close(self):
+        os.close(self.fd)
+
+    def _watch_tree(self, directory):
+        """Watch a directory and all directories below it."""
+
+        stack = [directory]
+        while stack:
+            path = stack.pop()
+            watch = self._add_watch(self.fd, os.fsencode(path), _mask)
+            if watch < 0:
+                error = ctypes.get_errno()
+                if path == directory or error == errno.ENOSPC:
+                    raise OSError(error, os.strerror(error), path)
+                continue
+            self._watches[watch] = path
+
+            try:
+                stack += [entry.path for entry in os.scandir(path)
+                        if entry.is_dir(follow_symlinks=False)]
+            except OSError:
+                pass
+
+    def _unwatch_tree(self, directory):
+        """Stop watching a directory which moved, and all below it."""
+
+        prefix = os.path.join(directory, '')
+        for watch, path in list(self._watches.items()):
+            if path == directory or path.startswith(prefix):
+                self._rm_watch(self.fd, watch)
+                del self._watches[watch]
+
+    def read(self, files, trees, timeout):
+        """Add the changes of the next events to the sets, waiting up to
+        ``timeout`` seconds for them. Returns whether there were any."""
+
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return False
+
+        changed = False
+        offset = 0
+        while offset < len(data):
+            watch, mask, _, length = _event.unpack_from(data, offset)
+            offset += _event.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                # Events were lost
+                trees.add(self.directory)
+                changed = True
+                continue
+            if mask & _IN_IGNORED:
+                self._watches.pop(watch, None)
+                continue
+            if watch not in self._watches:
+                continue
+
+            path = os.path.join(self._watches[watch], name) if name \
+                    else self._watches[watch]
+
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                if path == self.directory:
+                    trees.add(path)
+                    changed = True
+            elif mask & _IN_ISDIR:
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    try:
+                        self._watch_tree(path)
+                    except OSError:
+                        pass
+                    trees.add(path)
+                    changed = True
+                elif mask & (_IN_DELETE | _IN_MOVED_FROM):
+                    self._unwatch_tree(path)
+                    trees.add(path)
+                    changed = True
+            elif fnmatch.fnmatchcase(name, self.pattern):
+                files.add(path)
+                changed = True
+
+        return changed
+
+class _Poller(object):
+    """Changes found by comparing the files of a tree between polls."""
+
+    method = 'polling'
+
+    def __init__(self, directory, pattern, interval):
+        self.directory = directory
+        self.pattern = pattern
+        self.interval = interval
+        self._stamps = self._scan()
+        self._next = time.monotonic() + interval
+
+    def close(self):
+        pass
+
+    def _scan(self):
+        return {path: (size, mtime)
+                for path, size, mtime in scan_tree(self.directory, self.pattern)}
+
+    def read(self, files, trees, timeout):
+        """Add the changes found by the next poll to the set of files,
+        if it is due within ``timeout`` seconds. Returns whether there
+        were any."""
+
+        wait = self._next - time.monotonic()
+        if timeout is not None and wait > timeout:
+            time.sleep(max(timeout, 0))
+            return False
+        time.sleep(max(wait, 0))
+
+        stamps = self._scan()
+        self._next = time.monotonic() + self.interval
+
+        changed = set(path for path, stamp in stamps.items()
+                if self._stamps.get(path) != stamp)
+        changed.update(set(self._stamps).difference(stamps))
+        self._stamps = stamps
+        files.update(changed)
+
+        return bool(changed)
+
+def apply_changes(changes, index=None, manifest=None, cache=False,
+        pattern='*.mdp', mdp_name='grompp.mdp', processes=None):
+    """Bring an index, a manifest and the binary cache up to date.
+
+    Only the changed files and the run directories of changed MDP files
+    are read again. Changed trees are updated as a whole.
+
+    Args:
+        changes (Changes): A batch of changes of a :class:`Watcher`
+        index (SearchIndex, optional): A search index to update
+        manifest (Manifest, optional): A manifest to update, of runs with
+            an MDP file named ``mdp_name``
+        cache (bool, optional): Update the binary cache of changed files
+            (see :func:`~pygromacs.cache.read_cached`)
+        pattern (str, optional): Shell pattern of the watched file names
+        mdp_name (str, optional): File name of the MDP file of every run
+        processes (int, optional): Number of processes (default: number
+            of processors)
+
+    Returns:
+        dict: The summary of the index update (see
+            :func:`~pygromacs.search.SearchIndex.update`), or None
+            without an index
+
+    """
+
+    summary = None
+    if index is not None:
+        summary = index.update_files(changes.files, processes, cache)
+        for tree in sorted(changes.trees):
+            result = index.update(tree, pattern, processes, cache)
+            for key, value in result.items():
+                if key == 'errors':
+                    summary[key].update(value)
+                else:
+                    summary[key] += value
+    elif cache:
+        from pygromacs.cache import read_cached
+
+        paths = set(changes.files)
+        for tree in changes.trees:
+            paths.update(path for path, _, _ in scan_tree(tree, pattern))
+        for path in sorted(paths):
+            try:
+                read_cached(path)
+            except (OSError, UnicodeDecodeError):
+                pass
+
+    if manifest is not None:
+        from pygromacs.manifest import update_manifest
+
+        base = os.path.dirname(os.path.abspath(manifest.path))
+        directories = set(os.path.relpath(os.path.dirname(path), base)
+                for path in changes.files if os.path.basename(path) == mdp_name)
+        for tree in changes.trees:
+            directories.update(os.path.relpath(os.path.dirname(path), base)
+                    for path, _, _ in scan_tree(tree, mdp_name))
+            prefix = os.path.relpath(tree, base)
+            directories.update(directory for directory in manifest.directories()
+                    if directory == prefix
+                    or directory.startswith(os.path.join(prefix, '')))
+        directories = [directory for directory in directories
+                if directory != os.pardir
+                and not directory.startswith(os.path.join(os.pardir, ''))]
+        update_manifest(manifest, directories, mdp_name, processes, cache)
+
+    return summary
+
+def watch(directory, index=None, manifest=None, cache=False,
+        mdp_name='grompp.mdp', callback=None, processes=None, **kwargs):
+    """Keep an index, a manifest and the binary cache of a tree up to date.
+
+    The index is first brought up to date with the whole tree, then
+    every batch of changes is applied (see :func:`apply_changes`) until
+    the process is interrupted.
+
+    Args:
+        directory (str): Base directory of the tree
+        index, manifest, cache, mdp_name, processes: As for
+            :func:`apply_changes`
+        callback (function, optional): Called with every batch of changes
+            and the summary of its index update
+        **kwargs: Further arguments to :class:`Watcher`
+
+    """
+
+    with Watcher(directory, **kwargs) as watcher:
+        if index is not None:
+            index.update(directory, watcher.pattern, processes, cache)
+
+        for changes in watcher:
+            summary = apply_changes(changes, index, manifest, cache,
+                    watcher.pattern, mdp_name, processes)
+            if callback is not None:
+                callback(changes, summary)
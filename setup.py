@@ -23,8 +23,12 @@ setup(
         author_email='pettjoha@kth.se',
         license='None',
         packages=find_packages(),
+        python_requires='>=3.8',
         cmdclass = {'test': PyTest},
-        install_requires = ['setuptools'],
+        install_requires = ['setuptools', 'numpy'],
+        entry_points = {
+            'console_scripts': ['pygromacs = pygromacs.cli:main']
+            },
         zip_safe=False
         )
 